@@ -144,6 +144,7 @@ setup(
             'ws-create-table=websauna.system.devop.scripts.createtable:main',
             'ws-sanity-check=websauna.system.devop.scripts.sanitycheck:main',
             'ws-collect-static=websauna.system.devop.scripts.collectstatic:main',
+            'ws-throttle-stats=websauna.system.devop.scripts.throttlestats:main',
         ],
 
         'paste.app_factory': [
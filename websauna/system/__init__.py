@@ -200,12 +200,37 @@ class Initializer:
 
         self.config.add_request_method(get_request_user, 'user', reify=True)
 
+        self.configure_principal_cache()
+
         self.config.add_tween("websauna.system.auth.tweens.SessionInvalidationTweenFactory", over=pyramid.tweens.MAIN)
 
         # Grab incoming auth details changed events
         from websauna.system.auth import subscribers
         self.config.scan(subscribers)
 
+    def configure_principal_cache(self):
+        """Set up optional cross-request cache of user principals.
+
+        See :py:mod:`websauna.system.auth.principalcache`.
+        """
+        from websauna.system.auth.interfaces import IPrincipalCache
+        from websauna.system.auth.principalcache import MemoryPrincipalCache
+        from websauna.system.auth.principalcache import RedisPrincipalCache
+
+        backend = self.settings.get("websauna.principal_cache")
+        ttl = int(self.settings.get("websauna.principal_cache_ttl", 60))
+
+        if not backend:
+            return
+        elif backend == "redis":
+            cache = RedisPrincipalCache(self.config.registry, ttl)
+        elif backend == "memory":
+            cache = MemoryPrincipalCache(ttl, int(self.settings.get("websauna.principal_cache_max_size", 10000)))
+        else:
+            raise RuntimeError("Unknown websauna.principal_cache backend: {}".format(backend))
+
+        self.config.registry.registerUtility(cache, IPrincipalCache)
+
     @event_source
     def configure_panels(self):
         self.config.include('pyramid_layout')
@@ -690,16 +715,31 @@ class Initializer:
         """
         from websauna.system.model import sanitycheck
         from websauna.system.model.meta import Base
-        from websauna.system.model.meta import create_dbsession
+        from websauna.system.model.meta import get_engine
         from websauna.system.core import redis
 
-        dbsession = create_dbsession(self.config.registry.settings)
-
-        if not sanitycheck.is_sane_database(Base, dbsession):
+        registry = self.config.registry
+        cache_seconds = int(registry.settings.get("websauna.sanity_check_cache_seconds", 0))
+        redis_client = redis.get_redis(registry) if cache_seconds else None
+
+        # Use the application engine instead of creating another one
+        engine = getattr(registry, "db_engine", None) or get_engine(registry.settings)
+        connection = engine.connect()
+        try:
+            try:
+                sane = sanitycheck.is_sane_database(Base, connection, redis_client, cache_seconds)
+            except redis.ConnectionError:
+                logging.getLogger(__name__).warn("Could not read sanity check marker from Redis, checking the database schema")
+                sane = sanitycheck.is_sane_database(Base, connection)
+        finally:
+            connection.close()
+
+            # Do not leave pooled connections behind for forked worker processes
+            engine.dispose()
+
+        if not sane:
             raise SanityCheckFailed("The database sanity check failed. Check log for details.")
 
-        dbsession.close()
-
         if self._has_redis_sessions:
             if not redis.is_sane_redis(self.config):
                 raise SanityCheckFailed("Could not connect to Redis server.\nWebsauna is configured to use Redis server for session data.\nIt cannot start up without a running Redis server.\nPlease consult your operating system community how to install and start a Redis server.")
@@ -26,6 +26,9 @@ class ModelAdmin(CRUD):
     #: Model must be set by subclass
     model = None
 
+    #: Column names matched by the JSON search view used by remote select widgets and by the search box of the listing. JSONB paths like ``user_data/full_name`` are supported, see :py:mod:`websauna.system.crud.search`. If not set the JSON search view uses the label column of the model or all string columns.
+    search_columns = None
+
     def __init__(self, request):
         super(ModelAdmin, self).__init__(request)
 
@@ -3,16 +3,23 @@ from pyramid.httpexceptions import HTTPFound
 
 from pyramid.view import view_config
 from pyramid_layout.panel import panel_config
+from sqlalchemy import inspect
+from sqlalchemy import or_
+from sqlalchemy import String
 from websauna.system.admin.modeladmin import ModelAdmin, ModelAdminRoot
 from websauna.system.admin.utils import get_admin
 from websauna.system.crud import views as crud_views
 from websauna.system.crud import listing
+from websauna.system.crud.search import get_search_expression
+from websauna.system.model.routing import use_replica
 from websauna.system.crud.sqlalchemy import sqlalchemy_deleter
 from websauna.system.crud.views import TraverseLinkButton
 from websauna.system.crud.formgenerator import SQLAlchemyFormGenerator
+from websauna.system.form.vocabulary import get_label_column
 from websauna.system.notebook.views import launch_context_sensitive_shell
 
 from websauna.system.core.panel import render_panel
+from websauna.utils.slug import uuid_to_slug
 from websauna.viewconfig import view_overrides
 
 
@@ -60,15 +67,34 @@ class Listing(crud_views.Listing):
         ]
     )
 
+    #: No bulk actions by default, as they bypass per item permission checks and ORM events. Model admin listings opt in, see :py:class:`websauna.system.user.adminviews.UserListing`.
+    bulk_actions = []
+
     @property
     def title(self):
         return "All {}".format(self.context.title)
 
+    @classmethod
+    def get_bulk_task_context(cls, request, model):
+        """Look up the model admin of the listing."""
+        admin = get_admin(request)
+        return admin["models"][request.registry.model_admin_ids_by_model[model]]
+
     @view_config(context=ModelAdmin, name="listing", renderer="crud/listing.html", route_name="admin", permission='view')
     def listing(self):
         # We override this method just to define admin route_name traversing
         return super(Listing, self).listing()
 
+    @view_config(context=ModelAdmin, name="export", route_name="admin", permission='view')
+    def export(self):
+        # We override this method just to define admin route_name traversing
+        return super(Listing, self).export()
+
+    @view_config(context=ModelAdmin, name="bulk", request_method="POST", route_name="admin", permission='view')
+    def bulk_action(self):
+        # We override this method just to define admin route_name traversing
+        return super(Listing, self).bulk_action()
+
 
 class Show(crud_views.Show):
     """Default show view for model admin."""
@@ -157,3 +183,52 @@ def view__model_admin_root(context, request):
     """Model admin root does not have a view per se so we redirect to admin root."""
     return HTTPFound(request.resource_url(context.__parent__))
 
+
+
+class Search:
+    """JSON search endpoint for choosing items of a model admin.
+
+    Used by :py:class:`websauna.system.form.widgets.RemoteSelectWidget` for relationships with too many items to be rendered as a choice list. Matches the search term as a case insensitive prefix of :py:attr:`websauna.system.admin.modeladmin.ModelAdmin.search_columns`.
+
+    Example: ``/admin/models/user/search?q=mikko``
+    """
+
+    #: Maximum number of returned items
+    limit = 20
+
+    def __init__(self, context, request):
+        self.request = request
+        self.context = context
+
+    def get_search_columns(self, model: type) -> list:
+        if self.context.search_columns:
+            return [get_search_expression(model, name) for name in self.context.search_columns]
+
+        label_column = get_label_column(model)
+        if label_column:
+            return [getattr(model, label_column)]
+
+        return [getattr(model, c.key) for c in inspect(model).column_attrs if isinstance(c.columns[0].type, String)]
+
+    def get_label(self, item) -> str:
+        label_column = get_label_column(item.__class__)
+        return str(getattr(item, label_column)) if label_column else str(item)
+
+    def search(self, term: str) -> list:
+        model = self.context.get_model()
+        columns = self.get_search_columns(model)
+        if not columns:
+            # Model has no string columns to match against
+            return []
+
+        term = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = self.context.get_query().filter(or_(*[c.ilike(term + "%", escape="\\") for c in columns]))
+        query = query.order_by(columns[0]).limit(self.limit)
+        return [dict(id=uuid_to_slug(item.uuid), text=self.get_label(item)) for item in query]
+
+    @view_config(context=ModelAdmin, name="search", renderer="json", route_name="admin", permission='view')
+    @use_replica
+    def search_view(self):
+        term = self.request.params.get("q", "").strip()
+        results = self.search(term) if term else []
+        return dict(results=results)
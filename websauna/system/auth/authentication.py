@@ -1,22 +1,52 @@
 """The user authentication helper functions."""
 from pyramid.settings import aslist
 from pyramid.security import unauthenticated_userid
+from websauna.compat.typing import Optional
 from websauna.system.http import Request
 from websauna.system.user.models import User
 
 from websauna.system.user.utils import get_user_registry
 
 
+def get_identity_cache(request: Request) -> dict:
+    """Get per-request cache of authenticated users and their principals.
+
+    ``request.user``, :py:func:`websauna.system.auth.principals.resolve_principals` and :py:class:`websauna.system.auth.tweens.SessionInvalidationTweenFactory` all need the logged in user. The cache makes sure the user is loaded only once per request. Entries are keyed by the session token, so logging in or out during the request does not return stale data.
+    """
+    cache = getattr(request, "_identity_cache", None)
+    if cache is None:
+        cache = request._identity_cache = {}
+    return cache
+
+
+def clear_identity_cache(request: Request):
+    """Forget cached user and principals of the request.
+
+    Call this if you change user groups or other authentication details and need the permission checks later in the same request to see the changes.
+    """
+    request._identity_cache = {}
+
+
+def get_session_user(session_token: str, request: Request) -> Optional[User]:
+    """Load the user by session token, once per request.
+
+    Unlike :py:func:`get_user` this returns disabled users as well.
+    """
+    cache = get_identity_cache(request)
+    key = ("user", session_token)
+    if key not in cache:
+        user_registry = get_user_registry(request)
+        cache[key] = user_registry.get_user_by_session_token(session_token)
+    return cache[key]
+
+
 def get_user(session_token: str, request: Request) -> User:
     """Extract the logged in user from the request object using Pyramid's authentication framework."""
 
     # user_id = unauthenticated_userid(request)
 
-    # TODO: Abstract this to its own service like in Warehouse?
-    user_registry = get_user_registry(request)
-
     if session_token is not None:
-        user = user_registry.get_user_by_session_token(session_token)
+        user = get_session_user(session_token, request)
 
         # Check through conditions why this user would no longer be valid
         if user:
@@ -34,5 +64,3 @@ def get_request_user(request:Request) -> User:
 
     user_id = unauthenticated_userid(request)
     return get_user(user_id, request) if user_id else None
-
-
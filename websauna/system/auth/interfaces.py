@@ -0,0 +1,18 @@
+"""Authentication subsystem interfaces."""
+from zope.interface import Interface
+
+
+class IPrincipalCache(Interface):
+    """Cache authentication state of users across requests.
+
+    See :py:mod:`websauna.system.auth.principalcache`.
+    """
+
+    def get(session_token: str):
+        """Get cached authentication state dictionary or ``None``."""
+
+    def set(session_token: str, state: dict):
+        """Store authentication state dictionary."""
+
+    def invalidate(session_token: str):
+        """Drop cached authentication state."""
@@ -0,0 +1,169 @@
+"""Cross-request cache of user principals.
+
+Resolving principals needs the user and its groups from the database on every request. On read heavy sites the cache stores the authentication state of a user for a short time, so that permission checks and session validation do not need to touch the database.
+
+The cached state is a dictionary of
+
+* ``principals``: List of principal strings or ``None`` if the user cannot log in
+
+* ``enabled``: Is the user account enabled
+
+* ``activated``: Has the user activated the account
+
+* ``last_auth_sensitive_operation_at``: Used to invalidate old sessions
+
+The cache is enabled with ``websauna.principal_cache`` setting and invalidated on :py:class:`websauna.system.user.events.UserAuthSensitiveOperation`, :py:class:`websauna.system.user.events.PasswordResetEvent` and :py:class:`websauna.system.user.events.UserGroupsChanged` events. Other changes become visible after ``websauna.principal_cache_ttl`` seconds.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import iso8601
+from pyramid.registry import Registry
+from zope.interface import implementer
+
+from websauna.compat.typing import Optional
+from websauna.system.auth.interfaces import IPrincipalCache
+from websauna.system.core.redis import get_redis
+from websauna.system.http import Request
+from websauna.system.user.utils import get_user_registry
+
+
+def create_state(user, principals: Optional[list]) -> dict:
+    """Create cacheable authentication state of a user."""
+    return dict(
+        principals=principals,
+        enabled=bool(user.enabled),
+        activated=user.is_activated(),
+        last_auth_sensitive_operation_at=user.last_auth_sensitive_operation_at,
+    )
+
+
+def is_valid_session(state: dict, session_created_at) -> bool:
+    """Check session validity against cached state, like :py:meth:`websauna.system.user.usermixin.UserMixin.is_valid_session`."""
+    changed_at = state["last_auth_sensitive_operation_at"]
+    return changed_at is None or changed_at <= session_created_at
+
+
+@implementer(IPrincipalCache)
+class MemoryPrincipalCache:
+    """Cache authentication state in the process memory.
+
+    Invalidation only reaches the process where the event was fired. Use with single process deployments or with a short TTL.
+
+    :param max_size: Maximum number of cached sessions. When full, expired entries are dropped, then the oldest ones.
+    """
+
+    def __init__(self, ttl: int=60, max_size: int=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        #: Session token -> (expires at, state), in insertion order
+        self.data = OrderedDict()
+
+    def get(self, session_token: str) -> Optional[dict]:
+        key = str(session_token)
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return None
+            expires_at, state = entry
+            if expires_at < time.time():
+                del self.data[key]
+                return None
+            return state
+
+    def sweep(self):
+        """Drop expired entries. Must be called with the lock held."""
+        now = time.time()
+        for key in [key for key, (expires_at, state) in self.data.items() if expires_at < now]:
+            del self.data[key]
+
+    def set(self, session_token: str, state: dict):
+        key = str(session_token)
+        with self.lock:
+            self.data.pop(key, None)
+
+            if len(self.data) >= self.max_size:
+                self.sweep()
+                while len(self.data) >= self.max_size:
+                    self.data.popitem(last=False)
+
+            self.data[key] = (time.time() + self.ttl, state)
+
+    def invalidate(self, session_token: str):
+        with self.lock:
+            self.data.pop(str(session_token), None)
+
+
+@implementer(IPrincipalCache)
+class RedisPrincipalCache:
+    """Cache authentication state in Redis, shared by all processes."""
+
+    key_prefix = "principals_"
+
+    def __init__(self, registry: Registry, ttl: int=60):
+        self.registry = registry
+        self.ttl = ttl
+
+    def get_key(self, session_token: str) -> str:
+        return "{}{}".format(self.key_prefix, session_token)
+
+    def get(self, session_token: str) -> Optional[dict]:
+        redis = get_redis(self.registry)
+        data = redis.get(self.get_key(session_token))
+        if data is None:
+            return None
+        state = json.loads(data.decode("utf-8"))
+        if state["last_auth_sensitive_operation_at"]:
+            state["last_auth_sensitive_operation_at"] = iso8601.parse_date(state["last_auth_sensitive_operation_at"])
+        return state
+
+    def set(self, session_token: str, state: dict):
+        state = state.copy()
+        if state["last_auth_sensitive_operation_at"]:
+            state["last_auth_sensitive_operation_at"] = state["last_auth_sensitive_operation_at"].isoformat()
+        redis = get_redis(self.registry)
+        redis.setex(self.get_key(session_token), self.ttl, json.dumps(state))
+
+    def invalidate(self, session_token: str):
+        redis = get_redis(self.registry)
+        redis.delete(self.get_key(session_token))
+
+
+def get_principal_cache(registry: Registry) -> Optional[IPrincipalCache]:
+    """Get the configured principal cache or ``None`` if caching is disabled."""
+    return registry.queryUtility(IPrincipalCache)
+
+
+def invalidate_user(request: Request, user):
+    """Drop cached authentication state of a user.
+
+    The state is dropped right away and again when the transaction commits, so that concurrent requests cannot cache the state from before the commit.
+    """
+    token = get_user_registry(request).get_session_token(user)
+    invalidate_session_tokens(request, [token])
+
+
+def invalidate_session_tokens(request: Request, tokens: list):
+    """Drop cached authentication states of many users by their session tokens.
+
+    See :py:func:`invalidate_user`.
+    """
+    cache = get_principal_cache(request.registry)
+    if cache is None:
+        return
+
+    tokens = list(tokens)
+
+    def invalidate(success=True):
+        for token in tokens:
+            cache.invalidate(token)
+
+    invalidate()
+
+    tm = getattr(request, "tm", None)
+    if tm is not None:
+        tm.get().addAfterCommitHook(invalidate)
@@ -2,6 +2,10 @@
 from pyramid.settings import asbool
 from pyramid.settings import aslist
 
+from websauna.system.auth.authentication import get_identity_cache
+from websauna.system.auth.authentication import get_session_user
+from websauna.system.auth.principalcache import create_state
+from websauna.system.auth.principalcache import get_principal_cache
 from websauna.system.http import Request
 from websauna.compat.typing import List
 from websauna.compat.typing import Optional
@@ -16,13 +20,43 @@ def resolve_principals(session_token: str, request: Request) -> Optional[List[st
     * List all groups as ``group:admin`` style strings
 
     * List super user as ``superuser:superuser`` style string
+
+    Principals are computed once per request, see :py:func:`websauna.system.auth.authentication.get_identity_cache`. If ``websauna.principal_cache`` is enabled they are also cached across requests.
+    """
+    state = get_auth_state(session_token, request)
+    return state["principals"] if state else None
+
+
+def get_auth_state(session_token: str, request: Request) -> Optional[dict]:
+    """Get principals and session validation details of a user.
+
+    Read from :py:mod:`websauna.system.auth.principalcache` if enabled, otherwise load the user from the database.
+
+    :return: State dictionary as described in :py:func:`websauna.system.auth.principalcache.create_state` or ``None`` if the user does not exist
     """
+    cache = get_identity_cache(request)
+    key = ("state", session_token)
+    if key in cache:
+        return cache[key]
+
+    principal_cache = get_principal_cache(request.registry)
+    state = principal_cache.get(session_token) if principal_cache else None
+
+    if state is None:
+        user = get_session_user(session_token, request)
+        if user:
+            state = create_state(user, _resolve_principals(user, request))
+            if principal_cache:
+                principal_cache.set(session_token, state)
+
+    cache[key] = state
+    return state
+
+
+def _resolve_principals(user, request: Request) -> Optional[List[str]]:
 
     # TODO: Abstract this to its own service like in Warehouse?
     user_registry = get_user_registry(request)
-    user = user_registry.get_user_by_session_token(session_token)
-    if not user:
-        return None
 
     settings = request.registry.settings
 
@@ -1,6 +1,10 @@
 """Handle incoming user events."""
 from pyramid.events import subscriber
+from websauna.system.auth.authentication import clear_identity_cache
+from websauna.system.auth.principalcache import invalidate_user
+from websauna.system.user.events import PasswordResetEvent
 from websauna.system.user.events import UserAuthSensitiveOperation
+from websauna.system.user.events import UserGroupsChanged
 from websauna.utils.time import now
 
 
@@ -18,3 +22,16 @@ def user_auth_details_changes(event:UserAuthSensitiveOperation):
     # Update the timestamp which session validation checks on every request
     user.last_auth_sensitive_operation_at = now()
 
+    # Permission checks later in this request must see the changes
+    if event.request is not None:
+        clear_identity_cache(event.request)
+        invalidate_user(event.request, user)
+
+
+@subscriber(PasswordResetEvent)
+@subscriber(UserGroupsChanged)
+def user_principals_changed(event):
+    """Drop cached principals when user groups or credentials change."""
+    if event.request is not None:
+        clear_identity_cache(event.request)
+        invalidate_user(event.request, event.user)
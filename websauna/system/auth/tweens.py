@@ -1,6 +1,9 @@
 """Authentication tweens."""
 from pyramid.httpexceptions import HTTPFound
 from pyramid.registry import Registry
+from websauna.system.auth import principalcache
+from websauna.system.auth.principalcache import get_principal_cache
+from websauna.system.auth.principals import get_auth_state
 from websauna.system.core import messages
 from websauna.system.http import Request
 
@@ -15,14 +18,31 @@ class SessionInvalidationTweenFactory:
         self.handler = handler
         self.registry = registry
 
+    def is_valid_session(self, request:Request) -> bool:
+        """Check the session against the user authentication details.
+
+        With ``websauna.principal_cache`` enabled use the cached details, so that the user does not need to be loaded from the database.
+        """
+        if get_principal_cache(self.registry) is None:
+            user = request.user
+            if user:
+                return user.is_valid_session(request.session["created_at"])
+            return True
+
+        session_token = request.unauthenticated_userid
+        if session_token is None:
+            return True
+
+        state = get_auth_state(session_token, request)
+        if state and state["principals"] is not None:
+            return principalcache.is_valid_session(state, request.session["created_at"])
+        return True
+
     def __call__(self, request:Request):
-        user = request.user
-        if user:
-            session_created_at = request.session["created_at"]
-            if not user.is_valid_session(session_created_at):
-                request.session.invalidate()
-                messages.add(request, kind="error", msg="Your have been logged out due to authentication changes.   ", msg_id="msg-session-invalidated")
-                return HTTPFound(request.application_url)
+        if not self.is_valid_session(request):
+            request.session.invalidate()
+            messages.add(request, kind="error", msg="Your have been logged out due to authentication changes.   ", msg_id="msg-session-invalidated")
+            return HTTPFound(request.application_url)
 
         response = self.handler(request)
         return response
\ No newline at end of file
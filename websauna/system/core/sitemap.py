@@ -37,6 +37,8 @@ Example::
 
 import abc
 
+from websauna.system.model.routing import use_replica
+
 
 class SitemapItem(abc.ABC):
     """Present an item apperearing in the sitemap.
@@ -107,6 +109,7 @@ class Sitemap:
         for generator in self.generators:
             yield from generator()
 
+    @use_replica
     def render(self, context, request):
         """Render the sitemap.
 
@@ -0,0 +1,140 @@
+"""Bulk actions on CRUD listings.
+
+A bulk action is applied to the rows selected on a listing page, or to all rows the listing query matches. Actions are executed as set-based SQL: one ``UPDATE ... WHERE id IN (...)`` or ``DELETE ... WHERE id IN (...)`` statement per chunk of ids, instead of loading, modifying and flushing each object separately.
+
+Because the statements bypass the ORM unit of work, no ORM events or relationship cascades are triggered. Actions needing side effects per item should override :py:meth:`BulkAction.execute_chunk`.
+"""
+from abc import abstractmethod
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import Session
+import zope.sqlalchemy
+
+from websauna.compat.typing import Iterable
+from websauna.compat.typing import List
+from websauna.compat.typing import Optional
+from websauna.compat.typing import Tuple
+from websauna.system.form.vocabulary import invalidate_on_commit
+from websauna.system.http import Request
+
+
+def iterate_id_chunks(query: Query, model: type, ids: Optional[List[int]], chunk_size: int) -> Iterable[List[int]]:
+    """Split the target rows of a bulk action to chunks of ids.
+
+    :param ids: Explicitly selected ids. If ``None`` iterate ids of all rows matching the query using keyset pagination, so that rows deleted by the previous chunk do not shift the next chunk.
+    """
+    if ids is not None:
+        for i in range(0, len(ids), chunk_size):
+            yield ids[i:i + chunk_size]
+        return
+
+    last_id = None
+    id_query = query.with_entities(model.id).order_by(None).order_by(model.id)
+    while True:
+        q = id_query
+        if last_id is not None:
+            q = q.filter(model.id > last_id)
+        chunk = [row[0] for row in q.limit(chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+class BulkAction:
+    """Describe an action which can be applied to many listing rows at once."""
+
+    #: How many ids go to one SQL statement
+    chunk_size = 500
+
+    def __init__(self, id: str=None, name: str=None, permission: str="edit"):
+        """
+        :param id: Machine name of the action, submitted by the listing form
+        :param name: Human readable label
+        :param permission: You need to have named permission on the CRUD to see and perform this action
+        """
+        assert id, "Action id missing"
+        assert name, "Action name missing"
+        self.id = id
+        self.name = name
+        self.permission = permission
+
+    def is_visible(self, context, request: Request) -> bool:
+        if self.permission:
+            return request.has_permission(self.permission, context)
+        return True
+
+    def get_choices(self, request: Request, model: type) -> List[Tuple[str, str]]:
+        """List (value, label) choices for the listing action menu.
+
+        Override to let the user pick a target for the action, e.g. a group where users are added. The picked value is passed as ``target`` to :py:meth:`execute_chunk`.
+        """
+        return [(self.id, self.name)]
+
+    def execute(self, request: Request, dbsession: Session, model: type, chunks: Iterable[List[int]], target: str=None) -> int:
+        """Run the action for all chunks.
+
+        :return: Number of affected rows
+        """
+        total = 0
+        for ids in chunks:
+            total += self.execute_chunk(request, dbsession, model, ids, target) or 0
+
+        # Bulk statements do not mark the session dirty, tell the transaction manager to commit
+        zope.sqlalchemy.mark_changed(dbsession)
+
+        invalidate_on_commit(dbsession, model)
+        return total
+
+    @abstractmethod
+    def execute_chunk(self, request: Request, dbsession: Session, model: type, ids: List[int], target: str=None) -> int:
+        """Apply the action to one chunk of rows.
+
+        :return: Number of affected rows
+        """
+
+
+class UpdateAction(BulkAction):
+    """Set column values of selected rows with a single ``UPDATE`` per chunk.
+
+    Example::
+
+        UpdateAction(id="publish", name="Publish", values={"published": True})
+    """
+
+    def __init__(self, values: dict=None, **kwargs):
+        super(UpdateAction, self).__init__(**kwargs)
+        assert values, "Give column values to update"
+        self.values = values
+
+    def get_values(self, request: Request, target: str=None) -> dict:
+        """Get the column values to set. Callable values are called to get a fresh value, e.g. current timestamp."""
+        return {key: value() if callable(value) else value for key, value in self.values.items()}
+
+    def execute_chunk(self, request, dbsession, model, ids, target=None):
+        values = self.get_values(request, target)
+        return dbsession.query(model).filter(model.id.in_(ids)).update(values, synchronize_session=False)
+
+
+class DeleteAction(BulkAction):
+    """Delete selected rows with a single ``DELETE`` per chunk.
+
+    Rows of many-to-many association tables pointing to the deleted rows are deleted first, like the ORM would do when deleting a single object. Other dependent rows must be taken care by ``ON DELETE`` rules of the foreign keys.
+    """
+
+    def __init__(self, id: str="delete", name: str="Delete", permission: str="delete"):
+        super(DeleteAction, self).__init__(id=id, name=name, permission=permission)
+
+    def delete_associations(self, dbsession: Session, model: type, ids: List[int]):
+        for relationship in inspect(model).relationships:
+            secondary = relationship.secondary
+            if secondary is None:
+                continue
+            for parent_column, secondary_column in relationship.synchronize_pairs:
+                if parent_column is inspect(model).primary_key[0]:
+                    dbsession.execute(secondary.delete().where(secondary_column.in_(ids)))
+
+    def execute_chunk(self, request, dbsession, model, ids, target=None):
+        self.delete_associations(dbsession, model, ids)
+        return dbsession.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
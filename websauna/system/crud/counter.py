@@ -0,0 +1,142 @@
+"""Row count strategies for CRUD listings.
+
+Counting rows of a large table with ``SELECT count(*)`` is a full scan in PostgreSQL. Listings can pick a cheaper strategy by setting :py:attr:`websauna.system.crud.views.Listing.counter`::
+
+    from websauna.system.crud.counter import EstimatedCount
+
+    class UserListing(admin_views.Listing):
+
+        counter = EstimatedCount()
+"""
+import hashlib
+import json
+import logging
+from abc import ABC, abstractmethod
+
+from sqlalchemy import text
+from sqlalchemy.orm import Query
+
+from websauna.system.core.redis import get_redis
+from websauna.system.http import Request
+
+
+logger = logging.getLogger(__name__)
+
+
+class Counter(ABC):
+    """Count total number of items in a listing query."""
+
+    #: Set if the returned count may differ from the real row count
+    approximate = False
+
+    @abstractmethod
+    def count(self, request: Request, query: Query) -> int:
+        """Return the number of rows the query produces."""
+
+
+class ExactCount(Counter):
+    """Run ``SELECT count(*)`` on every call."""
+
+    def count(self, request: Request, query: Query) -> int:
+        return query.count()
+
+
+class EstimatedCount(Counter):
+    """Use PostgreSQL planner statistics to estimate the row count.
+
+    * For unfiltered queries read ``pg_class.reltuples`` of the table
+
+    * For filtered queries read the estimated row count of ``EXPLAIN`` plan
+
+    Neither of these touch the table rows. Estimates are only as fresh as the last ``ANALYZE`` of the table.
+
+    :param exact_threshold: If the estimate is below this number do an exact count instead. Estimates are poor for small tables and exact counts are cheap there.
+    """
+
+    approximate = True
+
+    exact_threshold = 1000
+
+    def __init__(self, exact_threshold: int=None):
+        if exact_threshold is not None:
+            self.exact_threshold = exact_threshold
+
+    def get_table_estimate(self, query: Query) -> int:
+        """Read row estimate from ``pg_class``."""
+        entity = query.column_descriptions[0]["entity"]
+        table = entity.__table__
+        name = "{}.{}".format(table.schema, table.name) if table.schema else table.name
+        result = query.session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:name AS regclass)"), {"name": name})
+        return int(result.scalar() or 0)
+
+    def get_plan_estimate(self, query: Query) -> int:
+        """Read row estimate from the query plan."""
+        session = query.session
+        compiled = query.statement.compile(dialect=session.get_bind().dialect)
+        result = session.connection().execute("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params)
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def is_unfiltered(self, query: Query) -> bool:
+        """Does the query list all rows of one table as is.
+
+        Eager loading joins added by ``joinedload()`` options do not change the row count, so they are left out of the check.
+        """
+        if query.whereclause is not None or len(query.column_descriptions) != 1:
+            return False
+        entity = query.column_descriptions[0]["entity"]
+        table = getattr(entity, "__table__", None)
+        if table is None:
+            return False
+        statement = query.enable_eagerloads(False).statement
+        return statement.whereclause is None and statement.froms == [table]
+
+    def count(self, request: Request, query: Query) -> int:
+        if self.is_unfiltered(query):
+            estimate = self.get_table_estimate(query)
+        else:
+            estimate = self.get_plan_estimate(query)
+
+        if estimate < self.exact_threshold:
+            return query.count()
+
+        return estimate
+
+
+class CachedCount(Counter):
+    """Cache exact counts in Redis.
+
+    The cache key is derived from the SQL statement and its parameters, so differently filtered listings do not share counts. The count may lag behind inserts and deletes by ``ttl`` seconds.
+
+    :param ttl: How many seconds the count is cached
+    """
+
+    approximate = True
+
+    ttl = 60
+
+    key_prefix = "crud_count_"
+
+    def __init__(self, ttl: int=None):
+        if ttl is not None:
+            self.ttl = ttl
+
+    def get_cache_key(self, query: Query) -> str:
+        compiled = query.statement.compile(dialect=query.session.get_bind().dialect)
+        params = sorted((k, repr(v)) for k, v in compiled.params.items())
+        digest = hashlib.sha1("{}{}".format(compiled, params).encode("utf-8")).hexdigest()
+        return self.key_prefix + digest
+
+    def count(self, request: Request, query: Query) -> int:
+        redis = get_redis(request.registry)
+        key = self.get_cache_key(query)
+
+        cached = redis.get(key)
+        if cached is not None:
+            return int(cached)
+
+        count = query.count()
+        redis.setex(key, self.ttl, count)
+        return count
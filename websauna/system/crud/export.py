@@ -0,0 +1,81 @@
+"""Streaming export of CRUD listings.
+
+Exports are written row by row to the response while the rows are fetched from the database with a server-side cursor. Memory use stays flat regardless of how many rows are exported.
+"""
+import csv
+import datetime
+import io
+import json
+
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import Session
+
+from websauna.compat.typing import Iterable
+from websauna.compat.typing import List
+
+
+#: Supported export formats: format name -> (content type, file extension)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-jsonlines", "jsonl"),
+}
+
+
+def format_value(value) -> object:
+    """Convert a column value to something CSV and JSON can present."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    elif isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def iter_csv(columns: List, view, objects: Iterable) -> Iterable[bytes]:
+    """Encode objects as CSV rows, header first.
+
+    :param columns: List of :py:class:`websauna.system.crud.listing.Column`
+    :param view: Listing view passed to :py:meth:`websauna.system.crud.listing.Column.get_value`
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def flush():
+        data = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return data.encode("utf-8")
+
+    writer.writerow([c.name for c in columns])
+    yield flush()
+
+    for obj in objects:
+        writer.writerow([format_value(c.get_value(view, obj)) for c in columns])
+        yield flush()
+
+
+def iter_jsonl(columns: List, view, objects: Iterable) -> Iterable[bytes]:
+    """Encode objects as JSON Lines, one object keyed by column ids per line."""
+    for obj in objects:
+        row = {c.id: format_value(c.get_value(view, obj)) for c in columns}
+        yield (json.dumps(row) + "\n").encode("utf-8")
+
+
+def stream_query(query: Query, batch_size: int=1000) -> Iterable[object]:
+    """Iterate query results in batches using a server-side cursor.
+
+    The response body is generated after the request transaction has been committed and the request database session closed. Thus, the query is run in a session of its own, which is closed when the iteration ends.
+
+    The database is picked when this function is called, so that a view reading from a replica streams from the replica too.
+    """
+    bind = query.session.get_bind(clause=query.statement)
+    return _stream_query(query, bind, batch_size)
+
+
+def _stream_query(query: Query, bind, batch_size: int) -> Iterable[object]:
+    session = Session(bind=bind)
+    try:
+        query = query.with_session(session).execution_options(stream_results=True).yield_per(batch_size)
+        for obj in query:
+            yield obj
+    finally:
+        session.close()
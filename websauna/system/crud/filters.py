@@ -0,0 +1,191 @@
+"""Filters for CRUD listing columns.
+
+A filter reads its values from the listing request query string and turns them to a ``WHERE`` clause of the listing query. Set a filter on a column::
+
+    from websauna.system.crud import filters
+    from websauna.system.crud import listing
+
+    table = listing.Table(
+        columns = [
+            listing.Column("email", "Email", filter=filters.PrefixFilter(), sortable=True),
+            listing.Column("created_at", "Created", filter=filters.RangeFilter(), sortable=True),
+            listing.Column("enabled", "Enabled", filter=filters.EqualFilter()),
+        ]
+    )
+
+Filtering is done by the database, so the filtered columns should be indexed on large tables.
+"""
+import datetime
+import uuid
+
+import iso8601
+from pyramid.settings import asbool
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Query
+
+from websauna.compat.typing import List
+from websauna.compat.typing import Optional
+from websauna.system.http import Request
+
+
+class InvalidFilterValue(Exception):
+    """Filter value in the query string cannot be converted to the column type."""
+
+
+def convert_value(expression, value: str):
+    """Convert a query string value to the Python type of a column."""
+    try:
+        python_type = expression.type.python_type
+    except NotImplementedError:
+        return value
+
+    try:
+        if issubclass(python_type, bool):
+            return asbool(value)
+        elif issubclass(python_type, datetime.datetime):
+            return iso8601.parse_date(value)
+        elif issubclass(python_type, datetime.date):
+            return iso8601.parse_date(value).date()
+        elif issubclass(python_type, uuid.UUID):
+            return uuid.UUID(value)
+        elif issubclass(python_type, (int, float)):
+            return python_type(value)
+    except (ValueError, iso8601.ParseError) as e:
+        raise InvalidFilterValue("Bad filter value {} for {}".format(value, expression)) from e
+
+    return value
+
+
+def escape_like(value: str, escape: str="\\") -> str:
+    """Escape LIKE pattern characters in user input."""
+    return value.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
+
+
+class Filter:
+    """Filter listing rows by a column.
+
+    The column values are read from the query string parameter ``filter_<column id>``.
+    """
+
+    #: Template rendering the filter inputs in the listing filter bar
+    template = "crud/filter_text.html"
+
+    #: Model attribute to filter. Default to the column id.
+    attr = None
+
+    def __init__(self, attr: str=None, template: str=None):
+        if attr:
+            self.attr = attr
+
+        if template:
+            self.template = template
+
+    def get_param_name(self, column) -> str:
+        return "filter_{}".format(column.id)
+
+    def get_param_names(self, column) -> List[str]:
+        """All query string parameters this filter reads."""
+        return [self.get_param_name(column)]
+
+    def get_value(self, request: Request, column) -> Optional[str]:
+        """Get the filter value from the request, or ``None`` if the filter is not active."""
+        value = request.params.get(self.get_param_name(column), "").strip()
+        return value or None
+
+    def is_active(self, request: Request, column) -> bool:
+        return any(request.params.get(name, "").strip() for name in self.get_param_names(column))
+
+    def get_expression(self, model: type, column):
+        return getattr(model, self.attr or column.id)
+
+    def apply(self, query: Query, model: type, column, request: Request) -> Query:
+        """Add the filter criteria to the query.
+
+        :raise InvalidFilterValue: If the user gave a value which cannot be used with the column
+        """
+        value = self.get_value(request, column)
+        if value is None:
+            return query
+        return self.filter(query, self.get_expression(model, column), value)
+
+    def filter(self, query: Query, expression, value: str) -> Query:
+        raise NotImplementedError()
+
+
+class EqualFilter(Filter):
+    """Match rows where the column equals the given value."""
+
+    def filter(self, query, expression, value):
+        return query.filter(expression == convert_value(expression, value))
+
+
+class PrefixFilter(Filter):
+    """Match rows where the column starts with the given text.
+
+    Case insensitive matching can use a ``pg_trgm`` GIN index. Case sensitive matching can use a btree index with ``text_pattern_ops``.
+    """
+
+    case_sensitive = False
+
+    def __init__(self, case_sensitive: bool=None, **kwargs):
+        super(PrefixFilter, self).__init__(**kwargs)
+        if case_sensitive is not None:
+            self.case_sensitive = case_sensitive
+
+    def filter(self, query, expression, value):
+        pattern = escape_like(value) + "%"
+        if self.case_sensitive:
+            return query.filter(expression.like(pattern, escape="\\"))
+        return query.filter(expression.ilike(pattern, escape="\\"))
+
+
+class RangeFilter(Filter):
+    """Match rows where the column is between given minimum and maximum values, inclusive.
+
+    Either end can be left open. Values are read from ``filter_<column id>_min`` and ``filter_<column id>_max``.
+    """
+
+    template = "crud/filter_range.html"
+
+    def get_param_names(self, column):
+        name = self.get_param_name(column)
+        return [name + "_min", name + "_max"]
+
+    def apply(self, query, model, column, request):
+        expression = self.get_expression(model, column)
+        min_name, max_name = self.get_param_names(column)
+
+        min_value = request.params.get(min_name, "").strip()
+        if min_value:
+            query = query.filter(expression >= convert_value(expression, min_value))
+
+        max_value = request.params.get(max_name, "").strip()
+        if max_value:
+            query = query.filter(expression <= convert_value(expression, max_value))
+
+        return query
+
+
+class FullTextFilter(Filter):
+    """Match rows using PostgreSQL full text search.
+
+    If the column is a ``TSVECTOR`` it is matched as is. Otherwise the column text is converted with ``to_tsvector(config, column)``, which can use an expression GIN index built with the same text search configuration.
+
+    :param config: PostgreSQL text search configuration, like ``simple`` or ``english``
+    """
+
+    config = "simple"
+
+    def __init__(self, config: str=None, **kwargs):
+        super(FullTextFilter, self).__init__(**kwargs)
+        if config:
+            self.config = config
+
+    def get_vector(self, expression):
+        if isinstance(expression.type, TSVECTOR):
+            return expression
+        return func.to_tsvector(self.config, expression)
+
+    def filter(self, query, expression, value):
+        return query.filter(self.get_vector(expression).op("@@")(func.plainto_tsquery(self.config, value)))
@@ -10,6 +10,7 @@ from websauna.compat.typing import Callable
 from websauna.compat.typing import List
 
 from websauna.system.form.fieldmapper import DefaultSQLAlchemyFieldMapper
+from websauna.system.form.fieldmapper import is_cacheable
 from websauna.system.form.resourceregistry import ResourceRegistry
 from websauna.system.form.editmode import EditMode
 from websauna.system.http import Request
@@ -95,13 +96,27 @@ class SQLAlchemyFormGenerator(FormGenerator):
     If ``includes`` is set to ``None`` it tries to convert all columns to fields it sees on a model.
 
     For example use case see :py:class:`websauna.system.user.adminviews.UserAdd`.
+
+    Introspecting the model is slow, so if the field mapper opts in with :py:attr:`websauna.system.form.fieldmapper.ColumnToFieldMapper.cacheable` the generated schema is kept as a template per model and edit mode. Each form gets a clone of the template, which is then customized and bound to the request.
     """
     
     def __init__(self, includes=None, field_mapper=DefaultSQLAlchemyFieldMapper(), customize_schema: Callable=None, schema_binder: Callable=None):
         self.includes = includes
         self.field_mapper = field_mapper
+        self.schema_cache = {}
         super(SQLAlchemyFormGenerator, self).__init__(customize_schema, schema_binder)
 
+    def generate_schema(self, request: Request, context: object, mode: EditMode, model: type) -> colander.SchemaNode:
+        """Map the model to a schema or clone a previously mapped one."""
+        if not is_cacheable(self.field_mapper):
+            return self.field_mapper.map(mode, request, context, model, self.includes, nested=True)
+
+        key = (model, mode)
+        template = self.schema_cache.get(key)
+        if template is None:
+            template = self.schema_cache[key] = self.field_mapper.map(mode, request, context, model, self.includes, nested=True)
+        return template.clone()
+
     def generate_form(self, request: Request, context: object, mode: EditMode, buttons: List[deform.Button], model: type) -> deform.Form:
-        schema = self.field_mapper.map(mode, request, context, model, self.includes, nested=True)
+        schema = self.generate_schema(request, context, mode, model)
         return self.create_deform(schema, request, context, mode, buttons, model)
\ No newline at end of file
@@ -1,8 +1,77 @@
+from sqlalchemy import inspect
+from sqlalchemy import UniqueConstraint
+from sqlalchemy.orm import joinedload, load_only
+
+try:
+    from sqlalchemy.orm import selectinload as collectionload
+except ImportError:
+    # SQLAlchemy < 1.2
+    from sqlalchemy.orm import subqueryload as collectionload
+
 from websauna.compat.typing import Optional
 from websauna.compat.typing import List
 from websauna.compat.typing import Callable
 
 
+def get_eager_load_option(model: type, path: str):
+    """Build SQLAlchemy loader option for a dotted relationship path like ``owner.groups``.
+
+    Many-to-one relationships are joined into the listing query. Collections are loaded with one extra query per relationship for all rows.
+
+    :return: Loader option or ``None`` if the path does not point to a relationship
+    """
+    option = None
+    current = model
+    for name in path.split("."):
+        mapper = inspect(current)
+        if name not in mapper.relationships:
+            return option
+
+        rel = mapper.relationships[name]
+        attr = getattr(current, name)
+        loader = collectionload if rel.uselist else joinedload
+
+        if option is None:
+            option = loader(attr)
+        else:
+            option = getattr(option, loader.__name__)(attr)
+
+        current = rel.mapper.class_
+
+    return option
+
+
+def is_indexed(attr) -> bool:
+    """Check if a model column attribute is the leading column of a primary key, unique constraint or index declared in the model metadata."""
+    prop = getattr(attr, "property", None)
+    columns = getattr(prop, "columns", None)
+    if not columns:
+        return False
+
+    column = columns[0]
+    table = getattr(column, "table", None)
+    if table is None:
+        return False
+
+    if column.primary_key and list(table.primary_key.columns)[0] is column:
+        return True
+
+    if column.index or column.unique:
+        return True
+
+    for index in table.indexes:
+        index_columns = list(index.columns)
+        if index_columns and index_columns[0] is column:
+            return True
+
+    for constraint in table.constraints:
+        constraint_columns = list(getattr(constraint, "columns", []))
+        if isinstance(constraint, UniqueConstraint) and constraint_columns and constraint_columns[0] is column:
+            return True
+
+    return False
+
+
 class Column:
     """Define listing in a column."""
 
@@ -20,7 +89,19 @@ class Column:
     #: Arrow formatting string
     format = "MM/DD/YYYY HH:mm"
 
-    def __init__(self, id, name=None, renderer=None, header_template=None, body_template=None, getter: Callable=None, format=None, navigate_view_name=None, navigate_url_getter=None):
+    #: Can the listing be sorted by this column
+    sortable = False
+
+    #: Model attribute name the listing is sorted by. Default to the column id.
+    sort_key = None
+
+    #: Instance of :py:class:`websauna.system.crud.filters.Filter` if the listing can be filtered by this column
+    filter = None
+
+    #: List of model attribute names this column reads. Relationships, including dotted paths like ``owner.groups``, are eagerly loaded by the listing query. ``None`` means the column reads only the attribute named by ``id``.
+    load = None
+
+    def __init__(self, id, name=None, renderer=None, header_template=None, body_template=None, getter: Callable=None, format=None, navigate_view_name=None, navigate_url_getter=None, load: Optional[List[str]]=None, sortable: bool=None, sort_key: str=None, filter=None):
         """
         :param id: Must match field id on the model
         :param name:
@@ -30,6 +111,10 @@ class Column:
         :param getter: func(view instance, object) - extract value for this column for an object
         :param navigate_url_getter: callback(request, resource) to generate the target URL if the contents of this cell is clicked
         :param navigate_view_name: If set, make this column clickable and navigates to the traversed name. Options are "show", "edit", "delete"
+        :param load: Model attributes and relationships the column needs, so that the listing can load them in a constant number of queries. Give this when using ``getter``.
+        :param sortable: Let the user sort the listing by this column
+        :param sort_key: Model attribute to sort by if not the column id
+        :param filter: :py:class:`websauna.system.crud.filters.Filter` to let the user filter the listing by this column
         :return:
         """
         self.id = id
@@ -52,6 +137,32 @@ class Column:
         if navigate_url_getter:
             self.navigate_url_getter = navigate_url_getter
 
+        if load is not None:
+            self.load = load
+
+        if sortable is not None:
+            self.sortable = sortable
+
+        if sort_key:
+            self.sort_key = sort_key
+
+        if filter:
+            self.filter = filter
+
+    def get_sort_expression(self, model: type):
+        """Get the SQLAlchemy expression the listing is ordered by when sorting by this column."""
+        return getattr(model, self.sort_key or self.id)
+
+    def get_load_attributes(self, model: type) -> List[str]:
+        """Get the names of model attributes and relationships this column reads."""
+        if self.load is not None:
+            return self.load
+
+        if not self.getter and hasattr(model, self.id):
+            return [self.id]
+
+        return []
+
     def get_value(self, view, obj):
         """Extract value from the object for this column.
 
@@ -120,6 +231,10 @@ class StringPresentationColumn(Column):
         self.formatter = kwargs.pop("formatter", str)
         super(StringPresentationColumn, self).__init__(**kwargs)
 
+    def get_load_attributes(self, model: type) -> List[str]:
+        # We cannot know what __str__ reads
+        return self.load or []
+
     def get_value(self, view, obj):
         """Extract value from the object for this column.
 
@@ -131,6 +246,9 @@ class StringPresentationColumn(Column):
 
 class ControlsColumn(Column):
     """Render View / Edit / Delete buttons."""
+
+    load = []
+
     def __init__(self, id="controls", name="Actions", header_template="crud/column_header_controls.html", body_template="crud/column_body_controls.html"):
         super(ControlsColumn, self).__init__(id=id, name=name, header_template=header_template, body_template=body_template)
 
@@ -157,3 +275,42 @@ class Table:
 
     def get_columns(self):
         return self.columns
+
+    def get_column(self, id: str) -> Optional[Column]:
+        for column in self.get_columns():
+            if column.id == id:
+                return column
+        return None
+
+    def get_unindexed_sort_columns(self, model: type) -> List[Column]:
+        """Find sortable columns which no database index can serve.
+
+        Sorting a large table by an unindexed column sorts all matching rows before the first page can be returned.
+        """
+        return [c for c in self.get_columns() if c.sortable and not is_indexed(c.get_sort_expression(model))]
+
+    def get_load_options(self, model: type, required: Optional[List[str]]=None, restrict_columns=False) -> List:
+        """Get SQLAlchemy loader options to load everything the columns need with the listing query.
+
+        :param model: Listed SQLAlchemy model
+        :param required: Extra column attributes which must be always loaded, e.g. the primary key and the URL mapping attribute
+        :param restrict_columns: Load only the columns the table needs, defer others. Only safe if all columns declare what they read.
+        :return: List of options for ``Query.options()``
+        """
+        options = []
+        column_names = set(required or [])
+
+        mapper = inspect(model)
+        for column in self.get_columns():
+            for name in column.get_load_attributes(model):
+                if "." in name or name in mapper.relationships:
+                    option = get_eager_load_option(model, name)
+                    if option is not None:
+                        options.append(option)
+                elif name in mapper.column_attrs:
+                    column_names.add(name)
+
+        if restrict_columns and column_names:
+            options.append(load_only(*sorted(column_names)))
+
+        return options
@@ -1,6 +1,22 @@
 from urllib.parse import urlencode, urlsplit, parse_qsl, urlunsplit
+import base64
+import binascii
+import datetime
 import itertools
+import json
 import math
+import uuid
+
+import iso8601
+from pyramid.httpexceptions import HTTPBadRequest
+from sqlalchemy import and_
+from sqlalchemy import false
+from sqlalchemy import or_
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from websauna.compat.typing import List
+from websauna.compat.typing import Optional
 
 
 def merge_url_qs(url, **kw):
@@ -19,6 +35,24 @@ def merge_url_qs(url, **kw):
         )
 
 
+def drop_url_qs(url, *names):
+    """Remove named query string elements from a URL."""
+    segments = urlsplit(url)
+    qs = [(k, v) for (k, v) in parse_qsl(segments.query, keep_blank_values=1) if k not in names]
+    return urlunsplit(
+        (segments.scheme, segments.netloc, segments.path, urlencode(qs), segments.fragment)
+        )
+
+
+def slice_sequence(seq, start, end) -> list:
+    """Take a slice of a sequence as a list.
+
+    Sequences supporting slicing, like lists and SQLAlchemy ``Query``, are sliced directly. For ``Query`` this turns to ``LIMIT`` and ``OFFSET`` in SQL, so that we do not load any rows outside the slice. Other iterables are consumed with ``itertools.islice``.
+    """
+    if hasattr(seq, "__getitem__"):
+        return list(seq[start:end])
+    return list(itertools.islice(seq, start, end))
+
 
 class Batch(object):
     """Present one paginator batch in the list rendering output.
@@ -46,7 +80,8 @@ class Batch(object):
       The value obtained from ``request.params['batch_size']`` or
       ``default_size`` if no ``batch_size`` parameter exists in
       ``request.params`` or the ``batch_size`` parameter could not
-      successfully be converted to a positive interger.
+      successfully be converted to a positive interger. The size is capped
+      to ``max_size`` if given.
 
     ``num``
 
@@ -133,6 +168,13 @@ class Batch(object):
 
       This is total length of the sequence (across all batches).
 
+    ``seqlen_approximate``
+
+      ``True`` if ``seqlen`` is an estimate, e.g. from
+      :py:class:`websauna.system.crud.counter.EstimatedCount`. The estimate
+      is only displayed. Whether there is a next batch is found out by
+      fetching one extra item, and ``last_url`` is not available.
+
     ``startitem``
 
       The item number that starts this batch (indexed from zero).
@@ -143,7 +185,7 @@ class Batch(object):
 
     """
     def __init__(self, seq, request, url=None, default_size=10, toggle_size=40,
-                 seqlen=None):
+                 seqlen=None, max_size=None, seqlen_approximate=False):
         if url is None:
             url = request.url
 
@@ -160,6 +202,8 @@ class Batch(object):
             size = default_size
         if size < 1:
             size = default_size
+        if max_size and size > max_size:
+            size = max_size
 
         multicolumn = request.params.get('multicolumn', '') == 'True'
 
@@ -175,13 +219,24 @@ class Batch(object):
         if seqlen is None:
             # won't work if seq is a generator
             seqlen = len(seq)
+            seqlen_approximate = False
         start = num * size
-        end = start + size
-        if end > seqlen:
-            end = seqlen
-        items = list(itertools.islice(seq, start, end))
+
+        if seqlen_approximate:
+            # Page by the rows which really exist, fetch one extra to see if there is a next batch
+            items = slice_sequence(seq, start, start + size + 1)
+            has_next = len(items) > size
+            items = items[:size]
+            end = start + len(items)
+            last = None
+        else:
+            end = start + size
+            if end > seqlen:
+                end = seqlen
+            items = slice_sequence(seq, start, end)
+            has_next = seqlen > end
+            last = int(math.ceil(seqlen / float(size)) - 1)
         length = len(items)
-        last = int(math.ceil(seqlen / float(size)) - 1)
 
         first_url = None
         prev_url = None
@@ -193,9 +248,9 @@ class Batch(object):
             first_url = merge_url_qs(url, batch_size=size, batch_num=0)
         if start >= size:
             prev_url = merge_url_qs(url, batch_size=size, batch_num=num-1)
-        if seqlen > end:
+        if has_next:
             next_url = merge_url_qs(url, batch_size=size, batch_num=num+1)
-        if size and (num < last):
+        if size and last is not None and (num < last):
             last_url = merge_url_qs(url, batch_size=size, batch_num=last)
 
         if prev_url or next_url:
@@ -210,6 +265,7 @@ class Batch(object):
         self.enditem = end - 1
         self.last = last
         self.seqlen = seqlen
+        self.seqlen_approximate = seqlen_approximate
         self.items = items
         self.num = num
         self.size = size
@@ -247,19 +303,307 @@ class Batch(object):
 
 
 class DefaultPaginator:
-    """Default pagination implementation for CRUD, having 20 items per page."""
+    """Default pagination implementation for CRUD, having 20 items per page.
+
+    The maximum page size the user can ask through ``batch_size`` query parameter is capped by ``websauna.crud_max_batch_size`` setting, 200 items by default.
+    """
 
     template = "crud/paginator.html"
 
     default_size = 20
 
-    def __init__(self, template=None, default_size=None):
+    #: Upper limit for ``batch_size`` if not given in the settings
+    max_size = 200
+
+    def __init__(self, template=None, default_size=None, max_size=None):
         if template:
             self.template = template
 
         if default_size:
             self.default_size = default_size
 
-    def paginate(self, seq, request, count, url=None) -> Batch:
-        batch = Batch(seq, request, seqlen=count, url=url, default_size=self.default_size)
+        if max_size:
+            self.max_size = max_size
+
+    def get_max_size(self, request) -> int:
+        """Get the maximum allowed batch size for a request."""
+        return int(request.registry.settings.get("websauna.crud_max_batch_size", self.max_size))
+
+    def paginate(self, seq, request, count, url=None, approximate=False) -> Batch:
+        """
+        :param approximate: The count is an estimate, use it for display only
+        """
+        batch = Batch(seq, request, seqlen=count, url=url, default_size=self.default_size, max_size=self.get_max_size(request), seqlen_approximate=approximate)
+        return batch
+
+
+class InvalidCursor(Exception):
+    """Keyset pagination cursor token could not be decoded."""
+
+
+class _CursorEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, uuid.UUID)):
+            return str(o)
+        return super(_CursorEncoder, self).default(o)
+
+
+def encode_cursor(values: list) -> str:
+    """Encode key values of a row to an opaque URL-safe cursor token."""
+    data = json.dumps(values, cls=_CursorEncoder, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    """Decode cursor token back to a list of raw JSON key values.
+
+    :raise InvalidCursor: If the token has been tampered with
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor("Bad cursor {}".format(token)) from e
+
+    if not isinstance(values, list):
+        raise InvalidCursor("Bad cursor {}".format(token))
+
+    return values
+
+
+def _convert_key_value(column, value):
+    """Convert a JSON decoded cursor value back to a Python value for a key column."""
+
+    if value is None:
+        return None
+
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    try:
+        if issubclass(python_type, datetime.datetime):
+            return iso8601.parse_date(value)
+        elif issubclass(python_type, uuid.UUID):
+            return uuid.UUID(value)
+    except (ValueError, iso8601.ParseError) as e:
+        raise InvalidCursor("Bad cursor value {} for {}".format(value, column)) from e
+
+    return value
+
+
+def _is_nullable(column) -> bool:
+    """Can a key column contain NULLs. SQL expressions other than plain columns are assumed nullable."""
+    return getattr(column, "nullable", True) and not getattr(column, "primary_key", False)
+
+
+def get_seek_condition(columns: List, values: List, forward: bool):
+    """Build condition selecting rows after (or before) the key values in ascending key order.
+
+    Plain key columns are compared as a row value ``(a, b) > (1, 2)``, which can use a composite index. NULL never compares true in a row value, so with nullable keys the comparison is expanded key by key. NULLs sort after other values, like PostgreSQL ``ASC`` and ``DESC`` orderings do by default.
+
+    :param forward: True to get rows after the values, False to get rows before them
+    """
+    if not any(_is_nullable(c) for c in columns):
+        if forward:
+            return tuple_(*columns) > tuple_(*values)
+        return tuple_(*columns) < tuple_(*values)
+
+    def after(column, value):
+        if value is None:
+            # Nothing sorts after NULL
+            return false()
+        return or_(column > value, column.is_(None))
+
+    def before(column, value):
+        if value is None:
+            return column.isnot(None)
+        return column < value
+
+    compare = after if forward else before
+
+    conditions = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        equals = [c.isnot_distinct_from(v) for c, v in zip(columns[:i], values[:i])]
+        conditions.append(and_(*(equals + [compare(column, value)])))
+    return or_(*conditions)
+
+
+class KeysetBatch(object):
+    """Present one keyset (seek) paginated batch in the list rendering output.
+
+    Instead of ``OFFSET`` the batch is located by comparing ordered key columns against the keys of the last (or the first) row of the previous page. With an index on the key columns the database can seek directly to the page start, so the cost of fetching a page does not grow with the page number.
+
+    Cursors are opaque tokens in ``batch_after`` and ``batch_before`` query parameters. Attributes are compatible with :py:class:`Batch` where it makes sense. There are no page numbers: ``num``, ``startitem`` and ``enditem`` are not available.
+
+    ``items``
+
+      Rows on this page, in the listing order.
+
+    ``first_url``
+
+      URL of the first page. ``None`` if we are on the first page.
+
+    ``prev_url``
+
+      URL of the page before this page. ``None`` if there is no previous page.
+
+    ``next_url``
+
+      URL of the page after this page. ``None`` if there is no next page.
+
+    ``last_url``
+
+      URL of the last page. ``None`` if we are on the last page.
+
+    ``seqlen``
+
+      Total count of items across all pages, if known.
+    """
+
+    def __init__(self, query: Query, request, keys: List, url=None, default_size=20, seqlen=None, max_size=None, descending=False):
+        """
+        :param query: SQLAlchemy query to paginate. Any existing ordering is replaced by the key order.
+        :param keys: List of column attributes or SQL expressions forming a unique sort key, e.g. ``[User.created_at, User.id]``
+        :param descending: Walk keys in descending order
+        """
+        if url is None:
+            url = request.url
+
+        url = drop_url_qs(url, "batch_after", "batch_before", "batch_last")
+
+        try:
+            size = int(request.params.get('batch_size', default_size))
+        except (TypeError, ValueError):
+            size = default_size
+        if size < 1:
+            size = default_size
+        if max_size and size > max_size:
+            size = max_size
+
+        columns = [k.expression if hasattr(k, "expression") else k for k in keys]
+
+        after = request.params.get("batch_after")
+        before = request.params.get("batch_before")
+        last = request.params.get("batch_last") == "1"
+
+        # Are we walking backwards from the cursor
+        backwards = bool(before) or last
+        cursor = before or after
+
+        query = query.order_by(None)
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(columns):
+                raise InvalidCursor("Cursor does not match keys {}".format(keys))
+
+            values = [_convert_key_value(c, v) for c, v in zip(columns, values)]
+            query = query.filter(get_seek_condition(columns, values, forward=backwards == descending))
+
+        if backwards != descending:
+            query = query.order_by(*[c.desc() for c in columns])
+        else:
+            query = query.order_by(*[c.asc() for c in columns])
+
+        # Keys are selected as extra result columns, so that cursors can be built from any SQL expression, like JSONB values
+        entity_count = len(query.column_descriptions)
+        query = query.add_columns(*[c.label("keyset_key_{}".format(i)) for i, c in enumerate(columns)])
+
+        # Fetch one extra row to see if there are more pages
+        rows = list(query.limit(size + 1))
+        has_more = len(rows) > size
+        rows = rows[:size]
+
+        if backwards:
+            rows.reverse()
+
+        items = [row[0] if entity_count == 1 else tuple(row[:entity_count]) for row in rows]
+        cursors = [encode_cursor(list(row[entity_count:])) for row in rows]
+
+        first_url = prev_url = next_url = last_url = None
+
+        if backwards:
+            # We came from a later page, there is always something after us
+            has_prev = has_more
+            has_next = bool(before)
+        else:
+            has_prev = bool(after)
+            has_next = has_more
+
+        if items:
+            if has_prev:
+                first_url = merge_url_qs(url, batch_size=size)
+                prev_url = merge_url_qs(url, batch_size=size, batch_before=cursors[0])
+            if has_next:
+                next_url = merge_url_qs(url, batch_size=size, batch_after=cursors[-1])
+                last_url = merge_url_qs(url, batch_size=size, batch_last=1)
+
+        self.items = items
+        self.size = size
+        self.length = len(items)
+        self.seqlen = seqlen
+        self.first_url = first_url
+        self.prev_url = prev_url
+        self.next_url = next_url
+        self.last_url = last_url
+        self.required = bool(prev_url or next_url)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return True
+
+
+class KeysetPaginator(DefaultPaginator):
+    """Keyset (seek) pagination for CRUD listings of SQLAlchemy queries.
+
+    Use this for large tables where ``OFFSET`` scanning of deep pages becomes slow. The key columns must form a unique ordering and should be covered by an index.
+
+    Example::
+
+        class UserListing(admin_views.Listing):
+
+            paginator = KeysetPaginator(keys=["created_at", "id"], descending=True)
+
+    Any ordering set by :py:meth:`websauna.system.crud.views.Listing.order_query` is replaced by the key ordering.
+    """
+
+    template = "crud/keyset_paginator.html"
+
+    #: Names of the key columns on the listed model, or column attributes
+    keys = ("id",)
+
+    descending = False
+
+    def __init__(self, keys: Optional[List]=None, descending=None, **kwargs):
+        super(KeysetPaginator, self).__init__(**kwargs)
+
+        if keys:
+            self.keys = keys
+
+        if descending is not None:
+            self.descending = descending
+
+    def get_keys(self, query: Query) -> List:
+        """Resolve key column names against the model of the query."""
+        model = query.column_descriptions[0]["entity"]
+        return [getattr(model, k) if isinstance(k, str) else k for k in self.keys]
+
+    def paginate(self, seq, request, count, url=None, approximate=False, keys: Optional[List]=None, descending: bool=None) -> KeysetBatch:
+        """
+        :param approximate: The count is an estimate. Keyset pages do not depend on the count, so it is only displayed.
+        :param keys: Override the key columns, e.g. when the user has picked a sort column
+        :param descending: Override the key order
+        """
+        keys = keys or self.get_keys(seq)
+        descending = self.descending if descending is None else descending
+        try:
+            batch = KeysetBatch(seq, request, keys=keys, seqlen=count, url=url, default_size=self.default_size, max_size=self.get_max_size(request), descending=descending)
+        except InvalidCursor as e:
+            raise HTTPBadRequest("Invalid pagination cursor") from e
         return batch
@@ -0,0 +1,130 @@
+"""Search box for CRUD listings.
+
+Searches are done in the database against the search columns of the listing. Search columns are model column names, JSONB paths in form ``<jsonb column>/<key>/<key>`` like ``user_data/full_name``, or names of :py:class:`websauna.utils.jsonb.JSONBProperty` attributes.
+
+There are two strategies with different index needs:
+
+* :py:class:`FullTextSearch` matches words against a ``tsvector`` document built of all search columns. Create a matching GIN index with :py:func:`websauna.system.devop.alembic.create_search_index`. Terms containing ``@`` or ``.``, like emails, are matched as substrings with ``ILIKE``.
+
+* :py:class:`TrigramSearch` matches any substring with ``ILIKE``. Create matching ``pg_trgm`` GIN indexes with :py:func:`websauna.system.devop.alembic.create_trigram_indexes`.
+
+Without the indexes the searches work, but scan the whole table.
+"""
+import inspect as python_inspect
+import re
+
+from sqlalchemy import func
+from sqlalchemy import literal_column
+from sqlalchemy import or_
+from sqlalchemy.orm import Query
+
+from websauna.compat.typing import List
+from websauna.utils.jsonb import JSONBProperty
+
+from .filters import escape_like
+
+
+def get_search_expression(model: type, name: str):
+    """Resolve a search column name to a text SQL expression.
+
+    :param name: Column name, JSONB path like ``user_data/full_name`` or JSONBProperty name
+    """
+    if "/" not in name:
+        attr = python_inspect.getattr_static(model, name, None)
+        if isinstance(attr, JSONBProperty):
+            return attr.get_expression(model)
+        return getattr(model, name)
+
+    field, _, pointer = name.partition("/")
+    path = pointer.split("/")
+    column = getattr(model, field)
+    if len(path) == 1:
+        return column[path[0]].astext
+    return column[tuple(path)].astext
+
+
+def get_search_document(model: type, names: List[str], config: str="simple"):
+    """Build a ``tsvector`` of the search columns.
+
+    Columns are concatenated with ``||`` instead of ``concat_ws()``, as index expressions may use immutable functions only.
+    """
+    text = None
+    for name in names:
+        expression = func.coalesce(get_search_expression(model, name), literal_column("''"))
+        text = expression if text is None else text.op("||")(literal_column("' '")).op("||")(expression)
+    return func.to_tsvector(get_config_literal(config), text)
+
+
+def get_config_literal(config: str):
+    """Text search configuration as a ``regconfig`` literal.
+
+    The configuration is rendered in SQL instead of passed as a parameter, so that the expression matches the index expression exactly.
+    """
+    if not re.match(r"^\w+$", config):
+        raise ValueError("Bad text search configuration: {}".format(config))
+    return literal_column("'{}'::regconfig".format(config))
+
+
+def filter_substring(query: Query, model: type, names: List[str], term: str) -> Query:
+    """Match the search term as a case insensitive substring of any search column."""
+    pattern = "%" + escape_like(term) + "%"
+    return query.filter(or_(*[get_search_expression(model, name).ilike(pattern, escape="\\") for name in names]))
+
+
+def to_prefix_tsquery(text: str) -> str:
+    """Convert user input to a ``tsquery`` where all words must match as prefixes.
+
+    ``mikko ohto`` becomes ``mikko:* & ohto:*``. Operator characters are dropped, so that user input cannot produce a ``tsquery`` syntax error.
+    """
+    words = re.findall(r"\w+", text)
+    return " & ".join("{}:*".format(word) for word in words)
+
+
+class Search:
+    """Search strategy for a listing."""
+
+    #: Template of the search box
+    template = "crud/listing_search.html"
+
+    #: Query string parameter of the search term
+    param_name = "q"
+
+    def get_term(self, request) -> str:
+        return request.params.get(self.param_name, "").strip()
+
+    def search(self, query: Query, model: type, names: List[str], term: str) -> Query:
+        """Filter the query by the search term."""
+        raise NotImplementedError()
+
+
+class FullTextSearch(Search):
+    """Match all words of the search term as prefixes of the words in the search columns.
+
+    :param config: PostgreSQL text search configuration. Use ``simple`` for names and emails, language configurations like ``english`` for prose.
+    """
+
+    config = "simple"
+
+    #: Terms like emails and domain names are single tokens in the ``tsvector`` document, but would be split to words here. Such terms are matched as substrings instead.
+    substring_pattern = re.compile(r"[@.]")
+
+    def __init__(self, config: str=None):
+        if config:
+            self.config = config
+
+    def search(self, query, model, names, term):
+        if self.substring_pattern.search(term):
+            return filter_substring(query, model, names, term)
+
+        tsquery = to_prefix_tsquery(term)
+        if not tsquery:
+            return query
+        document = get_search_document(model, names, self.config)
+        return query.filter(document.op("@@")(func.to_tsquery(get_config_literal(self.config), tsquery)))
+
+
+class TrigramSearch(Search):
+    """Match the search term as a case insensitive substring of any search column."""
+
+    def search(self, query, model, names, term):
+        return filter_substring(query, model, names, term)
@@ -0,0 +1,40 @@
+"""Background execution of CRUD bulk actions."""
+from pyramid.path import DottedNameResolver
+
+from websauna.system.task.celery import celery_app as celery
+from websauna.system.task.tasks import TransactionalTask
+
+from .bulk import iterate_id_chunks
+
+
+def get_dotted_name(cls: type) -> str:
+    return "{}:{}".format(cls.__module__, cls.__qualname__)
+
+
+@celery.task(base=TransactionalTask)
+def run_bulk_action(request, listing: str, model: str, action_id: str, ids: list, target: str=None, params: dict=None):
+    """Execute a bulk action of a listing view outside the web request.
+
+    :param listing: Dotted name of :py:class:`websauna.system.crud.views.Listing` subclass declaring the action
+    :param model: Dotted name of the SQLAlchemy model
+    :param ids: Ids of the target rows, or ``None`` for all rows matching the listing
+    :param params: Filter and search parameters of the listing when ``ids`` is ``None``
+    """
+    resolver = DottedNameResolver()
+    listing_view = resolver.resolve(listing)
+    model = resolver.resolve(model)
+
+    action = {a.id: a for a in listing_view.bulk_actions}[action_id]
+    dbsession = request.dbsession
+
+    if ids is None:
+        # Reproduce the listing query, ids are paged through chunk by chunk
+        for name, value in (params or {}).items():
+            request.GET[name] = value
+        context = listing_view.get_bulk_task_context(request, model)
+        query = listing_view(context, request).filter_query(context.get_query())
+    else:
+        query = dbsession.query(model)
+
+    chunks = iterate_id_chunks(query, model, ids, action.chunk_size)
+    action.execute(request, dbsession, model, chunks, target)
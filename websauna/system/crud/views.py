@@ -1,11 +1,16 @@
 """Default CRUD views."""
+import logging
+
 import colander
 from abc import abstractmethod
 
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.httpexceptions import HTTPForbidden
 from pyramid.httpexceptions import HTTPFound
 from pyramid.renderers import render
 from pyramid.request import Request
 from pyramid.response import Response
+from pyramid.session import check_csrf_token
 from pyramid.view import view_config
 from sqlalchemy.orm import Query
 
@@ -15,12 +20,26 @@ from websauna.compat import typing
 from websauna.system.core import messages
 from websauna.system.form import interstitial
 from websauna.system.form.fieldmapper import EditMode
-
+from websauna.system.model.routing import use_primary
+from websauna.system.model.routing import use_replica
+
+from . import bulk
+from . import counter
+from . import export
+from . import filters
+from . import listing as crud_listing
 from . import paginator
 from . import Resource
 from . import CRUD
 
 
+logger = logging.getLogger(__name__)
+
+
+#: Listing classes whose sort columns have been checked for indexes
+_checked_sort_indexes = set()
+
+
 class ResourceButton:
     """Present a button on the top right corner of CRUD views.
 
@@ -115,7 +134,31 @@ class Listing(CRUDView):
     #: How the result of this list should be split to pages
     paginator = paginator.DefaultPaginator()
 
-    resource_buttons = [TraverseLinkButton(id="add", name="Add", view_name="add", permission="add")]
+    #: How the total item count of the listing is calculated. See :py:mod:`websauna.system.crud.counter`.
+    counter = counter.ExactCount()
+
+    #: Load only the model columns the table columns declare and defer the rest. Set this when the model has large columns which are not shown in the listing.
+    load_only_columns = False
+
+    #: How many rows are fetched from the database at a time when exporting the listing
+    export_batch_size = 1000
+
+    #: Instance of :py:class:`websauna.system.crud.search.Search` to show a search box on the listing. ``None`` for no search.
+    search = None
+
+    #: Columns the search box matches, see :py:mod:`websauna.system.crud.search`. If not set use ``search_columns`` of the CRUD.
+    search_columns = None
+
+    #: List of :py:class:`websauna.system.crud.bulk.BulkAction` which can be applied to selected rows
+    bulk_actions = []
+
+    #: Run bulk actions targeting more rows than this as a Celery task after the request. ``None`` to always run in the request.
+    bulk_defer_threshold = None
+
+    resource_buttons = [
+        TraverseLinkButton(id="add", name="Add", view_name="add", permission="add"),
+        TraverseLinkButton(id="export", name="Export", view_name="export", permission="view", tooltip="Download all items as CSV."),
+    ]
 
     def __init__(self, context, request):
         """
@@ -135,29 +178,144 @@ class Listing(CRUDView):
         """Get SQLAlchemy query used in this CRUD listing.
 
         This can include filtering e.g. request user, crud parameters, so on.
+
+        Relationships the table columns declare are eagerly loaded, see :py:meth:`get_load_options`.
         """
-        return self.context.get_query()
+        query = self.filter_query(self.context.get_query())
+        options = self.get_load_options()
+        if options:
+            query = query.options(*options)
+        return query
+
+    def get_filter_columns(self) -> typing.List:
+        """Get columns the listing can be filtered by."""
+        return [c for c in self.table.get_columns() if c.filter] if self.table else []
+
+    def get_search_columns(self) -> typing.List[str]:
+        return self.search_columns or getattr(self.context, "search_columns", None) or []
+
+    def get_search_term(self) -> str:
+        if not self.search or not self.get_search_columns():
+            return ""
+        return self.search.get_term(self.request)
+
+    def filter_query(self, query:Query) -> Query:
+        """Apply the column filters and the search term the user has set in the query string."""
+        model = self.get_model()
+        for column in self.get_filter_columns():
+            try:
+                query = column.filter.apply(query, model, column, self.request)
+            except filters.InvalidFilterValue as e:
+                raise HTTPBadRequest(str(e)) from e
+
+        term = self.get_search_term()
+        if term:
+            query = self.search.search(query, model, self.get_search_columns(), term)
+
+        return query
+
+    def get_load_options(self) -> typing.List:
+        """Get SQLAlchemy loader options, so that rendering listing rows does not issue a query per row.
+
+        See :py:attr:`websauna.system.crud.listing.Column.load`.
+        """
+        if not self.table:
+            return []
+
+        model = self.get_model()
+        required = ["id", self.get_crud().mapper.mapping_attribute]
+        return self.table.get_load_options(model, required=required, restrict_columns=self.load_only_columns)
 
     def get_count(self, query:Query):
         """Calculate total item count based on query."""
-        return query.count()
+        return self.counter.count(self.request, query)
 
     def order_query(self, query:Query):
         """Sort the query."""
         return query
 
+    def get_sort(self) -> typing.Optional[typing.Tuple[crud_listing.Column, bool]]:
+        """Get the column the user has picked for sorting.
+
+        The column is given in ``sort`` query parameter as column id, prefixed with ``-`` for descending order.
+
+        :return: Tuple (column, descending) or ``None`` if the default order is used
+        """
+        sort = self.request.params.get("sort")
+        if not sort or not self.table:
+            return None
+
+        descending = sort.startswith("-")
+        column = self.table.get_column(sort.lstrip("-"))
+        if not column or not column.sortable:
+            return None
+
+        return column, descending
+
+    def sort_query(self, query:Query) -> Query:
+        """Order the query by the column the user picked, overriding :py:meth:`order_query`.
+
+        The primary key is used as a tie breaker, so that pagination is stable.
+        """
+        sort = self.get_sort()
+        if not sort:
+            return query
+
+        column, descending = sort
+        model = self.get_model()
+        keys = [column.get_sort_expression(model), model.id]
+        return query.order_by(None).order_by(*[k.desc() if descending else k.asc() for k in keys])
+
+    def get_sort_url(self, column:crud_listing.Column) -> str:
+        """Get URL sorting the listing by a column. Sorting by the current sort column reverses the order."""
+        sort = self.get_sort()
+        value = column.id
+        if sort and sort[0] is column and not sort[1]:
+            value = "-" + column.id
+
+        url = paginator.drop_url_qs(self.request.url, "batch_num", "batch_after", "batch_before", "batch_last")
+        return paginator.merge_url_qs(url, sort=value)
+
+    def check_sort_indexes(self):
+        """Warn once per listing class about sortable columns without a supporting database index."""
+        cls = type(self)
+        if cls in _checked_sort_indexes or not self.table:
+            return
+
+        _checked_sort_indexes.add(cls)
+        model = self.get_model()
+        for column in self.table.get_unindexed_sort_columns(model):
+            logger.warning("Listing %s is sortable by %s.%s which is not indexed. Sorting large tables by it will be slow.", cls.__name__, model.__name__, column.sort_key or column.id)
+
     def get_title(self) -> str:
         """Get the user-readable name of the listing view (breadcrumbs, etc.)"""
         return "All {}".format(self.get_crud().plural_name)
 
     def paginate(self, query, template_context):
-        """Create template variables for paginatoin results."""
-        total_items =  self.get_count(query)
-        batch = self.paginator.paginate(query, self.request, total_items)
+        """Create template variables for pagination results.
+
+        Only the rows of the current page are loaded from the database. The paginator slices the query, which turns to ``LIMIT`` and ``OFFSET`` in SQL. Approximate counts of :py:attr:`counter` are only displayed, pages are not cut by them.
+
+        Sets ``batch``, ``count`` and ``count_approximate`` template variables.
+        """
+        total_items = self.get_count(query)
+
+        sort = self.get_sort()
+        if sort and isinstance(self.paginator, paginator.KeysetPaginator):
+            # Seek by the sort column instead of the default keys
+            column, descending = sort
+            model = self.get_model()
+            keys = [column.get_sort_expression(model), model.id]
+            batch = self.paginator.paginate(query, self.request, total_items, approximate=self.counter.approximate, keys=keys, descending=descending)
+        else:
+            batch = self.paginator.paginate(query, self.request, total_items, approximate=self.counter.approximate)
+
         template_context["batch"] = batch
         template_context["count"] = total_items
+        template_context["count_approximate"] = self.counter.approximate
 
     @view_config(context=CRUD, name="listing", renderer="crud/listing.html", permission='view')
+    @use_replica
     def listing(self):
         """View for listing model contents in CRUD."""
 
@@ -175,23 +333,145 @@ class Listing(CRUDView):
             if not c.header_template:
                 raise RuntimeError("header_template missing for column: {}".format(c))
 
+        self.check_sort_indexes()
+
         query = self.get_query()
-        query = self.order_query(query)
+        query = self.sort_query(self.order_query(query))
         base_template = self.base_template
 
         # This is to support breadcrums with titled views
         current_view_name = title = self.get_title()
 
         title = self.context.title
-        count =  self.get_count(query)
+
         # Base listing template variables
-        template_vars = dict(title=title, columns=columns, base_template=base_template, query=query, crud=crud, current_view_name=current_view_name, resource_buttons=self.get_resource_buttons(), count=count, view=self)
+        template_vars = dict(title=title, columns=columns, base_template=base_template, query=query, crud=crud, current_view_name=current_view_name, resource_buttons=self.get_resource_buttons(), bulk_actions=self.get_bulk_actions(), filter_columns=self.get_filter_columns(), search=self.search if self.get_search_columns() else None, view=self)
 
-        # Include pagination template context
-        # self.paginate(query, template_vars)
+        # Include pagination template context: batch and count
+        self.paginate(query, template_vars)
 
         return template_vars
 
+    def get_bulk_actions(self) -> typing.List:
+        """Get bulk actions the current user is allowed to perform."""
+        return [a for a in self.bulk_actions if a.is_visible(self.context, self.request)]
+
+    def get_bulk_action_choices(self) -> typing.List:
+        """Get (value, label) pairs for the bulk action menu of the listing."""
+        model = self.get_model()
+        return [choice for action in self.get_bulk_actions() for choice in action.get_choices(self.request, model)]
+
+    def get_bulk_ids(self) -> typing.Optional[typing.List[int]]:
+        """Get ids of the rows selected for a bulk action, or ``None`` when all rows matching the listing query are selected."""
+        if self.request.POST.get("all"):
+            return None
+
+        try:
+            return sorted(set(int(id) for id in self.request.POST.getall("ids")))
+        except ValueError:
+            raise HTTPBadRequest("Bad ids")
+
+    def get_listing_params(self) -> dict:
+        """Get the filter and search query string parameters the user has set, so that the listing query can be reproduced outside this request."""
+        names = [name for column in self.get_filter_columns() for name in column.filter.get_param_names(column)]
+        if self.get_search_term():
+            names.append(self.search.param_name)
+        return {name: self.request.params[name] for name in names if self.request.params.get(name)}
+
+    @classmethod
+    def get_bulk_task_context(cls, request: Request, model: type) -> Resource:
+        """Get the context of the listing in a bulk action task, where there is no traversal.
+
+        Needed when a deferred bulk action targets all rows matching the listing. Override for listings outside the admin.
+        """
+        raise NotImplementedError("Listing {} cannot run deferred bulk actions on all items".format(cls))
+
+    def defer_bulk_action(self, action: bulk.BulkAction, ids: typing.Optional[typing.List[int]], target: str=None):
+        """Run a bulk action as a Celery task after the current transaction commits.
+
+        :param ids: Selected ids, or ``None`` to target all rows matching the listing. The task then reproduces the listing query from :py:meth:`get_listing_params` and pages through the matching ids itself.
+        """
+        from . import tasks
+        listing = tasks.get_dotted_name(type(self))
+        model = tasks.get_dotted_name(self.get_model())
+        params = self.get_listing_params() if ids is None else None
+        tasks.run_bulk_action.apply_async(args=(self.request, listing, model, action.id, ids, target, params))
+
+    @view_config(context=CRUD, name="bulk", request_method="POST", permission='view')
+    @use_primary
+    def bulk_action(self):
+        """Apply a bulk action to the selected rows.
+
+        The form posts ``action``, being ``<action id>`` or ``<action id>:<target>``, and either a list of ``ids`` or ``all`` to target every row matching the listing query.
+        """
+        check_csrf_token(self.request)
+
+        action_id, _, target = self.request.POST.get("action", "").partition(":")
+        actions = {a.id: a for a in self.bulk_actions}
+        action = actions.get(action_id)
+        if not action:
+            raise HTTPBadRequest("Unknown bulk action: {}".format(action_id))
+
+        if not action.is_visible(self.context, self.request):
+            raise HTTPForbidden("Not allowed to perform {}".format(action_id))
+
+        listing_url = self.request.resource_url(self.get_crud(), "listing")
+        ids = self.get_bulk_ids()
+        if ids == []:
+            messages.add(self.request, "No items selected", kind="warning", msg_id="msg-bulk-nothing-selected")
+            return HTTPFound(listing_url)
+
+        model = self.get_model()
+        query = self.filter_query(self.context.get_query())
+        dbsession = query.session
+        target = target or None
+
+        if self.bulk_defer_threshold is not None:
+            if ids is None:
+                # Read no more ids than needed to tell whether to defer, the task pages through the rest
+                deferred = query.with_entities(model.id).order_by(None).limit(self.bulk_defer_threshold + 1).count() > self.bulk_defer_threshold
+                description = "all matching items"
+            else:
+                deferred = len(ids) > self.bulk_defer_threshold
+                description = "{} items".format(len(ids))
+
+            if deferred:
+                self.defer_bulk_action(action, ids, target)
+                messages.add(self.request, "{}: {} will be processed in the background".format(action.name, description), kind="success", msg_id="msg-bulk-deferred")
+                return HTTPFound(listing_url)
+
+        chunks = bulk.iterate_id_chunks(query, model, ids, action.chunk_size)
+        count = action.execute(self.request, dbsession, model, chunks, target)
+        messages.add(self.request, "{}: {} items".format(action.name, count), kind="success", msg_id="msg-bulk-done")
+        return HTTPFound(listing_url)
+
+    def get_export_columns(self) -> typing.List:
+        """Get columns included in the export. Columns without data, like action buttons, are left out."""
+        return [c for c in self.table.get_columns() if not isinstance(c, crud_listing.ControlsColumn)]
+
+    @view_config(context=CRUD, name="export", permission='view')
+    @use_replica
+    def export(self):
+        """Stream all items of the listing as CSV or JSON Lines.
+
+        Pass ``format=jsonl`` query parameter for JSON Lines. The default is CSV.
+        """
+        format = self.request.params.get("format", "csv")
+        if format not in export.FORMATS:
+            raise HTTPBadRequest("Unsupported export format: {}".format(format))
+
+        content_type, extension = export.FORMATS[format]
+        encoder = export.iter_csv if format == "csv" else export.iter_jsonl
+
+        query = self.sort_query(self.order_query(self.get_query()))
+        columns = self.get_export_columns()
+        objects = export.stream_query(query, self.export_batch_size)
+
+        response = Response(content_type=content_type, charset="utf-8")
+        response.app_iter = encoder(columns, self, objects)
+        response.content_disposition = 'attachment; filename="{}.{}"'.format(self.get_crud().plural_name, extension)
+        return response
+
 
 
 class FormView(CRUDView):
@@ -268,6 +548,7 @@ class Show(FormView):
         return self.create_form(EditMode.show, buttons=())
 
     @view_config(context=Resource, name="show", renderer="crud/show.html", permission='view')
+    @use_replica
     def show(self):
         """View for showing an individual object."""
 
@@ -7,17 +7,23 @@
 3. All migration scripts live inside the package, in alembic/ folder next to setup.py
 
 """
+import inspect as python_inspect
 import os
 import logging
+import re
 
 from pyramid.paster import setup_logging
 
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.declarative.clsregistry import _ModuleMarker
 from alembic import context
 
+from websauna.system.crud.search import get_search_document
+from websauna.system.crud.search import get_search_expression
 from websauna.system.devop.cmdline import init_websauna
 from websauna.system.model.meta import Base
 from websauna.compat.typing import List
+from websauna.utils.jsonb import JSONBProperty
 
 #: Defined later because of initialization order
 logger = None
@@ -235,3 +241,117 @@ def run_alembic(package:str):
     logger.info("All done")
 
 
+def compile_index_expression(expression) -> str:
+    """Render an SQLAlchemy expression as SQL usable in ``CREATE INDEX``.
+
+    Values are rendered inline and column names are not prefixed with the table name.
+    """
+    compiled = expression.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True, "include_table": False})
+    return str(compiled)
+
+
+def get_search_index_name(model: type) -> str:
+    return "ix_{}_search".format(model.__table__.name)
+
+
+def get_trigram_index_name(model: type, column: str) -> str:
+    return "ix_{}_{}_trgm".format(model.__table__.name, re.sub(r"\W", "_", column))
+
+
+def create_search_index(op, model: type, columns: List[str], config: str="simple", name: str=None):
+    """Create a GIN index serving :py:class:`websauna.system.crud.search.FullTextSearch` in an Alembic migration.
+
+    The columns and the text search configuration must be the same the listing searches with, so that PostgreSQL can match the index expression.
+
+    Example migration::
+
+        from websauna.system.devop.alembic import create_search_index, drop_search_index
+        from websauna.system.user.models import User
+
+        def upgrade():
+            create_search_index(op, User, ["email", "username", "user_data/full_name"])
+
+        def downgrade():
+            drop_search_index(op, User)
+
+    :param op: ``alembic.op``
+    :param columns: Search columns, see :py:mod:`websauna.system.crud.search`
+    """
+    name = name or get_search_index_name(model)
+    document = compile_index_expression(get_search_document(model, columns, config))
+    op.execute("CREATE INDEX {} ON {} USING gin (({}))".format(name, model.__table__.fullname, document))
+
+
+def drop_search_index(op, model: type, name: str=None):
+    op.execute("DROP INDEX IF EXISTS {}".format(name or get_search_index_name(model)))
+
+
+def create_trigram_indexes(op, model: type, columns: List[str]):
+    """Create ``pg_trgm`` GIN indexes serving :py:class:`websauna.system.crud.search.TrigramSearch` in an Alembic migration.
+
+    One index is created per search column. Installs ``pg_trgm`` extension if needed, which requires database superuser privileges.
+
+    :param op: ``alembic.op``
+    :param columns: Search columns, see :py:mod:`websauna.system.crud.search`
+    """
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in columns:
+        expression = compile_index_expression(get_search_expression(model, column))
+        op.execute("CREATE INDEX {} ON {} USING gin (({}) gin_trgm_ops)".format(get_trigram_index_name(model, column), model.__table__.fullname, expression))
+
+
+def drop_trigram_indexes(op, model: type, columns: List[str]):
+    for column in columns:
+        op.execute("DROP INDEX IF EXISTS {}".format(get_trigram_index_name(model, column)))
+
+
+def get_jsonb_property_index_name(model: type, name: str) -> str:
+    return "ix_{}_{}".format(model.__table__.name, name)
+
+
+def create_jsonb_property_index(op, model: type, name: str, index_name: str=None, unique=False):
+    """Create an expression index serving queries against a :py:class:`websauna.utils.jsonb.JSONBProperty` in an Alembic migration.
+
+    The index expression is the one the property renders in queries, so that ``User.registration_source == "facebook"`` can use the index.
+
+    Example migration::
+
+        from websauna.system.devop.alembic import create_jsonb_property_index, drop_jsonb_property_index
+        from websauna.system.user.models import User
+
+        def upgrade():
+            create_jsonb_property_index(op, User, "registration_source")
+
+        def downgrade():
+            drop_jsonb_property_index(op, User, "registration_source")
+
+    :param op: ``alembic.op``
+    :param name: Name of the JSONBProperty on the model
+    """
+    attr = python_inspect.getattr_static(model, name)
+    assert isinstance(attr, JSONBProperty), "{}.{} is not JSONBProperty".format(model.__name__, name)
+    index_name = index_name or get_jsonb_property_index_name(model, name)
+    expression = compile_index_expression(attr.get_expression(model))
+    op.execute("CREATE {}INDEX {} ON {} (({}))".format("UNIQUE " if unique else "", index_name, model.__table__.fullname, expression))
+
+
+def drop_jsonb_property_index(op, model: type, name: str, index_name: str=None):
+    op.execute("DROP INDEX IF EXISTS {}".format(index_name or get_jsonb_property_index_name(model, name)))
+
+
+def create_jsonb_gin_index(op, model: type, data_field: str, index_name: str=None, path_ops=True):
+    """Create a GIN index on a whole JSONB column in an Alembic migration.
+
+    The index serves containment queries like ``User.user_data.contains({"registration_source": "facebook"})`` against any key, where expression indexes serve one property each.
+
+    :param op: ``alembic.op``
+    :param data_field: Name of the JSONB column
+    :param path_ops: Use ``jsonb_path_ops`` operator class, which gives a smaller and faster index supporting ``@>`` operator only
+    """
+    index_name = index_name or get_jsonb_property_index_name(model, data_field)
+    column = compile_index_expression(getattr(model, data_field).expression)
+    op.execute("CREATE INDEX {} ON {} USING gin ({}{})".format(index_name, model.__table__.fullname, column, " jsonb_path_ops" if path_ops else ""))
+
+
+def drop_jsonb_gin_index(op, model: type, data_field: str, index_name: str=None):
+    op.execute("DROP INDEX IF EXISTS {}".format(index_name or get_jsonb_property_index_name(model, data_field)))
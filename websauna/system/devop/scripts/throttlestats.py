@@ -0,0 +1,45 @@
+"""ws-throttle-stats script."""
+import os
+import sys
+
+from websauna.system.devop.cmdline import init_websauna
+from websauna.system.form.throttle import clear_throttle_keys
+from websauna.system.form.throttle import get_throttle_stats
+
+
+def usage(argv):
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <config_uri> [throttle name] [--clear]\n'
+          '(example: "%s conf/production.ini email_login")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv):
+
+    args = [a for a in argv[1:] if not a.startswith("--")]
+    clear = "--clear" in argv
+
+    if len(args) < 1:
+        usage(argv)
+
+    config_uri = args[0]
+    name = args[1] if len(args) > 1 else None
+
+    request = init_websauna(config_uri)
+
+    if clear:
+        deleted = clear_throttle_keys(request.registry, name)
+        print("Deleted {} throttle keys".format(deleted))
+        sys.exit(0)
+
+    stats = get_throttle_stats(request.registry, name)
+    if not stats:
+        print("No throttle keys found")
+        sys.exit(0)
+
+    for key, hits in stats:
+        print("{:>10}  {}".format(hits, key))
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,13 @@ from sqlalchemy.orm import (ColumnProperty, RelationshipProperty)
 log = logger = logging.getLogger(__name__)
 
 
+# Compiled dictify() and objectify() plan instructions
+_ATTRIBUTE = 1
+_COLUMN = 2
+_RELATIONSHIP = 3
+_RELATIONSHIP_LIST = 4
+
+
 class TypeOverridesHandling(Enum):
 
     #: Return value from type_overrides signaling that this column should not appear on the form
@@ -142,42 +149,65 @@ class PropertyAwareSQLAlchemySchemaNode(SQLAlchemySchemaNode):
             if node is not None:
                 self.add(node)
 
-    def dictify(self, obj):
-        """Extended to handle JSON properties."""
+    def get_children_key(self) -> tuple:
+        """Identify the current set of child nodes, so that compiled plans can detect schema changes."""
+        return tuple(id(node) for node in self.children)
 
-        dict_ = {}
-        for node in self:
+    def compile_dictify(self) -> list:
+        """Build a flat list of instructions how to read each node value from an object.
+
+        Model inspection is done once here instead of every :py:meth:`dictify` call.
 
+        :return: List of (name, node, kind, subschema) tuples
+        """
+        plan = []
+        for node in self:
             name = node.name
+
             try:
-                if JSONBProperty.is_json_property(obj, name):
-                    value = getattr(obj, name)
+                is_json = JSONBProperty.is_json_property(self.class_, name)
+            except AttributeError:
+                is_json = False
+
+            if is_json or name in self.inspector.column_attrs:
+                plan.append((name, node, _ATTRIBUTE, None))
+            elif name in self.inspector.relationships:
+                prop = self.inspector.relationships[name]
+
+                # We know this node is good to pass through as is, don't try to dictify subitems
+                if isinstance(node.typ, ModelSchemaType):
+                    plan.append((name, node, _ATTRIBUTE, None))
+                elif prop.uselist:
+                    plan.append((name, node, _RELATIONSHIP_LIST, self[name].children[0]))
                 else:
-                    getattr(self.inspector.column_attrs, name)
-                    value = getattr(obj, name)
+                    plan.append((name, node, _RELATIONSHIP, self[name]))
+            else:
+                # The given node isn't part of the SQLAlchemy model
+                msg = 'SQLAlchemySchemaNode.dictify: %s not found on %s'
+                logger.debug(msg, name, self)
 
-            except AttributeError:
+        return plan
 
+    def get_dictify_plan(self) -> list:
+        key = self.get_children_key()
+        compiled = self.__dict__.get("_dictify_plan")
+        if compiled is None or compiled[0] != key:
+            compiled = self._dictify_plan = (key, self.compile_dictify())
+        return compiled[1]
 
-                try:
-                    # Classic colanderalchemy
-                    prop = getattr(self.inspector.relationships, name)
+    def dictify(self, obj):
+        """Extended to handle JSON properties."""
 
-                    # We know this node is good to pass through as is, don't try to dictify subitems
-                    if isinstance(node.typ, ModelSchemaType):
-                        value = getattr(obj, name)
+        dict_ = {}
+        for name, node, kind, subschema in self.get_dictify_plan():
 
-                    elif prop.uselist:
-                        value = [self[name].children[0].dictify(o)
-                                 for o in getattr(obj, name)]
-                    else:
-                        o = getattr(obj, name)
-                        value = None if o is None else self[name].dictify(o)
-                except AttributeError:
-                    # The given node isn't part of the SQLAlchemy model
-                    msg = 'SQLAlchemySchemaNode.dictify: %s not found on %s'
-                    logger.debug(msg, name, self)
-                    continue
+            if kind == _ATTRIBUTE:
+                value = getattr(obj, name)
+            elif kind == _RELATIONSHIP_LIST:
+                value = [subschema.dictify(o) for o in getattr(obj, name)]
+            else:
+                o = getattr(obj, name)
+                value = None if o is None else subschema.dictify(o)
 
             # SQLAlchemy mostly converts values into Python types
             #  appropriate for appstructs, but not always.  The biggest
@@ -210,6 +240,40 @@ class PropertyAwareSQLAlchemySchemaNode(SQLAlchemySchemaNode):
 
         return dict_
 
+    def compile_objectify(self, attr: str) -> tuple:
+        """Resolve how an incoming appstruct value is set on an object.
+
+        :return: Tuple (kind, subschema)
+        """
+        mapper = self.inspector
+
+        if mapper.has_property(attr):
+            prop = mapper.get_property(attr)
+
+            if hasattr(prop, 'mapper'):
+                node = self.get(attr)
+                if prop.uselist:
+                    # Sequence of objects
+                    return _RELATIONSHIP_LIST, node.children[0] if node is not None else None
+                else:
+                    # Single object
+                    return _RELATIONSHIP, node
+            else:
+                return _COLUMN, None
+
+        return _ATTRIBUTE, None
+
+    def get_objectify_plan(self, attr: str) -> tuple:
+        key = self.get_children_key()
+        compiled = self.__dict__.get("_objectify_plan")
+        if compiled is None or compiled[0] != key:
+            compiled = self._objectify_plan = (key, {})
+
+        plan = compiled[1]
+        if attr not in plan:
+            plan[attr] = self.compile_objectify(attr)
+        return plan[attr]
+
     def objectify(self, dict_, context=None):
         """Extended to handle JSON properties."""
 
@@ -221,47 +285,30 @@ class PropertyAwareSQLAlchemySchemaNode(SQLAlchemySchemaNode):
             return dict_
 
         for attr in dict_:
-            if mapper.has_property(attr):
-                prop = mapper.get_property(attr)
+            kind, subschema = self.get_objectify_plan(attr)
+            value = dict_[attr]
 
-                if hasattr(prop, 'mapper'):
-                    cls = prop.mapper.class_
-                    value = dict_[attr]
-
-                    if prop.uselist:
-                        # Sequence of objects
-
-
-                        if isinstance(value, ModelSetResultList):
-                            # We know we do not need to try to convert these
-                            pass
-                        else:
-                            # Try to map incoming colander items back to SQL items
-                            value = [self[attr].children[0].objectify(obj)
-                                     for obj in dict_[attr]]
-                    else:
-
-                        if hasattr(value, "__tablename__"):
-                            # Raw SQLAlchemy object - do not try to convert
-                            pass
-                        else:
-                            # Single object
-                            if value:
-                                value = self[attr].objectify(value)
+            if kind == _RELATIONSHIP_LIST:
+                if isinstance(value, ModelSetResultList):
+                    # We know we do not need to try to convert these
+                    pass
                 else:
-                     value = dict_[attr]
-                     if value is colander.null:
-                         # `colander.null` is never an appropriate
-                         #  value to be placed on an SQLAlchemy object
-                         #  so we translate it into `None`.
-                         value = None
-                setattr(context, attr, value)
-            elif hasattr(context, attr):
-                # Set any properties on the object which are not SQLAlchemy column based.
-                # These are JSONBProperty like user_data and password on the user model (actual column is called _password, but we mangle the password has before pushing it through)
-                value = dict_[attr]
-                setattr(context, attr, value)
-            else:
+                    # Try to map incoming colander items back to SQL items
+                    value = [subschema.objectify(obj) for obj in value]
+            elif kind == _RELATIONSHIP:
+                if hasattr(value, "__tablename__"):
+                    # Raw SQLAlchemy object - do not try to convert
+                    pass
+                else:
+                    if value:
+                        value = subschema.objectify(value)
+            elif kind == _COLUMN:
+                if value is colander.null:
+                    # `colander.null` is never an appropriate
+                    #  value to be placed on an SQLAlchemy object
+                    #  so we translate it into `None`.
+                    value = None
+            elif not hasattr(context, attr):
                 # Ignore attributes if they are not mapped
                 logger.debug(
                     'SQLAlchemySchemaNode.objectify: %s not found on '
@@ -270,6 +317,10 @@ class PropertyAwareSQLAlchemySchemaNode(SQLAlchemySchemaNode):
                 )
                 continue
 
+            # Set any properties on the object which are not SQLAlchemy column based.
+            # These are JSONBProperty like user_data and password on the user model (actual column is called _password, but we mangle the password has before pushing it through)
+            setattr(context, attr, value)
+
         return context
 
     def get_schema_from_column(self, prop, overrides):
@@ -618,16 +669,12 @@ class PropertyAwareSQLAlchemySchemaNode(SQLAlchemySchemaNode):
         return node
 
     def clone(self):
-        cloned = self.__class__(self.class_,
-                                self.includes,
-                                self.excludes,
-                                self.overrides,
-                                self.unknown,
-                                self.nested,
-                                self.type_overrides,
-                                self.relationship_overrides,
-                                self.automatic_relationships,
-                                **self.kwargs)
+        # Do not call __init__, as it would introspect the model again
+        cloned = object.__new__(self.__class__)
         cloned.__dict__.update(self.__dict__)
+
+        # Compiled plans refer to the child nodes of the original
+        cloned.__dict__.pop("_dictify_plan", None)
+        cloned.__dict__.pop("_objectify_plan", None)
         cloned.children = [node.clone() for node in self.children]
         return cloned
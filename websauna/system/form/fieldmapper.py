@@ -16,8 +16,9 @@ from sqlalchemy.orm import RelationshipProperty, Mapper
 from sqlalchemy.sql.type_api import TypeEngine
 from websauna.system.crud import Resource
 from websauna.system.form.colander import PropertyAwareSQLAlchemySchemaNode, TypeOverridesHandling
-from websauna.system.form.sqlalchemy import get_uuid_vocabulary_for_model, UUIDModelSet, UUIDForeignKeyValue
-from websauna.system.form.widgets import FriendlyUUIDWidget
+from websauna.system.form.sqlalchemy import UUIDModelSet, UUIDForeignKeyValue
+from websauna.system.form.vocabulary import get_label_column, get_vocabulary, is_large_vocabulary
+from websauna.system.form.widgets import FriendlyUUIDWidget, RemoteSelectWidget
 from websauna.system.http import Request
 
 from websauna.compat.typing import List
@@ -42,6 +43,9 @@ logger = logging.getLogger(__name__)
 class ColumnToFieldMapper(ABC):
     """A helper class to map a SQLAlchemy model to Colander/Deform form."""
 
+    #: Set if generated schemas do not depend on ``request`` or ``context`` passed to :py:meth:`map`. Request dependent parts must be ``colander.deferred``. Such schemas are generated once and cloned for each request, see :py:class:`websauna.system.crud.formgenerator.SQLAlchemyFormGenerator`. The flag is not inherited: a subclass may map differently per request, so it must set ``cacheable`` itself to opt in, see :py:func:`is_cacheable`.
+    cacheable = False
+
     @abstractmethod
     def map(self, mode:EditMode, request:Request, context:Resource, model:type, includes:List) -> colander.SchemaNode:
         """Map a model to a Colander form schema.
@@ -58,6 +62,14 @@ class ColumnToFieldMapper(ABC):
         """
 
 
+def is_cacheable(field_mapper: ColumnToFieldMapper) -> bool:
+    """Tell whether schemas mapped by a field mapper can be reused across requests.
+
+    Only the class of the mapper counts, :py:attr:`ColumnToFieldMapper.cacheable` set by a base class is ignored.
+    """
+    return bool(type(field_mapper).__dict__.get("cacheable", False))
+
+
 class DefaultSQLAlchemyFieldMapper(ColumnToFieldMapper):
     """The default SQLAlchemy to form field and widget mapping implementation.
 
@@ -76,10 +88,42 @@ class DefaultSQLAlchemyFieldMapper(ColumnToFieldMapper):
     See :py:class:`colanderalchemy.schema.SQLAlchemySchemaNode` for more information.
     """
 
+    cacheable = True
+
+    def get_vocabulary_search_url(self, request: Request, model: type) -> Optional[str]:
+        """Get URL of a JSON search endpoint for choosing items of a model.
+
+        By default use the ``search`` view of the model admin, see :py:class:`websauna.system.admin.views.Search`. If the model has no admin or the user cannot view it, return ``None`` and all items are rendered as choices regardless of ``websauna.vocabulary_max_size``.
+
+        See :py:class:`websauna.system.form.widgets.RemoteSelectWidget`.
+        """
+        model_admin_ids = getattr(request.registry, "model_admin_ids_by_model", {})
+        model_admin_id = model_admin_ids.get(model)
+        if not model_admin_id:
+            return None
+
+        from websauna.system.admin.utils import get_admin
+        model_admin = get_admin(request)["models"][model_admin_id]
+        if not request.has_permission("view", model_admin):
+            return None
+
+        return request.resource_url(model_admin, "search")
+
+    def get_relationship_widget(self, request: Request, model: type, default_choice: str) -> deform.widget.Widget:
+        """Create a widget for choosing one item of a model."""
+        search_url = self.get_vocabulary_search_url(request, model)
+        if search_url and is_large_vocabulary(request, model):
+            return RemoteSelectWidget(url=search_url, model=model, label_column=get_label_column(model), default_choice=default_choice)
+
+        vocabulary = get_vocabulary(request, model, default_choice=default_choice)
+        return deform.widget.SelectWidget(values=vocabulary)
+
     def map_standard_relationship(self, mode, request, node, model, name, rel) -> colander.SchemaNode:
         """Build a widget for choosing a relationship with target.
 
         The relationship must be foreign_key and the remote must offer ``uuid`` attribute which we use as a vocabulary key..
+
+        Choices come from :py:func:`websauna.system.form.vocabulary.get_vocabulary` cache. If the remote table has more than ``websauna.vocabulary_max_size`` rows and :py:meth:`get_vocabulary_search_url` gives a search endpoint, a remote search widget is used instead.
         """
 
         if isinstance(rel.argument, Mapper):
@@ -98,7 +142,6 @@ class DefaultSQLAlchemyFieldMapper(ColumnToFieldMapper):
 
         # For now, we automatically deal with this only if the model provides uuid
         if hasattr(remote_model, "uuid"):
-            dbsession = request.dbsession
             # TODO: We probably need a mechanism for system wide empty default label
 
             required = not column.nullable
@@ -113,15 +156,16 @@ class DefaultSQLAlchemyFieldMapper(ColumnToFieldMapper):
             else:
                 missing = None
 
-            vocabulary = get_uuid_vocabulary_for_model(dbsession, remote_model, default_choice=default_choice)
-
+            # Choices depend on the request, so that generated schemas can be cached
             if rel.uselist:
                 # Show out all relationships
                 if mode == EditMode.show:
-                    return colander.SchemaNode(UUIDModelSet(remote_model), name=name, missing=missing, widget=deform.widget.CheckboxChoiceWidget(values=vocabulary))
+                    widget = colander.deferred(lambda node, kw: deform.widget.CheckboxChoiceWidget(values=get_vocabulary(kw["request"], remote_model, default_choice=default_choice)))
+                    return colander.SchemaNode(UUIDModelSet(remote_model), name=name, missing=missing, widget=widget)
             else:
                 # Select from a single relationship
-                return colander.SchemaNode(UUIDForeignKeyValue(remote_model), name=name, missing=missing, widget=deform.widget.SelectWidget(values=vocabulary))
+                widget = colander.deferred(lambda node, kw: self.get_relationship_widget(kw["request"], remote_model, default_choice))
+                return colander.SchemaNode(UUIDForeignKeyValue(remote_model), name=name, missing=missing, widget=widget)
 
         return TypeOverridesHandling.drop
 
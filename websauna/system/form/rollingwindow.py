@@ -72,40 +72,82 @@ More info
 
 * http://redis.io/commands/zadd
 
+* http://redis.io/commands/evalsha
+
 """
 
+import os
 import time
+import binascii
+
 from websauna.system.core.redis import get_redis
 
 
-def _check(redis, key, window=60, limit=50):
+#: Trim expired hits, add a new hit, refresh key expiry and count hits in one atomic round trip
+CHECK_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+redis.call('ZADD', key, now, ARGV[3])
+redis.call('EXPIRE', key, math.ceil(window))
+return redis.call('ZCARD', key)
+"""
+
+#: Trim expired hits and count the remaining ones
+GET_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+return redis.call('ZCARD', key)
+"""
 
-    # Expire old keys (hits)
-    expires = time.time() - window
-    redis.zremrangebyscore(key, '-inf', expires)
 
-    # Add a hit on the very moment
+def _get_script(redis, name, source):
+    """Get a registered Lua script for a Redis client.
+
+    Scripts are called with EVALSHA and loaded on the server on the first call only.
+    """
+    attr = "_rollingwindow_" + name
+    script = getattr(redis, attr, None)
+    if script is None:
+        script = redis.register_script(source)
+        setattr(redis, attr, script)
+    return script
+
+
+def _check(redis, key, window=60, limit=50):
+    """Add a hit and check the limit.
+
+    Hits older than the window are removed, the new hit is recorded and the key expiry is refreshed, so that idle keys do not linger around. All this happens atomically in a Lua script.
+    """
     now = time.time()
-    redis.zadd(key, now, now)
+
+    # Unique member, so that simultaneous hits are not merged
+    member = "{}-{}".format(now, binascii.hexlify(os.urandom(4)).decode("ascii"))
+
+    script = _get_script(redis, "check", CHECK_SCRIPT)
+    hits = script(keys=[key], args=[now, window, member])
 
     # If we currently have more keys than limit,
     # then limit the action
-    if redis.zcard(key) > limit:
-        return True
-
-    return False
+    return int(hits) > limit
 
 
-def _get(redis, key):
+def _get(redis, key, window=60):
     """ Get the current hits per rolling time window.
 
     :param redis: Redis client
 
     :param key: Redis key name we use to keep counter
 
+    :param window: Rolling time window in seconds
+
     :return: int, how many hits we have within the current rolling time window
     """
-    return redis.zcard(key)
+    script = _get_script(redis, "get", GET_SCRIPT)
+    return int(script(keys=[key], args=[time.time(), window]))
 
 
 def check(registry, key, window=60, limit=10):
@@ -124,17 +166,15 @@ def check(registry, key, window=60, limit=10):
     return _check(redis, key, window, limit)
 
 
-def get(registry, key):
+def get(registry, key, window=60):
     """Get the current hits per rolling time window.
 
-     Use ``key`` to store the current hit rate in Redis.
+     Use ``key`` to store the current hit rate in Redis. This does not record a hit.
 
     :param registry: Pyramid registry e.g. request.registry
     :param key: Redis key name we use to keep counter
+    :param window: Rolling time window in seconds. Default 60 seconds.
     :return: int, how many hits we have within the current rolling time window
     """
     redis = get_redis(registry)
-    return _check(redis, key)
-
-
-
+    return _get(redis, key, window)
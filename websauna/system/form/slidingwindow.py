@@ -0,0 +1,112 @@
+"""Approximate sliding time window counter and rate limit using Redis.
+
+This is a memory bounded alternative to :py:mod:`websauna.system.form.rollingwindow`. Rolling window stores one sorted set member per hit, so a limit of 10,000 hits per hour needs 10,000 members per key. A sliding window counter stores only two integers per key regardless of the hit rate.
+
+Hits are counted in fixed buckets of ``window`` seconds. The hit rate is estimated by weighting the previous bucket by how much it still overlaps with the sliding window::
+
+    rate = previous * (window - elapsed) / window + current
+
+where ``elapsed`` is the time since the current bucket started. The estimate assumes hits are evenly spread within the previous bucket.
+
+The API is the same as in :py:mod:`websauna.system.form.rollingwindow`, so the modules can be used interchangeably, e.g. with :py:func:`websauna.system.form.throttle.create_throttle_validator`::
+
+    from websauna.system.form import slidingwindow
+    from websauna.system.form.throttle import create_throttle_validator
+
+    validator = create_throttle_validator("email_login", 10000, limiter=slidingwindow)
+
+More info
+
+* https://blog.cloudflare.com/counting-things-a-lot-of-different-things/
+
+"""
+import time
+
+from websauna.system.core.redis import get_redis
+
+
+#: Add a hit to the current bucket and return the current and previous bucket counts
+CHECK_SCRIPT = """
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {redis.call('GET', KEYS[1]), redis.call('GET', KEYS[2])}
+"""
+
+
+def _get_script(redis):
+    """Get the registered Lua script for a Redis client."""
+    script = getattr(redis, "_slidingwindow_check", None)
+    if script is None:
+        script = redis.register_script(CHECK_SCRIPT)
+        redis._slidingwindow_check = script
+    return script
+
+
+def _get_bucket_keys(key, window, now):
+    bucket = int(now // window)
+    elapsed = now - bucket * window
+    return "{}:{}".format(key, bucket), "{}:{}".format(key, bucket - 1), elapsed
+
+
+def _estimate(current, previous, window, elapsed) -> float:
+    current = int(current or 0)
+    previous = int(previous or 0)
+    return previous * (window - elapsed) / window + current
+
+
+def _check(redis, key, window=60, limit=50):
+    now = time.time()
+    current_key, previous_key, elapsed = _get_bucket_keys(key, window, now)
+
+    # Bucket must live until it has slid past the next bucket
+    ttl = int(window * 2) + 1
+    script = _get_script(redis)
+    current, previous = script(keys=[current_key, previous_key], args=[ttl])
+
+    return _estimate(current, previous, window, elapsed) > limit
+
+
+def _get(redis, key, window=60):
+    """Get the estimated hits per sliding time window.
+
+    :param redis: Redis client
+
+    :param key: Redis key name we use to keep counter
+
+    :param window: Time window in seconds
+
+    :return: int, how many hits we have within the current sliding time window
+    """
+    current_key, previous_key, elapsed = _get_bucket_keys(key, window, time.time())
+    current, previous = redis.mget(current_key, previous_key)
+    return int(_estimate(current, previous, window, elapsed))
+
+
+def check(registry, key, window=60, limit=10):
+    """Do a sliding time window counter hit.
+
+    Use ``key`` as a prefix for Redis bucket keys.
+
+    :param registry: Pyramid registry e.g. request.registry
+    :param key: Redis key name prefix we use to keep counter
+    :param window: Sliding time window in seconds. Default 60 seconds.
+    :param limit: Allowed operations per time window. Default 10 hits.
+
+    :return: True is the maximum limit has been reached for the current time window
+    """
+    redis = get_redis(registry)
+    return _check(redis, key, window, limit)
+
+
+def get(registry, key, window=60):
+    """Get the estimated hits per sliding time window.
+
+    This does not record a hit.
+
+    :param registry: Pyramid registry e.g. request.registry
+    :param key: Redis key name prefix we use to keep counter
+    :param window: Sliding time window in seconds. Default 60 seconds.
+    :return: int, how many hits we have within the current sliding time window
+    """
+    redis = get_redis(registry)
+    return _get(redis, key, window)
@@ -3,16 +3,65 @@
 import logging
 import colander as c
 
+from pyramid.registry import Registry
+
+from websauna.compat.typing import Callable
+from websauna.compat.typing import List
+from websauna.compat.typing import Optional
+from websauna.compat.typing import Tuple
+from websauna.system.core.redis import get_redis
+from websauna.system.http import Request
+
 from . import rollingwindow
 
 
 logger = logging.getLogger(__name__)
 
 
-def create_throttle_validator(name:str, max_actions_in_time_window:int, time_window_in_seconds:int=3600):
+#: Prefix of throttle keys in Redis if ``websauna.throttle_key_prefix`` is not set
+DEFAULT_KEY_PREFIX = "throttle_"
+
+
+def get_client_address(request: Request) -> Optional[str]:
+    """Throttle by the IP address of the client.
+
+    Make sure ``request.client_addr`` reflects the real client address when running behind a proxy.
+    """
+    return request.client_addr
+
+
+def get_user_id(request: Request) -> Optional[str]:
+    """Throttle by the logged in user, or by IP address for anonymous visitors."""
+    user = request.user
+    if user is not None:
+        return "user-{}".format(user.id)
+    return get_client_address(request)
+
+
+def get_key_prefix(registry: Registry) -> str:
+    """Get Redis key prefix for all throttle keys of the site."""
+    settings = registry.settings or {}
+    return settings.get("websauna.throttle_key_prefix", DEFAULT_KEY_PREFIX)
+
+
+def get_throttle_key(request: Request, name: str, principal: Optional[Callable]=None) -> str:
+    """Get Redis key for a throttle.
+
+    :param name: Name of the throttle
+    :param principal: Callable ``principal(request)`` returning a string the throttling is keyed by, or ``None`` to throttle system wide
+    """
+    key = get_key_prefix(request.registry) + name
+    if principal:
+        value = principal(request)
+        if value:
+            key += ":{}".format(value)
+    return key
+
+
+def create_throttle_validator(name:str, max_actions_in_time_window:int, time_window_in_seconds:int=3600, limiter=rollingwindow, principal: Optional[Callable]=None):
     """Creates a Colander form validator which prevents form submissions exceed certain rate.
 
-    Form submissions are throttled system wide. This prevents abuse of the system by flooding it with requests.
+    By default form submissions are throttled system wide. This prevents abuse of the system by flooding it with requests. Pass ``principal`` to have a separate limit for each client, so that one abusive client does not lock out everyone else.
 
     A logging warning is issued if the rate is exceeded. The user is greeted with an error message telling the submission is not possible at the moment.
 
@@ -20,7 +69,7 @@ def create_throttle_validator(name:str, max_actions_in_time_window:int, time_win
 
         from tomb_routes import simple_route
 
-        from websauna.system.form.throttle import create_throttle_validator
+        from websauna.system.form.throttle import create_throttle_validator, get_client_address
 
         from myapp import schemas
 
@@ -30,14 +79,18 @@ def create_throttle_validator(name:str, max_actions_in_time_window:int, time_win
             # Read allowed email login rate from the config file
             email_login_rate = int(request.registry.settings.get("trees.email_login_rate", 50))
 
-            # Create a Colander schema instance with rate limit validator
-            email_schema = schemas.LoginWithEmail(validator=create_throttle_validator("email_login", email_login_rate)).bind(request=request)
+            # Create a Colander schema instance with rate limit validator, separate limit for each IP address
+            email_schema = schemas.LoginWithEmail(validator=create_throttle_validator("email_login", email_login_rate, principal=get_client_address)).bind(request=request)
 
-    :param name: Identify this throttler. Used as a Redis key.
+    :param name: Identify this throttler. Used as a part of Redis key, prefixed by ``websauna.throttle_key_prefix`` setting.
 
     :param max_actions_in_time_window: Number of allowed actions per window
 
-    :param time_window_in_seconds: Time in window in seconds. Default one hour, 3600 seconds.
+    :param time_window_in_seconds: Time in window in seconds. Default one hour, 3600 seconds. Redis keys expire after the window has passed.
+
+    :param limiter: Rate limiter backend providing ``check(registry, key, window, limit)``. The default :py:mod:`websauna.system.form.rollingwindow` is exact, but stores every hit. Use :py:mod:`websauna.system.form.slidingwindow` for high limits to have constant memory use per key.
+
+    :param principal: Callable ``principal(request)`` returning a string to key the throttling by. Use :py:func:`get_client_address`, :py:func:`get_user_id` or your own function. Default is to throttle system wide.
 
     :return: Function to be passed to ``validator`` Colander schema construction parameter.
     """
@@ -50,11 +103,13 @@ def create_throttle_validator(name:str, max_actions_in_time_window:int, time_win
         limit = max_actions_in_time_window
 
         def inner(node, value):
+            key = get_throttle_key(request, name, principal)
+
             # Check we don't have many invites going out
-            if rollingwindow.check(request.registry, "throttle_" + name, window=time_window_in_seconds, limit=limit):
+            if limiter.check(request.registry, key, window=time_window_in_seconds, limit=limit):
 
                 # Alert devops through Sentry
-                logger.warn("Excessive form submissions on %s", name)
+                logger.warn("Excessive form submissions on %s", key)
 
                 # Tell users slow down
                 raise c.Invalid(node, 'Too many form submissions at the moment. Please try again later.')
@@ -62,3 +117,96 @@ def create_throttle_validator(name:str, max_actions_in_time_window:int, time_win
         return inner
 
     return throttle_validator
+
+
+def scan_throttle_keys(registry: Registry, name: str=None, batch_size=1000):
+    """Iterate through throttle keys in Redis.
+
+    Uses ``SCAN``, so that Redis is not blocked like with ``KEYS`` on a large keyspace.
+
+    :param name: Only keys of this throttle. Default all throttles.
+    :yield: Redis key names as strings
+    """
+    redis = get_redis(registry)
+    prefix = _escape_glob(get_key_prefix(registry))
+
+    if name:
+        # System wide key of the throttle, and its principal and time bucket keys, but not other throttles starting with the same name
+        if redis.exists(get_key_prefix(registry) + name):
+            yield get_key_prefix(registry) + name
+        match = prefix + _escape_glob(name) + ":*"
+    else:
+        match = prefix + "*"
+
+    for key in redis.scan_iter(match=match, count=batch_size):
+        yield key.decode("utf-8") if isinstance(key, bytes) else key
+
+
+def _escape_glob(pattern: str) -> str:
+    """Escape Redis glob-style pattern special characters."""
+    for char in "\\*?[]":
+        pattern = pattern.replace(char, "\\" + char)
+    return pattern
+
+
+def _iterate_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_throttle_stats(registry: Registry, name: str=None, top: int=20, batch_size=1000) -> List[Tuple[str, int]]:
+    """Find the keys with most hits.
+
+    Hit counts of :py:mod:`websauna.system.form.rollingwindow` keys may include hits which have expired, but have not yet been trimmed. Time buckets of :py:mod:`websauna.system.form.slidingwindow` keys are summed together.
+
+    :param name: Only keys of this throttle. Default all throttles.
+    :param top: How many keys to return
+    :return: List of (key, hits) tuples, most hits first
+    """
+    redis = get_redis(registry)
+    hits = {}
+
+    for keys in _iterate_batches(scan_throttle_keys(registry, name, batch_size), batch_size):
+
+        # Resolve key types in one round trip
+        pipe = redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.type(key)
+        types = pipe.execute()
+
+        pipe = redis.pipeline(transaction=False)
+        for key, type_ in zip(keys, types):
+            if type_ in (b"zset", "zset"):
+                pipe.zcard(key)
+            else:
+                pipe.get(key)
+        counts = pipe.execute()
+
+        for key, type_, count in zip(keys, types, counts):
+            if type_ not in (b"zset", "zset"):
+                # slidingwindow bucket key: name:principal:bucket
+                key = key.rsplit(":", 1)[0]
+            hits[key] = hits.get(key, 0) + int(count or 0)
+
+    return sorted(hits.items(), key=lambda pair: pair[1], reverse=True)[0:top]
+
+
+def clear_throttle_keys(registry: Registry, name: str=None, batch_size=1000) -> int:
+    """Delete throttle keys in batches.
+
+    Use this to reset throttles e.g. after an attack has been mitigated.
+
+    :param name: Only keys of this throttle. Default all throttles.
+    :return: Number of deleted keys
+    """
+    redis = get_redis(registry)
+    deleted = 0
+    for keys in _iterate_batches(scan_throttle_keys(registry, name, batch_size), batch_size):
+        deleted += redis.delete(*keys)
+    return deleted
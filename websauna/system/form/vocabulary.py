@@ -0,0 +1,213 @@
+"""Cached choice vocabularies for relationship widgets.
+
+Building a select widget for a foreign key needs (uuid slug, label) pair of every row in the remote table. Instead of loading full model instances on every form render, :py:func:`get_vocabulary` selects only the needed columns and caches the result in the process memory. Each Pyramid registry has its own cache, see :py:func:`get_vocabulary_cache`.
+
+The cache of a model is dropped when a session commits new, deleted or relabeled instances of the model. The cache is per process and there is no invalidation across processes: other web server workers and Celery workers keep serving their cached choices until they expire after ``websauna.vocabulary_cache_ttl`` seconds.
+"""
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import inspect
+from pyramid.registry import Registry
+from sqlalchemy.orm import Session
+
+from websauna.compat.typing import List
+from websauna.compat.typing import Optional
+from websauna.compat.typing import Tuple
+from websauna.system.http import Request
+from websauna.utils.slug import uuid_to_slug
+
+
+#: Column names tried, in order, as labels for models which do not define ``__str__``
+LABEL_COLUMN_CANDIDATES = ("name", "title", "label")
+
+#: Caches of all registries, for invalidation
+_caches = weakref.WeakSet()
+
+_lock = threading.Lock()
+
+#: ``Session.info`` key of models whose vocabularies are dropped on commit
+INFO_CHANGED_MODELS = "websauna.vocabulary_changed_models"
+
+
+def get_label_column(model: type) -> Optional[str]:
+    """Find a column to use as the label of model items in a vocabulary.
+
+    Models with a custom ``__str__`` are labeled by it, so they need to be loaded as a whole and ``None`` is returned.
+    """
+    if getattr(model, "__str__") is not object.__str__:
+        return None
+
+    columns = inspect(model).columns
+    for name in LABEL_COLUMN_CANDIDATES:
+        if name in columns:
+            return name
+
+    return None
+
+
+def get_cache_ttl(request: Request) -> int:
+    return int(request.registry.settings.get("websauna.vocabulary_cache_ttl", 60))
+
+
+def get_max_size(request: Request) -> int:
+    """How many rows we render as a choice list before switching to remote search."""
+    return int(request.registry.settings.get("websauna.vocabulary_max_size", 500))
+
+
+class VocabularyCache:
+    """Cached vocabularies and row counts of models."""
+
+    def __init__(self):
+        #: model -> {cache key -> (expires at, value)}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, model: type, key: tuple):
+        entry = self.entries.get(model, {}).get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            return None
+        return value
+
+    def set(self, model: type, key: tuple, value, ttl: int):
+        with self.lock:
+            self.entries.setdefault(model, {})[key] = (time.time() + ttl, value)
+
+    def has_model(self, model: type) -> bool:
+        """Is anything cached for the model or its base classes."""
+        return any(cls in self.entries for cls in model.__mro__)
+
+    def invalidate(self, model: type):
+        with self.lock:
+            for cls in model.__mro__:
+                self.entries.pop(cls, None)
+
+
+def get_vocabulary_cache(registry: Registry) -> VocabularyCache:
+    """Get the vocabulary cache of a registry, so that apps running in the same process do not share cached choices."""
+    cache = getattr(registry, "vocabulary_cache", None)
+    if cache is None:
+        with _lock:
+            cache = getattr(registry, "vocabulary_cache", None)
+            if cache is None:
+                cache = registry.vocabulary_cache = VocabularyCache()
+                _caches.add(cache)
+    return cache
+
+
+def invalidate_vocabulary(model: type):
+    """Drop cached vocabularies and row counts of a model and its base classes.
+
+    Sessions do not know their registry, so caches of all registries in the process are cleared.
+    """
+    with _lock:
+        caches = list(_caches)
+
+    for cache in caches:
+        cache.invalidate(model)
+
+
+def query_vocabulary(dbsession: Session, model: type, label_column: str=None) -> List[Tuple[str, str]]:
+    """Load (uuid slug, label) pairs for all rows of a model."""
+    if label_column:
+        column = getattr(model, label_column)
+        query = dbsession.query(model.uuid, column).order_by(column)
+        return [(uuid_to_slug(uuid), str(label)) for uuid, label in query]
+
+    return [(uuid_to_slug(item.uuid), str(item)) for item in dbsession.query(model)]
+
+
+def get_vocabulary(request: Request, model: type, label_column: str=None, default_choice: str=None) -> List[Tuple[str, str]]:
+    """Get cached select/checkbox vocabulary for all items of a model.
+
+    :param label_column: Column used as a label. If not given use :py:func:`get_label_column`.
+    :param default_choice: If given use this as "Select here" or when the value is None
+    """
+    label_column = label_column or get_label_column(model)
+    key = ("vocabulary", label_column)
+
+    cache = get_vocabulary_cache(request.registry)
+    vocabulary = cache.get(model, key)
+    if vocabulary is None:
+        vocabulary = query_vocabulary(request.dbsession, model, label_column)
+        cache.set(model, key, vocabulary, get_cache_ttl(request))
+
+    if default_choice:
+        return [('', default_choice)] + vocabulary
+
+    return vocabulary
+
+
+def count_choices(request: Request, model: type) -> int:
+    """Get cached row count of a model."""
+    key = ("count",)
+    cache = get_vocabulary_cache(request.registry)
+    count = cache.get(model, key)
+    if count is None:
+        count = request.dbsession.query(func.count(inspect(model).primary_key[0])).scalar()
+        cache.set(model, key, count, get_cache_ttl(request))
+    return count
+
+
+def is_large_vocabulary(request: Request, model: type) -> bool:
+    """Does the model have too many rows for rendering all of them as choices."""
+    return count_choices(request, model) > get_max_size(request)
+
+
+def _is_relabeled(obj) -> bool:
+    """Did a flush change the uuid or label of an existing object."""
+    model = type(obj)
+    label_column = get_label_column(model)
+    if label_column is None:
+        # Label comes from __str__, we cannot tell what it depends on
+        return True
+
+    state = inspect(obj)
+    for name in ("uuid", label_column):
+        if name in state.attrs and state.attrs[name].history.has_changes():
+            return True
+    return False
+
+
+def invalidate_on_commit(session: Session, model: type):
+    """Drop cached vocabularies of a model when the session commits.
+
+    Invalidating before the commit is not enough: a concurrent request could cache the old committed rows again between the flush and the commit.
+    """
+    session.info.setdefault(INFO_CHANGED_MODELS, set()).add(model)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_models(session, flush_context):
+    models = set()
+    for obj in list(session.new) + list(session.deleted):
+        models.add(type(obj))
+
+    with _lock:
+        caches = list(_caches)
+
+    for obj in session.dirty:
+        cached = any(cache.has_model(type(obj)) for cache in caches)
+        if cached and type(obj) not in models and _is_relabeled(obj):
+            models.add(type(obj))
+
+    for model in models:
+        invalidate_on_commit(session, model)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_models(session):
+    for model in session.info.pop(INFO_CHANGED_MODELS, ()):
+        invalidate_vocabulary(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_models(session):
+    # Cached entries are still valid
+    session.info.pop(INFO_CHANGED_MODELS, None)
@@ -5,6 +5,7 @@ Mostly for high level integration.
 
 import deform
 from deform.widget import _normalize_choices
+from websauna.utils.slug import slug_to_uuid
 from websauna.utils.slug import uuid_to_slug
 
 
@@ -23,3 +24,56 @@ class FriendlyUUIDWidget(deform.widget.TextInputWidget):
         return values
 
 
+
+
+class RemoteSelectWidget(deform.widget.Select2Widget):
+    """Select widget which searches choices from a JSON endpoint.
+
+    For relationships with too many items to be rendered as ``<option>`` elements. Only the currently selected item is rendered and select2 fetches other choices when the user types.
+
+    The endpoint receives the search term as ``q`` query parameter and must return JSON ``{"results": [{"id": "<uuid slug>", "text": "<label>"}]}``.
+
+    For :py:class:`websauna.system.form.sqlalchemy.UUIDForeignKeyValue` Colander type.
+
+    :param url: Search endpoint URL
+    :param model: SQLAlchemy model of choices, used to resolve the label of the selected item
+    :param label_column: Column used as label. If not given use ``str()`` of the item.
+    :param default_choice: Label for empty choice
+    """
+
+    template = 'remote_select'
+
+    #: How many characters must be typed before searching
+    min_length = 1
+
+    url = None
+
+    model = None
+
+    label_column = None
+
+    default_choice = None
+
+    def get_choices(self, field, cstruct) -> list:
+        """Resolve the label of the selected item."""
+        choices = [('', self.default_choice or '')]
+
+        if cstruct:
+            request = field.schema.bindings["request"]
+            item = request.dbsession.query(self.model).filter_by(uuid=slug_to_uuid(cstruct)).first()
+            if item is not None:
+                label = getattr(item, self.label_column) if self.label_column else str(item)
+                choices.append((cstruct, label))
+
+        return choices
+
+    def serialize(self, field, cstruct, **kw):
+        kw.setdefault("values", self.get_choices(field, cstruct))
+        return super(RemoteSelectWidget, self).serialize(field, cstruct, **kw)
+
+    def get_template_values(self, field, cstruct, kw):
+        values = super(RemoteSelectWidget, self).get_template_values(field, cstruct, kw)
+        values["url"] = self.url
+        values["min_length"] = self.min_length
+        values["allow_clear"] = not field.required
+        return values
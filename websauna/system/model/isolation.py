@@ -0,0 +1,226 @@
+"""Transaction isolation level per request and per view.
+
+The database engine runs transactions at ``websauna.db.isolation_level``, SERIALIZABLE by default. Read-only requests rarely need serializable snapshots, but they still take part in serialization conflicts, which abort and retry concurrent writing transactions.
+
+* ``GET`` and ``HEAD`` requests use ``websauna.db.read_isolation_level``
+
+* Views can pick their own level with :py:func:`isolation_level` decorator, e.g. to keep money transfers SERIALIZABLE or to let a heavy report run at READ COMMITTED
+
+The level is applied with ``SET TRANSACTION ISOLATION LEVEL`` when the session begins a transaction on the primary database. Authentication queries the database before the view is found, so view levels are looked up by route name when the request database session is created. Thus a view with a level needs a ``route_name``, and all views of the route must have the same level. Other views, like traversal views of the admin, cannot have their own level and :py:class:`pyramid.exceptions.ConfigurationError` is raised on startup. Example::
+
+    from websauna.system.model.isolation import isolation_level
+
+    @view_config(route_name="transfer", request_method="POST")
+    @isolation_level("SERIALIZABLE")
+    def transfer(request):
+        ...
+
+pyramid_tm retries requests failing on serialization conflicts, see ``tm.attempts`` setting. :py:func:`get_retry_stats` tells how many attempts and retries each view has had.
+"""
+import inspect
+import logging
+import threading
+
+from pyramid.exceptions import ConfigurationError
+from pyramid.interfaces import IRoutesMapper
+from pyramid.request import Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from websauna.compat.typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+ISOLATION_LEVELS = ("SERIALIZABLE", "REPEATABLE READ", "READ COMMITTED")
+
+#: Attribute set by :py:func:`isolation_level` on views
+ISOLATION_ATTRIBUTE = "__websauna_isolation_level__"
+
+#: ``Session.info`` key of the isolation level for the next transaction
+INFO_LEVEL = "websauna.isolation_level"
+
+#: ``Session.info`` key telling the isolation level of the ongoing transaction
+INFO_ACTIVE_LEVEL = "websauna.active_isolation_level"
+
+#: WSGI environ key counting how many times pyramid_tm has run the view of the request
+ENVIRON_ATTEMPT = "websauna.db.attempt"
+
+SAFE_METHODS = ("GET", "HEAD")
+
+_stats = {}
+
+_lock = threading.Lock()
+
+
+def isolation_level(level: str):
+    """Decorate a view function or view class method to run its transaction at a given isolation level.
+
+    :param level: One of ``SERIALIZABLE``, ``REPEATABLE READ``, ``READ COMMITTED``
+    """
+    level = level.upper()
+    assert level in ISOLATION_LEVELS, "Unknown isolation level {}".format(level)
+
+    def decorator(view):
+        setattr(view, ISOLATION_ATTRIBUTE, level)
+        return view
+
+    return decorator
+
+
+def get_default_isolation_level(settings: dict) -> str:
+    return settings.get("websauna.db.isolation_level", "SERIALIZABLE").upper()
+
+
+def get_read_isolation_level(settings: dict) -> str:
+    return settings.get("websauna.db.read_isolation_level", get_default_isolation_level(settings)).upper()
+
+
+def get_request_isolation_level(request: Request) -> str:
+    """Pick the isolation level of a request when its database session is created.
+
+    Levels of views marked with :py:func:`isolation_level` are known by route name. Other requests use the level by request method.
+
+    The session may be created by a tween before the router has matched the route, so the route is matched here if needed.
+    """
+    route = getattr(request, "matched_route", None)
+    if route is None:
+        mapper = request.registry.queryUtility(IRoutesMapper)
+        if mapper is not None:
+            route = mapper(request)["route"]
+
+    if route is not None:
+        level = getattr(request.registry, "route_isolation_levels", {}).get(route.name)
+        if level:
+            return level
+
+    settings = request.registry.settings or {}
+    if request.method in SAFE_METHODS:
+        return get_read_isolation_level(settings)
+    return get_default_isolation_level(settings)
+
+
+def set_isolation_level(dbsession: Session, level: str):
+    """Set the isolation level of the next transaction of the session.
+
+    PostgreSQL can change the isolation level only before the first query of a transaction. If the transaction is already running at another level, it keeps its level and a warning is logged.
+    """
+    active = dbsession.info.get(INFO_ACTIVE_LEVEL)
+    if active and active != level:
+        logger.warning("Transaction already running at %s, cannot change it to %s", active, level)
+        return
+    dbsession.info[INFO_LEVEL] = level
+
+
+def on_after_begin(session: Session, transaction, connection):
+    """Apply the requested isolation level to a new transaction of the primary database."""
+
+    if connection.engine is not session.bind:
+        # Read replica, see websauna.system.model.routing
+        return
+
+    default = getattr(connection.dialect, "isolation_level", None)
+    level = session.info.get(INFO_LEVEL) or default
+
+    if level and level != default:
+        connection.execute("SET TRANSACTION ISOLATION LEVEL {}".format(level))
+
+    session.info[INFO_ACTIVE_LEVEL] = level
+
+
+def on_after_transaction_end(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop(INFO_ACTIVE_LEVEL, None)
+
+
+def listen_isolation_events(target):
+    """Make sessions of a session factory honour isolation levels set with :py:func:`set_isolation_level`."""
+    event.listen(target, "after_begin", on_after_begin)
+    event.listen(target, "after_transaction_end", on_after_transaction_end)
+
+
+def get_view_isolation_level(view, attr: str=None) -> Optional[str]:
+    """Find isolation level marker of a view function or a class based view method, including overridden methods of base classes."""
+    if attr and inspect.isclass(view):
+        for cls in inspect.getmro(view):
+            func = cls.__dict__.get(attr)
+            if func is not None and hasattr(func, ISOLATION_ATTRIBUTE):
+                return getattr(func, ISOLATION_ATTRIBUTE)
+    return getattr(view, ISOLATION_ATTRIBUTE, None)
+
+
+def get_view_name(view, attr: str=None) -> str:
+    name = "{}.{}".format(view.__module__, getattr(view, "__qualname__", getattr(view, "__name__", repr(view))))
+    if attr:
+        name += "." + attr
+    return name
+
+
+def record_attempt(name: str, attempt: int):
+    """Count view attempts and retries caused by transaction conflicts."""
+    with _lock:
+        stats = _stats.setdefault(name, {"attempts": 0, "retries": 0})
+        stats["attempts"] += 1
+        if attempt > 1:
+            stats["retries"] += 1
+
+    if attempt > 1:
+        logger.info("Retrying %s, attempt %d", name, attempt)
+
+
+def get_retry_stats() -> dict:
+    """Get attempt and retry counts of views run in this process.
+
+    :return: Dictionary of route or view name -> dict(attempts, retries)
+    """
+    with _lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def reset_retry_stats():
+    with _lock:
+        _stats.clear()
+
+
+def get_attempt(request: Request) -> int:
+    """Tell how many times pyramid_tm has run the request, this attempt included.
+
+    pyramid_tm runs the same request object again on retry, so the counter is kept in WSGI environment.
+    """
+    attempt = request.environ.get(ENVIRON_ATTEMPT, 0) + 1
+    request.environ[ENVIRON_ATTEMPT] = attempt
+    return attempt
+
+
+def isolation_view_deriver(view, info):
+    """Pyramid view deriver applying view isolation levels and counting transaction retries."""
+    attr = info.options.get("attr")
+    level = get_view_isolation_level(info.original_view, attr)
+    route_name = info.options.get("route_name")
+    name = route_name or get_view_name(info.original_view, attr)
+
+    if route_name:
+        # Levels of all views of the route
+        route_levels = info.registry.route_isolation_views.setdefault(route_name, set())
+        route_levels.add(level)
+
+        if len(route_levels) > 1 and route_levels != {None}:
+            raise ConfigurationError("Views of route {} have different isolation levels: {}. The level is picked by route before the view is known, give {} a route of its own.".format(route_name, ", ".join(sorted(str(l) for l in route_levels)), get_view_name(info.original_view, attr)))
+
+        if level:
+            # Known before the view is run, so the level applies to queries done by authentication too
+            info.registry.route_isolation_levels[route_name] = level
+
+    elif level:
+        raise ConfigurationError("View {} has isolation level {}, but no route_name. The level is picked by route before the view is known.".format(name, level))
+
+    def wrapper(context, request):
+
+        # Exception views run within the attempt which failed
+        if getattr(request, "exception", None) is None:
+            record_attempt(name, get_attempt(request))
+
+        return view(context, request)
+
+    return wrapper
@@ -8,6 +8,21 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.schema import MetaData
 import zope.sqlalchemy
 
+from websauna.compat.typing import List
+from websauna.compat.typing import Optional
+from websauna.system.model.isolation import get_default_isolation_level
+from websauna.system.model.isolation import get_request_isolation_level
+from websauna.system.model.isolation import isolation_view_deriver
+from websauna.system.model.isolation import listen_isolation_events
+from websauna.system.model.isolation import INFO_LEVEL
+from websauna.system.model.pool import configure_pool_stats
+from websauna.system.model.pool import get_pool_options
+from websauna.system.model.pool import POOL_PREFIX
+from websauna.system.model.routing import RoutingSession
+from websauna.system.model.routing import routing_view_deriver
+from websauna.system.model.sqlstats import attach_engine_listeners
+from websauna.system.model.sqlstats import is_sql_stats_enabled
+
 # Recommended naming convention used by Alembic, as various different database
 # providers will autogenerate vastly different names making migrations more
 # difficult. See: http://alembic.readthedocs.org/en/latest/naming.html
@@ -22,6 +37,9 @@ NAMING_CONVENTION = {
 
 metadata = MetaData(naming_convention=NAMING_CONVENTION)
 
+#: Settings prefix of read replica engines
+REPLICA_PREFIX = "sqlalchemy.replica."
+
 #: This is a default SQLAlchemy model base class. Models inhering from this class are automatically registered with the default SQLAlchemy session. You can have your alternative Base class, but in this case you need to bind the Base class session yourself.
 Base = declarative_base(metadata=metadata)
 
@@ -36,10 +54,28 @@ def includeme(config):
     """
     settings = config.get_settings()
     engine = get_engine(settings)
-    dbmaker = get_dbmaker(engine)
+    replica_engines = get_replica_engines(settings)
+    dbmaker = get_dbmaker(engine, replica_engines)
+
+    if is_sql_stats_enabled(settings):
+        for db_engine in [engine] + replica_engines:
+            attach_engine_listeners(db_engine)
+        config.add_tween("websauna.system.model.sqlstats.SQLStatsTweenFactory", over="pyramid_tm.tm_tween_factory")
+
+    config.registry.db_engine = engine
+    config.registry.db_replicas = bool(replica_engines)
+    config.registry.route_isolation_levels = {}
+    config.registry.route_isolation_views = {}
+    config.add_view_deriver(routing_view_deriver)
+    config.add_view_deriver(isolation_view_deriver)
+
+    def create_request_session(request):
+        dbsession = get_session(request.tm, dbmaker)
+        dbsession.info[INFO_LEVEL] = get_request_isolation_level(request)
+        return dbsession
 
     config.add_request_method(
-        lambda r: get_session(r.tm, dbmaker),
+        create_request_session,
         'dbsession',
         reify=True
     )
@@ -66,24 +102,64 @@ def get_session(transaction_manager, dbmaker):
     return dbsession
 
 
-def get_engine(settings: dict, prefix='sqlalchemy.') -> Engine:
+def get_engine(settings: dict, prefix='sqlalchemy.', isolation_level=None) -> Engine:
     """Reads config and create a database engine out of it.
 
-    The database engine defaults to SERIALIZABLE isolation level.
+    The database engine defaults to ``websauna.db.isolation_level`` isolation level, SERIALIZABLE if not set. The connection pool is configured with ``websauna.db.pool_*`` settings, see :py:mod:`websauna.system.model.pool`.
 
     :param settings:
     :param prefix:
+    :param isolation_level: Override the isolation level setting
     :return:
     """
 
+    isolation_level = isolation_level or get_default_isolation_level(settings)
+    pool_options = get_pool_options(settings)
+    pool_settings = {key: value for key, value in settings.items() if key.startswith(POOL_PREFIX)}
+
+    # Replica settings live under the same prefix, but are not engine options
+    settings = {key: value for key, value in settings.items() if not key.startswith(REPLICA_PREFIX) and key not in pool_settings}
+
     # http://stackoverflow.com/questions/14783505/encoding-error-with-sqlalchemy-and-postgresql
-    engine = engine_from_config(settings, 'sqlalchemy.', connect_args={"options": "-c timezone=utc"}, client_encoding='utf8', isolation_level='SERIALIZABLE')
+    engine = engine_from_config(settings, prefix, connect_args={"options": "-c timezone=utc"}, client_encoding='utf8', isolation_level=isolation_level, **pool_options)
+    configure_pool_stats(engine, pool_settings)
     return engine
 
 
-def get_dbmaker(engine):
-    dbmaker = sessionmaker()
+def get_replica_engines(settings: dict) -> List[Engine]:
+    """Create engines for read replicas from ``sqlalchemy.replica.*`` settings.
+
+    ``sqlalchemy.replica.url`` can list several replicas separated by whitespace. Other ``sqlalchemy.replica.*`` settings apply to all of them.
+
+    Replicas default to REPEATABLE READ isolation level, as hot standby servers cannot run SERIALIZABLE transactions.
+
+    :return: List of engines, empty if no replicas are configured
+    """
+    urls = settings.get(REPLICA_PREFIX + "url", "").split()
+    options = {key[len(REPLICA_PREFIX):]: value for key, value in settings.items() if key.startswith(REPLICA_PREFIX) and key != REPLICA_PREFIX + "url"}
+    isolation_level = options.pop("isolation_level", "REPEATABLE READ")
+
+    # Replicas share the pool settings of the primary
+    pool_settings = {key: value for key, value in settings.items() if key.startswith(POOL_PREFIX)}
+
+    engines = []
+    for url in urls:
+        replica_settings = dict(options, url=url, **pool_settings)
+        engines.append(get_engine(replica_settings, prefix="", isolation_level=isolation_level))
+    return engines
+
+
+def get_dbmaker(engine, replica_engines: Optional[List[Engine]]=None):
+    """Create a session factory.
+
+    :param replica_engines: If given, create :py:class:`websauna.system.model.routing.RoutingSession` sessions which can read from the replicas
+    """
+    if replica_engines:
+        dbmaker = sessionmaker(class_=RoutingSession, replica_engines=replica_engines)
+    else:
+        dbmaker = sessionmaker()
     dbmaker.configure(bind=engine)
+    listen_isolation_events(dbmaker)
     return dbmaker
 
 
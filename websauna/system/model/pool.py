@@ -0,0 +1,186 @@
+"""Database connection pool configuration and metrics.
+
+Pool settings:
+
+* ``websauna.db.pool_class``: ``queue`` keeps up to ``pool_size`` connections open. ``null`` opens a new connection for each checkout, for running behind an external pooler like pgbouncer.
+
+* ``websauna.db.pool_size``, ``websauna.db.pool_max_overflow``, ``websauna.db.pool_timeout``, ``websauna.db.pool_recycle``: see `SQLAlchemy pooling <http://docs.sqlalchemy.org/en/latest/core/pooling.html>`_
+
+* ``websauna.db.pool_pre_ping``: test connections with a ping on checkout, so that connections dropped by the database server or a failover are replaced before use
+
+Checked out connections, new connections and invalidated connections are counted with SQLAlchemy pool events. When all ``pool_size + pool_max_overflow`` connections are checked out, further requests queue for ``pool_timeout`` seconds before failing. Such exhaustion is logged as a warning, which tells the pool is too small for the load. See :py:func:`get_pool_stats`.
+"""
+import logging
+import threading
+import time
+import typing as t
+
+from pyramid.settings import asbool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
+
+
+logger = logging.getLogger(__name__)
+
+#: Settings prefix of pool options
+POOL_PREFIX = "websauna.db.pool_"
+
+#: SQLAlchemy default of QueuePool max_overflow
+DEFAULT_MAX_OVERFLOW = 10
+
+
+class PoolStats:
+    """Checkout metrics of a connection pool.
+
+    :param capacity: Maximum number of connections the pool hands out, or ``None`` if unlimited
+    """
+
+    def __init__(self, capacity: t.Optional[int]=None):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.exhausted = 0
+        self.exhausted_since = None
+        self.exhausted_total = 0.0
+        self.connects = 0
+        self.connect_total = 0.0
+        self.connect_max = 0.0
+        self.invalidations = 0
+
+    def record_checkout(self):
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            exhausted = self.capacity is not None and self.checked_out >= self.capacity and self.exhausted_since is None
+            if exhausted:
+                self.exhausted += 1
+                self.exhausted_since = time.perf_counter()
+
+        if exhausted:
+            logger.warning("Database connection pool exhausted, all %d connections checked out", self.capacity)
+
+    def record_checkin(self):
+        with self.lock:
+            self.checked_out -= 1
+            if self.exhausted_since is not None and self.checked_out < self.capacity:
+                self.exhausted_total += time.perf_counter() - self.exhausted_since
+                self.exhausted_since = None
+
+    def record_connect(self, duration: float):
+        with self.lock:
+            self.connects += 1
+            self.connect_total += duration
+            self.connect_max = max(self.connect_max, duration)
+
+    def record_invalidation(self):
+        with self.lock:
+            self.invalidations += 1
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            exhausted_total = self.exhausted_total
+            if self.exhausted_since is not None:
+                exhausted_total += time.perf_counter() - self.exhausted_since
+
+            return {
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "exhausted": self.exhausted,
+                "exhausted_ms": exhausted_total * 1000,
+                "connects": self.connects,
+                "connect_avg_ms": self.connect_total * 1000 / self.connects if self.connects else 0.0,
+                "connect_max_ms": self.connect_max * 1000,
+                "invalidations": self.invalidations,
+            }
+
+
+POOL_CLASSES = {
+    "queue": QueuePool,
+    "null": NullPool,
+}
+
+
+def get_pool_options(settings: dict) -> dict:
+    """Convert ``websauna.db.pool_*`` settings to ``create_engine()`` arguments."""
+    pool_class = settings.get(POOL_PREFIX + "class", "queue")
+    if pool_class not in POOL_CLASSES:
+        raise RuntimeError("Unknown websauna.db.pool_class {}, use one of {}".format(pool_class, ", ".join(POOL_CLASSES)))
+
+    options = {"poolclass": POOL_CLASSES[pool_class]}
+
+    if pool_class == "queue":
+        for name, option in (("size", "pool_size"), ("max_overflow", "max_overflow"), ("timeout", "pool_timeout")):
+            value = settings.get(POOL_PREFIX + name)
+            if value not in (None, ""):
+                options[option] = int(value)
+
+    recycle = settings.get(POOL_PREFIX + "recycle")
+    if recycle not in (None, ""):
+        options["pool_recycle"] = int(recycle)
+
+    pre_ping = settings.get(POOL_PREFIX + "pre_ping")
+    if pre_ping not in (None, ""):
+        options["pool_pre_ping"] = asbool(pre_ping)
+
+    return options
+
+
+def configure_pool_stats(engine: Engine, settings: dict):
+    """Start collecting :py:class:`PoolStats` of an engine connection pool.
+
+    Listeners are attached to ``engine.pool`` and carry over to the new pool created by ``engine.dispose()``, e.g. after forking a worker process.
+    """
+    pool = engine.pool
+    capacity = None
+    if isinstance(pool, QueuePool):
+        max_overflow = get_pool_options(settings).get("max_overflow", DEFAULT_MAX_OVERFLOW)
+        if max_overflow >= 0:
+            capacity = pool.size() + max_overflow
+
+    stats = engine.pool_stats = PoolStats(capacity)
+
+    def do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["websauna_connect_start"] = time.perf_counter()
+
+    def connect(dbapi_connection, connection_record):
+        started = connection_record.info.pop("websauna_connect_start", None)
+        if started is not None:
+            stats.record_connect(time.perf_counter() - started)
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.record_checkout()
+
+    def checkin(dbapi_connection, connection_record):
+        stats.record_checkin()
+
+    def invalidate(dbapi_connection, connection_record, exception):
+        stats.record_invalidation()
+
+    event.listen(engine, "do_connect", do_connect)
+    event.listen(pool, "connect", connect)
+    event.listen(pool, "checkout", checkout)
+    event.listen(pool, "checkin", checkin)
+    event.listen(pool, "invalidate", invalidate)
+
+
+def get_pool_stats(engine: Engine) -> dict:
+    """Get checkout metrics of an engine connection pool.
+
+    :return: Dictionary with ``checked_out``, ``max_checked_out``, ``checkouts``, ``exhausted``, ``exhausted_ms``, ``connects``, ``connect_avg_ms``, ``connect_max_ms`` and ``invalidations``. Queue pools also have ``size`` and ``overflow``. Empty if :py:func:`configure_pool_stats` has not been called for the engine.
+    """
+    stats = getattr(engine, "pool_stats", None)
+    if stats is None:
+        return {}
+
+    pool = engine.pool
+    result = stats.as_dict()
+    if isinstance(pool, QueuePool):
+        result["size"] = pool.size()
+        result["overflow"] = pool.overflow()
+    return result
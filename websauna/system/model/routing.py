@@ -0,0 +1,207 @@
+"""Read replica routing for database sessions.
+
+When ``sqlalchemy.replica.url`` is set, read-only views query a hot standby replica instead of the primary database. Writes always go to the primary:
+
+* Once the session flushes changes or executes ``INSERT``, ``UPDATE`` or ``DELETE``, the session is pinned to the primary for the rest of the transaction, so that it reads its own writes
+
+* ``SELECT ... FOR UPDATE`` and raw SQL statements go to the primary
+
+Which views read from the replica is decided by ``websauna.db.replica_routing`` setting:
+
+* ``safe_methods`` (default): all ``GET`` and ``HEAD`` requests to views, unless the view is marked with :py:func:`use_primary`
+
+* ``marked``: only views marked with :py:func:`use_replica`, like CRUD listings and show pages and the sitemap
+
+Code outside views, like Celery tasks and command line scripts, always uses the primary.
+
+After a client has written to the database, its requests read from the primary for ``websauna.db.replica_sticky_seconds`` (default 10), so that it sees its own writes after a redirect.
+
+Replicas lag behind the primary. Mark views which must see the latest committed data with :py:func:`use_primary`::
+
+    from websauna.system.model.routing import use_primary
+
+    @view_config(route_name="order_status", renderer="order_status.html")
+    @use_primary
+    def order_status(request):
+        ...
+"""
+import inspect
+import random
+import time
+
+from pyramid.request import Request
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import Select
+from sqlalchemy.sql.expression import UpdateBase
+
+from websauna.compat.typing import List
+
+
+#: Attribute set by :py:func:`use_primary` and :py:func:`use_replica` on views
+ROUTING_ATTRIBUTE = "__websauna_db_routing__"
+
+PRIMARY = "primary"
+
+REPLICA = "replica"
+
+SAFE_METHODS = ("GET", "HEAD")
+
+#: Cookie telling until when the client reads from the primary after a write
+STICKY_COOKIE = "ws_db_primary"
+
+
+class RoutingSession(Session):
+    """SQLAlchemy session choosing between the primary database and read replicas per statement.
+
+    :param replica_engines: Engines of read replicas. One replica is picked at random for the lifetime of the session.
+    """
+
+    def __init__(self, replica_engines: List[Engine]=(), **kwargs):
+        super(RoutingSession, self).__init__(**kwargs)
+        self.replica_engines = list(replica_engines)
+        self.replica_engine = None
+
+        #: Set for the duration of read-only views
+        self.use_replica = False
+
+        #: Set when the session must stay on the primary for the rest of the transaction
+        self.pinned = False
+
+        #: Set when the session has written something
+        self.wrote = False
+
+    def is_read(self, clause) -> bool:
+        """Can the statement be run against a replica."""
+        if not isinstance(clause, Select):
+            return False
+        return getattr(clause, "_for_update_arg", None) is None
+
+    def get_replica_engine(self) -> Engine:
+        if self.replica_engine is None:
+            self.replica_engine = random.choice(self.replica_engines)
+        return self.replica_engine
+
+    def get_bind(self, mapper=None, clause=None):
+        if isinstance(clause, UpdateBase):
+            # INSERT, UPDATE and DELETE statements
+            self.pinned = self.wrote = True
+
+        # Raw SQL and locking reads go to the primary, but do not pin the session
+        if self.use_replica and not self.pinned and self.replica_engines and self.is_read(clause):
+            return self.get_replica_engine()
+
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            self.pinned = self.wrote = True
+        super(RoutingSession, self).flush(objects)
+
+
+def use_primary(view):
+    """Decorate a view function or view class method to always query the primary database."""
+    setattr(view, ROUTING_ATTRIBUTE, PRIMARY)
+    return view
+
+
+def use_replica(view):
+    """Decorate a view function, class or method to query read replicas, if configured.
+
+    Writes still go to the primary.
+    """
+    setattr(view, ROUTING_ATTRIBUTE, REPLICA)
+    return view
+
+
+def pin_primary(request: Request):
+    """Run all remaining queries of the request against the primary database.
+
+    Call this in a view before reading data which must be up to date.
+    """
+    if getattr(request.registry, "db_replicas", False):
+        dbsession = request.dbsession
+        if isinstance(dbsession, RoutingSession):
+            dbsession.pinned = True
+
+
+def get_view_routing(view, attr: str=None):
+    """Find routing marker of a view function or a class based view method.
+
+    Markers of overridden methods are inherited by subclasses, so that marking a base view class method is enough.
+    """
+    if attr and inspect.isclass(view):
+        for cls in inspect.getmro(view):
+            func = cls.__dict__.get(attr)
+            if func is not None and hasattr(func, ROUTING_ATTRIBUTE):
+                return getattr(func, ROUTING_ATTRIBUTE)
+    return getattr(view, ROUTING_ATTRIBUTE, None)
+
+
+def get_sticky_seconds(registry) -> int:
+    settings = registry.settings or {}
+    return int(settings.get("websauna.db.replica_sticky_seconds", 10))
+
+
+def has_written_recently(request: Request) -> bool:
+    """Did the client write to the database within ``websauna.db.replica_sticky_seconds``."""
+    value = request.cookies.get(STICKY_COOKIE)
+    try:
+        return value is not None and float(value) > time.time()
+    except ValueError:
+        return False
+
+
+def remember_writes(request: Request):
+    """Keep the client on the primary for a while after it has written.
+
+    Views usually redirect after a write. The replica may not have the written data yet when the browser loads the redirect target, so the following requests read from the primary.
+    """
+    dbsession = request.__dict__.get("dbsession")
+    if not isinstance(dbsession, RoutingSession) or not dbsession.wrote:
+        return
+
+    seconds = get_sticky_seconds(request.registry)
+    if not seconds:
+        return
+
+    def callback(request, response):
+        response.set_cookie(STICKY_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True)
+
+    request.add_response_callback(callback)
+
+
+def routing_view_deriver(view, info):
+    """Pyramid view deriver switching the request database session to replicas for the duration of read-only views."""
+    routing = get_view_routing(info.original_view, info.options.get("attr"))
+
+    settings = info.registry.settings or {}
+    mode = settings.get("websauna.db.replica_routing", "safe_methods")
+
+    def is_replica_view(request):
+        if routing == PRIMARY:
+            return False
+        if routing == REPLICA:
+            return True
+        return mode == "safe_methods" and request.method in SAFE_METHODS
+
+    def wrapper(context, request):
+        if not getattr(request.registry, "db_replicas", False):
+            return view(context, request)
+
+        if not is_replica_view(request) or has_written_recently(request):
+            response = view(context, request)
+            remember_writes(request)
+            return response
+
+        dbsession = request.dbsession
+        dbsession.use_replica = True
+        try:
+            response = view(context, request)
+        finally:
+            dbsession.use_replica = False
+
+        remember_writes(request)
+        return response
+
+    return wrapper
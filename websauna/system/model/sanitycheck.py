@@ -1,13 +1,108 @@
+"""Check the database schema matches the declared models on startup.
+
+All columns of the model tables are fetched with a single ``information_schema`` query instead of reflecting each table separately.
+
+Optionally the result is remembered in Redis. The marker key is a fingerprint of the declared tables and columns and the Alembic migration heads in the database. Workers booting later find the marker and skip the catalog query, until models change or migrations are run. See :ref:`websauna.sanity_check_cache_seconds`.
+"""
+import hashlib
 import logging
 
 from sqlalchemy import inspect
+from sqlalchemy import text
 from sqlalchemy.ext.declarative.clsregistry import _ModuleMarker
 from sqlalchemy.orm import RelationshipProperty
 
+from websauna.compat.typing import Dict
+from websauna.compat.typing import List
+from websauna.compat.typing import Set
+
+
 logger = logging.getLogger(__name__)
 
 
-def is_sane_database(Base, session):
+#: Version tables of Alembic migrations, see :py:func:`websauna.system.devop.alembic.get_migration_table_name`
+VERSION_TABLE_PATTERN = "alembic\\_history\\_%"
+
+
+def get_declared_columns(Base) -> Dict[str, Set[str]]:
+    """Get tables and their columns declared by the models of a declarative base.
+
+    :return: Dictionary of table name -> set of column names
+    """
+    declared = {}
+
+    # Go through all SQLAlchemy models
+    for name, klass in Base._decl_class_registry.items():
+
+        if isinstance(klass, _ModuleMarker):
+            # Not a model
+            continue
+
+        columns = declared.setdefault(klass.__tablename__, set())
+        mapper = inspect(klass)
+
+        for column_prop in mapper.attrs:
+            if isinstance(column_prop, RelationshipProperty):
+                # TODO: Add sanity checks for relations
+                pass
+            else:
+                for column in column_prop.columns:
+                    # Assume normal flat column
+                    columns.add(column.key)
+
+    return declared
+
+
+def get_schema_fingerprint(declared: Dict[str, Set[str]]) -> str:
+    """Hash of declared tables and columns."""
+    lines = ["{}.{}".format(table, column) for table, columns in declared.items() for column in columns]
+    lines += list(declared.keys())
+    return hashlib.sha1("\n".join(sorted(lines)).encode("utf-8")).hexdigest()
+
+
+def get_database_columns(session, tables: List[str]) -> Dict[str, Set[str]]:
+    """Fetch columns of the given tables in the current schema with one query.
+
+    :param session: SQLAlchemy session or connection
+    :return: Dictionary of table name -> set of column names. Missing tables are not included.
+    """
+    result = session.execute(text(
+        "SELECT t.table_name, c.column_name "
+        "FROM information_schema.tables t "
+        "LEFT JOIN information_schema.columns c ON c.table_schema = t.table_schema AND c.table_name = t.table_name "
+        "WHERE t.table_schema = current_schema() AND t.table_name = ANY(:tables)"), {"tables": list(tables)})
+
+    columns = {}
+    for table, column in result:
+        names = columns.setdefault(table, set())
+        if column is not None:
+            names.add(column)
+    return columns
+
+
+def get_migration_heads(session) -> List[str]:
+    """Get versions of all Alembic version tables in the current schema.
+
+    :param session: SQLAlchemy session or connection
+    """
+    result = session.execute(text(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = current_schema() AND table_name LIKE :pattern"), {"pattern": VERSION_TABLE_PATTERN})
+    tables = sorted(row[0] for row in result)
+    if not tables:
+        return []
+
+    # Table names come from the catalog, quote them anyway
+    query = " UNION ALL ".join("SELECT '{0}' || ':' || version_num FROM \"{0}\"".format(table.replace('"', '""').replace("'", "''")) for table in tables)
+    return sorted(row[0] for row in session.execute(text(query)))
+
+
+def get_marker_key(fingerprint: str, heads: List[str]) -> str:
+    heads_hash = hashlib.sha1(" ".join(heads).encode("utf-8")).hexdigest()
+    return "websauna:sanity_check:{}:{}".format(fingerprint, heads_hash)
+
+
+def is_sane_database(Base, session, redis=None, cache_seconds: int=0) -> bool:
     """Check whether the current database matches the models declared in model base.
 
     Currently we check that all tables exist with all columns. What is not checked
@@ -18,47 +113,39 @@ def is_sane_database(Base, session):
 
     :param Base: Declarative Base for SQLAlchemy models to check
 
-    :param session: SQLAlchemy session bound to an engine
+    :param session: SQLAlchemy session or connection
+
+    :param redis: If given, remember a successful check in Redis for ``cache_seconds``
 
     :return: True if all declared models have corresponding tables and columns.
     """
 
-    engine = session.get_bind()
-    iengine = inspect(engine)
+    declared = get_declared_columns(Base)
 
-    errors = False
+    marker_key = None
+    if redis is not None and cache_seconds:
+        marker_key = get_marker_key(get_schema_fingerprint(declared), get_migration_heads(session))
+        if redis.get(marker_key):
+            return True
 
-    tables = iengine.get_table_names()
+    existing = get_database_columns(session, list(declared.keys()))
+    bind = getattr(session, "bind", None) or getattr(session, "engine", None)
 
-    # Go through all SQLAlchemy models
-    for name, klass in Base._decl_class_registry.items():
+    errors = False
 
-        if isinstance(klass, _ModuleMarker):
-            # Not a model
+    for table, columns in sorted(declared.items()):
+
+        if table not in existing:
+            logger.error("Models declare table %s which does not exist in database %s", table, bind)
+            errors = True
             continue
 
-        table = klass.__tablename__
-        if table in tables:
-            # Check all columns are found
-            # Looks like [{'default': "nextval('sanity_check_test_id_seq'::regclass)", 'autoincrement': True, 'nullable': False, 'type': INTEGER(), 'name': 'id'}]
-
-            columns = [c["name"] for c in iengine.get_columns(table)]
-            mapper = inspect(klass)
-
-            for column_prop in mapper.attrs:
-                if isinstance(column_prop, RelationshipProperty):
-                    # TODO: Add sanity checks for relations
-                    pass
-                else:
-                    for column in column_prop.columns:
-                        # Assume normal flat column
-                        if not column.key in columns:
-
-                            # It is safe to stringify engine where as password should be blanked out by stars
-                            logger.error("Model %s declares column %s which does not exist in database %s", klass, column.key, engine)
-                            errors = True
-        else:
-            logger.error("Model %s declares table %s which does not exist in database %s", klass, table, engine)
+        for column in sorted(columns - existing[table]):
+            # It is safe to stringify engine where as password should be blanked out by stars
+            logger.error("Models declare column %s.%s which does not exist in database %s", table, column, bind)
             errors = True
 
-    return not errors
\ No newline at end of file
+    if marker_key and not errors:
+        redis.setex(marker_key, cache_seconds, "1")
+
+    return not errors
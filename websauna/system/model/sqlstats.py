@@ -0,0 +1,143 @@
+"""Per-request SQL statistics.
+
+Enable with ``websauna.db.sql_stats = true``. SQLAlchemy engine listeners then count the statements and the database time of each request and group statements by their fingerprint, the statement with literals and parameter lists normalized away.
+
+* With ``websauna.db.sql_stats_headers = true`` responses carry ``X-DB-Statements``, ``X-DB-Time`` and ``X-DB-Repeated`` headers. Meant for development only.
+
+* Requests slower than ``websauna.db.slow_request_ms`` are logged with their statistics.
+
+* When a statement shape runs more than ``websauna.db.repeated_statement_threshold`` times in a request, a warning is logged. This is usually a N+1 query problem: a relationship loaded lazily in a loop. Fix it with ``joinedload()`` or ``selectinload()``.
+
+Statements outside requests, like in Celery tasks, are not counted.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from pyramid.registry import Registry
+from pyramid.settings import asbool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from websauna.compat.typing import Optional
+from websauna.system.http import Request
+
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+
+_number_literal = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+_value_list = re.compile(r"\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)")
+
+_whitespace = re.compile(r"\s+")
+
+
+def get_fingerprint(statement: str) -> str:
+    """Normalize SQL statement to its shape.
+
+    Literals become ``?`` and parameter lists like ``IN (%(id_1)s, %(id_2)s)`` become ``(...)``, so that statements differing only by values get the same fingerprint.
+    """
+    statement = _string_literal.sub("?", statement)
+    statement = _number_literal.sub("?", statement)
+    statement = _value_list.sub("(...)", statement)
+    return _whitespace.sub(" ", statement).strip()
+
+
+class SQLStats:
+    """SQL statistics of one request."""
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.statements += 1
+        self.duration += duration
+        self.fingerprints[get_fingerprint(statement)] += 1
+
+    def get_repeated(self, threshold: int) -> dict:
+        """Get fingerprints of statements run more than threshold times."""
+        return {fingerprint: count for fingerprint, count in self.fingerprints.items() if count > threshold}
+
+
+def get_current_stats() -> Optional[SQLStats]:
+    """Get statistics of the request being processed in this thread, if SQL statistics are enabled."""
+    return getattr(_local, "stats", None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is thrown away if the statement fails
+    context._websauna_query_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_websauna_query_start", None)
+    stats = get_current_stats()
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def attach_engine_listeners(engine: Engine):
+    """Make the engine report statements to the statistics of the current request."""
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def is_sql_stats_enabled(settings: dict) -> bool:
+    return asbool(settings.get("websauna.db.sql_stats", False))
+
+
+class SQLStatsTweenFactory:
+    """Tween collecting SQL statistics of requests.
+
+    The tween is placed over ``pyramid_tm``, so that statements run on commit are included.
+    """
+
+    def __init__(self, handler, registry: Registry):
+        self.handler = handler
+        self.registry = registry
+        settings = registry.settings or {}
+        self.headers = asbool(settings.get("websauna.db.sql_stats_headers", False))
+        self.slow_request_ms = float(settings.get("websauna.db.slow_request_ms", 1000))
+        self.repeated_threshold = int(settings.get("websauna.db.repeated_statement_threshold", 10))
+
+    def report(self, request: Request, response, stats: SQLStats, duration: float):
+        repeated = stats.get_repeated(self.repeated_threshold)
+
+        for fingerprint, count in repeated.items():
+            logger.warn("Possible N+1 query on %s %s: statement run %d times: %s", request.method, request.path, count, fingerprint)
+
+        if duration * 1000 >= self.slow_request_ms:
+            info = {
+                "method": request.method,
+                "path": request.path,
+                "status": getattr(response, "status_code", None),
+                "duration_ms": round(duration * 1000, 1),
+                "db_time_ms": round(stats.duration * 1000, 1),
+                "db_statements": stats.statements,
+                "db_repeated": len(repeated),
+            }
+            logger.warn("Slow request %s", " ".join("{}={}".format(key, value) for key, value in info.items()), extra={"sql_stats": info})
+
+        if self.headers and response is not None:
+            response.headers["X-DB-Statements"] = str(stats.statements)
+            response.headers["X-DB-Time"] = "{:.1f}".format(stats.duration * 1000)
+            response.headers["X-DB-Repeated"] = str(len(repeated))
+
+    def __call__(self, request: Request):
+        stats = _local.stats = SQLStats()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.handler(request)
+            return response
+        finally:
+            _local.stats = None
+            self.report(request, response, stats, time.perf_counter() - started)
@@ -17,6 +17,8 @@ class UserAdmin(ModelAdmin):
 
     mapper = Base64UUIDMapper()
 
+    search_columns = ("email", "username", "user_data/full_name")
+
     class Resource(ModelAdmin.Resource):
         """Wrap one SQLAlhcemy user mode to admin resource.
 
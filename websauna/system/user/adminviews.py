@@ -4,20 +4,33 @@ import deform
 from pyramid_layout.panel import panel_config
 
 
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.httpexceptions import HTTPFound
 from pyramid.view import view_config
+from sqlalchemy import and_
+from sqlalchemy import exists
+from sqlalchemy import inspect
+from sqlalchemy import literal
+from sqlalchemy import select
 
 from websauna.system.admin.utils import get_admin_url_for_sqlalchemy_object
+from websauna.system.auth.principalcache import invalidate_session_tokens
 from websauna.system.core import messages
+from websauna.system.crud import bulk
+from websauna.system.crud import filters
+from websauna.system.crud.search import FullTextSearch
 from websauna.system.crud.sqlalchemy import sqlalchemy_deleter
 from websauna.system.crud.views import TraverseLinkButton
 from websauna.system.form.fieldmapper import EditMode
 from websauna.system.form.fields import defer_widget_values
+from websauna.system.form.vocabulary import get_vocabulary
 from websauna.system.crud.formgenerator import SQLAlchemyFormGenerator
 from websauna.system.user.interfaces import IPasswordHasher
 from websauna.system.user.models import User
 from websauna.system.user.schemas import group_vocabulary, GroupSet, validate_unique_user_email
+from websauna.system.user.utils import get_group_class
 from websauna.system.user.utils import get_user_registry
+from websauna.utils.slug import slug_to_uuid
 from websauna.utils.time import now
 from websauna.viewconfig import view_overrides
 from websauna.system.crud import listing
@@ -35,6 +48,68 @@ def kill_user_sessions(request, user, operation):
     request.registry.notify(e)
 
 
+def kill_bulk_user_sessions(request, ids):
+    """Bulk version of :py:func:`kill_user_sessions` for users updated with set-based SQL.
+
+    ``last_auth_sensitive_operation_at`` must be set by the caller in the same statement. No :py:class:`websauna.system.user.events.UserAuthSensitiveOperation` is fired, as there are no user objects to pass, but cached principals are dropped. Session tokens are assumed to be user ids like in the default user registry.
+    """
+    invalidate_session_tokens(request, ids)
+
+
+class UserUpdateAction(bulk.UpdateAction):
+    """Update users and drop their sessions."""
+
+    def get_values(self, request, target=None):
+        values = super(UserUpdateAction, self).get_values(request, target)
+        values["last_auth_sensitive_operation_at"] = now()
+        return values
+
+    def execute_chunk(self, request, dbsession, model, ids, target=None):
+        count = super(UserUpdateAction, self).execute_chunk(request, dbsession, model, ids, target)
+        kill_bulk_user_sessions(request, ids)
+        return count
+
+
+class UserDeleteAction(bulk.DeleteAction):
+    """Delete users and drop their sessions."""
+
+    def execute_chunk(self, request, dbsession, model, ids, target=None):
+        count = super(UserDeleteAction, self).execute_chunk(request, dbsession, model, ids, target)
+        kill_bulk_user_sessions(request, ids)
+        return count
+
+
+class AddToGroupAction(bulk.BulkAction):
+    """Add users to a group with one ``INSERT ... SELECT`` per chunk.
+
+    Users already in the group are skipped.
+    """
+
+    def __init__(self, id="add_to_group", name="Add to group", permission="edit"):
+        super(AddToGroupAction, self).__init__(id=id, name=name, permission=permission)
+
+    def get_choices(self, request, model):
+        Group = get_group_class(request.registry)
+        return [("{}:{}".format(self.id, slug), "{}: {}".format(self.name, label)) for slug, label in get_vocabulary(request, Group, "name")]
+
+    def execute_chunk(self, request, dbsession, model, ids, target=None):
+        Group = get_group_class(request.registry)
+        group_id = dbsession.query(Group.id).filter(Group.uuid == slug_to_uuid(target)).scalar() if target else None
+        if group_id is None:
+            raise HTTPBadRequest("Unknown group")
+
+        groups = inspect(model).relationships["groups"]
+        (_, user_column), = groups.synchronize_pairs
+        (_, group_column), = groups.secondary_synchronize_pairs
+
+        already_member = exists().where(and_(user_column == model.id, group_column == group_id))
+        members = select([model.id, literal(group_id)]).where(model.id.in_(ids)).where(~already_member)
+        result = dbsession.execute(groups.secondary.insert().from_select([user_column, group_column], members))
+
+        kill_bulk_user_sessions(request, ids)
+        return result.rowcount
+
+
 @panel_config(name='admin_panel', context=UserAdmin, renderer='admin/user_panel.html')
 def user_admin_panel(context, request, **kwargs):
     """Admin panel for Users."""
@@ -59,13 +134,22 @@ class UserListing(admin_views.Listing):
 
     table = listing.Table(
         columns = [
-            listing.Column("id", "Id",),
+            listing.Column("id", "Id", sortable=True),
             listing.Column("friendly_name", "Friendly name"),
-            listing.Column("email", "Email"),
+            listing.Column("email", "Email", sortable=True, filter=filters.PrefixFilter()),
             listing.ControlsColumn()
         ]
     )
 
+    search = FullTextSearch()
+
+    bulk_actions = [
+        UserUpdateAction(id="enable", name="Enable", values={"enabled": True}),
+        UserUpdateAction(id="disable", name="Disable", values={"enabled": False}),
+        AddToGroupAction(),
+        UserDeleteAction(),
+    ]
+
     def order_query(self, query):
         return query.order_by(self.get_model().created_at.desc())
 
@@ -73,6 +157,14 @@ class UserListing(admin_views.Listing):
     def listing(self):
         return super(UserListing, self).listing()
 
+    @view_config(context=UserAdmin, route_name="admin", name="export", permission='view')
+    def export(self):
+        return super(UserListing, self).export()
+
+    @view_config(context=UserAdmin, route_name="admin", name="bulk", request_method="POST", permission='view')
+    def bulk_action(self):
+        return super(UserListing, self).bulk_action()
+
 
 class UserShow(admin_views.Show):
     """Show one user."""
@@ -122,9 +214,13 @@ class UserEdit(admin_views.Edit):
         enabled_changes = appstruct["enabled"] != user.enabled
         email_changes = appstruct["email"] != user.email
         username_changes = appstruct["username"] != user.username
+        groups_changes = set(g.id for g in appstruct["groups"]) != set(g.id for g in user.groups)
 
         super(UserEdit, self).save_changes(form, appstruct, user)
 
+        if groups_changes:
+            self.request.registry.notify(events.UserGroupsChanged(self.request, user))
+
         # Notify authentication system to drop all sessions for this user
         if enabled_changes:
             kill_user_sessions(self.request, user, "enabled_change")
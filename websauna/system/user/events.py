@@ -71,6 +71,15 @@ class UserAuthSensitiveOperation(UserEvent):
         self.kind = kind
 
 
+class UserGroupsChanged(UserEvent):
+    """Group membership of the user has changed.
+
+    Fired upon
+
+    * Editing user groups in the admin
+    """
+
+
 class NewRegistrationEvent(UserEvent):
     def __init__(self, request, user, activation, values):
         super(NewRegistrationEvent, self).__init__(request, user)
@@ -2,6 +2,7 @@
 from datetime import timedelta
 
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from websauna.system.user import events
 from websauna.system.user.interfaces import IUserRegistry, IUser, IPasswordHasher
 from websauna.system.user.usermixin import UserMixin, GroupMixin
@@ -130,8 +131,11 @@ class DefaultEmailBasedUserRegistry:
         return user.id
 
     def get_user_by_session_token(self, token: str):
-        """Resolve the authenticated user by a session token reference."""
-        return self.dbsession.query(self.User).get(token)
+        """Resolve the authenticated user by a session token reference.
+
+        Groups are loaded in the same query, as they are needed for resolving principals.
+        """
+        return self.dbsession.query(self.User).options(joinedload("groups")).get(token)
 
     def get_user_by_password_reset_token(self, token: str):
         """Get user by a password token issued earlier.
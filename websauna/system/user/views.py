@@ -16,6 +16,7 @@ import deform
 from websauna.system.core import messages
 from websauna.system.core.route import get_config_route
 from websauna.system.http import Request
+from websauna.system.model.routing import use_primary
 from .utils import get_login_service, get_oauth_login_service, get_credential_activity_service, get_registration_service
 from .interfaces import AuthenticationFailure, CannotResetPasswordException
 from .interfaces import ILoginForm
@@ -63,6 +64,7 @@ def register(request: Request):
 
 
 @view_config(route_name='activate')
+@use_primary
 def activate(request):
     """View to activate user after clicking email link."""
     code = request.matchdict.get('code', None)
@@ -145,6 +147,7 @@ def registration_complete(request):
 
 
 @view_config(route_name='login_social')
+@use_primary
 def login_social(request):
     """Login using OAuth and any of the social providers."""
 
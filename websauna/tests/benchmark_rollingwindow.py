@@ -0,0 +1,52 @@
+"""Compare rolling window limiter implementations.
+
+Run against a local Redis::
+
+    python -m websauna.tests.benchmark_rollingwindow redis://localhost:6379/15
+
+Prints operations per second for the previous three-command implementation and the Lua script implementation.
+"""
+import sys
+import time
+
+from redis import StrictRedis
+
+from websauna.system.form import rollingwindow
+
+
+def _check_multi_command(redis, key, window=60, limit=50):
+    """The previous implementation: three separate round trips, no key expiry."""
+    expires = time.time() - window
+    redis.zremrangebyscore(key, '-inf', expires)
+    now = time.time()
+    redis.zadd(key, {now: now})
+    return redis.zcard(key) > limit
+
+
+def run(func, redis, key, duration=3.0) -> float:
+    """Call limiter check for ``duration`` seconds and return operations per second."""
+    redis.delete(key)
+    count = 0
+    started = time.time()
+    deadline = started + duration
+    while time.time() < deadline:
+        func(redis, key, window=60, limit=1000)
+        count += 1
+    redis.delete(key)
+    return count / (time.time() - started)
+
+
+def main(argv=sys.argv):
+    url = argv[1] if len(argv) > 1 else "redis://localhost:6379/15"
+    redis = StrictRedis.from_url(url)
+
+    multi = run(_check_multi_command, redis, "benchmark_rollingwindow_multi")
+    lua = run(rollingwindow._check, redis, "benchmark_rollingwindow_lua")
+
+    print("Three commands: {:.0f} ops/sec".format(multi))
+    print("Lua script:     {:.0f} ops/sec".format(lua))
+    print("Speed up:       {:.2f}x".format(lua / multi))
+
+
+if __name__ == "__main__":
+    main()
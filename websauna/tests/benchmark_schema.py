@@ -0,0 +1,194 @@
+"""Compare dictify() and objectify() of PropertyAwareSQLAlchemySchemaNode before and after compiled accessor plans.
+
+No database is needed::
+
+    python -m websauna.tests.benchmark_schema
+
+Prints objects per second for the previous implementation, which inspected the model for every node on every call, and the compiled plan implementation.
+"""
+import sys
+import time
+
+import colander
+import sqlalchemy
+from sqlalchemy.orm import configure_mappers
+
+from websauna.system.form.colander import logger
+from websauna.system.form.editmode import EditMode
+from websauna.system.form.fieldmapper import DefaultSQLAlchemyFieldMapper
+from websauna.system.form.sqlalchemy import ModelSchemaType
+from websauna.system.form.sqlalchemy import ModelSetResultList
+from websauna.system.user.models import User
+from websauna.utils.jsonb import JSONBProperty
+
+
+INCLUDES = ["id", "uuid", "username", "email", "enabled", "created_at", "activated_at", "last_login_ip", "full_name", "registration_source"]
+
+
+def _dictify_dynamic(self, obj):
+    """The previous dictify() implementation inspecting the model on every call."""
+
+    dict_ = {}
+    for node in self:
+
+        name = node.name
+        try:
+            if JSONBProperty.is_json_property(obj, name):
+                value = getattr(obj, name)
+            else:
+                getattr(self.inspector.column_attrs, name)
+                value = getattr(obj, name)
+
+        except AttributeError:
+
+
+            try:
+                # Classic colanderalchemy
+                prop = getattr(self.inspector.relationships, name)
+
+                # We know this node is good to pass through as is, don't try to dictify subitems
+                if isinstance(node.typ, ModelSchemaType):
+                    value = getattr(obj, name)
+
+                elif prop.uselist:
+                    value = [self[name].children[0].dictify(o)
+                             for o in getattr(obj, name)]
+                else:
+                    o = getattr(obj, name)
+                    value = None if o is None else self[name].dictify(o)
+            except AttributeError:
+                # The given node isn't part of the SQLAlchemy model
+                msg = 'SQLAlchemySchemaNode.dictify: %s not found on %s'
+                logger.debug(msg, name, self)
+                continue
+
+        # SQLAlchemy mostly converts values into Python types
+        #  appropriate for appstructs, but not always.  The biggest
+        #  problems are around `None` values so we're dealing with
+        #  those here.  All types should accept `colander.null` so
+        #  we mostly change `None` into that.
+
+        if value is None:
+            if isinstance(node.typ, colander.String):
+                # colander has an issue with `None` on a String type
+                #  where it translates it into "None".  Let's check
+                #  for that specific case and turn it into a
+                #  `colander.null`.
+                dict_[name] = colander.null
+            else:
+                # A specific case this helps is with Integer where
+                #  `None` is an invalid value.  We call serialize()
+                #  to test if we have a value that will work later
+                #  for serialization and then allow it if it doesn't
+                #  raise an exception.  Hopefully this also catches
+                #  issues with user defined types and future issues.
+                try:
+                    node.serialize(value)
+                except:
+                    dict_[name] = colander.null
+                else:
+                    dict_[name] = value
+        else:
+            dict_[name] = value
+
+    return dict_
+
+def _objectify_dynamic(self, dict_, context=None):
+    """The previous objectify() implementation inspecting the model on every call."""
+
+    mapper = self.inspector
+    context = mapper.class_() if context is None else context
+
+    # If our schema and widgets wants pass us back full objects instead of theri dictified versions, let them pass through
+    if sqlalchemy.inspect(dict_, raiseerr=False) is not None:
+        return dict_
+
+    for attr in dict_:
+        if mapper.has_property(attr):
+            prop = mapper.get_property(attr)
+
+            if hasattr(prop, 'mapper'):
+                cls = prop.mapper.class_
+                value = dict_[attr]
+
+                if prop.uselist:
+                    # Sequence of objects
+
+
+                    if isinstance(value, ModelSetResultList):
+                        # We know we do not need to try to convert these
+                        pass
+                    else:
+                        # Try to map incoming colander items back to SQL items
+                        value = [self[attr].children[0].objectify(obj)
+                                 for obj in dict_[attr]]
+                else:
+
+                    if hasattr(value, "__tablename__"):
+                        # Raw SQLAlchemy object - do not try to convert
+                        pass
+                    else:
+                        # Single object
+                        if value:
+                            value = self[attr].objectify(value)
+            else:
+                 value = dict_[attr]
+                 if value is colander.null:
+                     # `colander.null` is never an appropriate
+                     #  value to be placed on an SQLAlchemy object
+                     #  so we translate it into `None`.
+                     value = None
+            setattr(context, attr, value)
+        elif hasattr(context, attr):
+            # Set any properties on the object which are not SQLAlchemy column based.
+            # These are JSONBProperty like user_data and password on the user model (actual column is called _password, but we mangle the password has before pushing it through)
+            value = dict_[attr]
+            setattr(context, attr, value)
+        else:
+            # Ignore attributes if they are not mapped
+            logger.debug(
+                'SQLAlchemySchemaNode.objectify: %s not found on '
+                '%s. This property has been ignored.',
+                attr, self
+            )
+            continue
+
+    return context
+
+
+def run(func, duration=2.0) -> float:
+    """Call ``func`` for ``duration`` seconds and return calls per second."""
+    count = 0
+    started = time.time()
+    deadline = started + duration
+    while time.time() < deadline:
+        func()
+        count += 1
+    return count / (time.time() - started)
+
+
+def main(argv=sys.argv):
+    configure_mappers()
+
+    schema = DefaultSQLAlchemyFieldMapper().map(EditMode.show, None, None, User, INCLUDES)
+
+    user = User(id=1, username="user-1", email="example@example.com", enabled=True)
+    user.full_name = "Example User"
+    user.registration_source = "email"
+    appstruct = schema.dictify(user)
+
+    before = run(lambda: _dictify_dynamic(schema, user))
+    after = run(lambda: schema.dictify(user))
+    print("dictify() before:   {:.0f} objects/sec".format(before))
+    print("dictify() after:    {:.0f} objects/sec".format(after))
+    print("Speed up:           {:.2f}x".format(after / before))
+
+    before = run(lambda: _objectify_dynamic(schema, appstruct, User()))
+    after = run(lambda: schema.objectify(appstruct, User()))
+    print("objectify() before: {:.0f} objects/sec".format(before))
+    print("objectify() after:  {:.0f} objects/sec".format(after))
+    print("Speed up:           {:.2f}x".format(after / before))
+
+
+if __name__ == "__main__":
+    main()
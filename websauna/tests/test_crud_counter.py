@@ -0,0 +1,96 @@
+"""Row count strategies of CRUD listings."""
+import time
+
+import pytest
+import sqlalchemy as sa
+from pyramid.testing import DummyRequest
+from sqlalchemy import engine_from_config
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import relationship
+from sqlalchemy.orm import sessionmaker
+
+from websauna.system.crud import counter
+
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "counter_test_item"
+    id = sa.Column(sa.Integer, primary_key=True)
+    parent_id = sa.Column(sa.Integer)
+    parent = relationship("Parent", primaryjoin="foreign(Item.parent_id) == Parent.id")
+
+
+class Parent(Base):
+    __tablename__ = "counter_test_parent"
+    id = sa.Column(sa.Integer, primary_key=True)
+
+
+@pytest.fixture
+def session(ini_settings):
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Item(id=i, parent_id=i % 3) for i in range(1, 11)])
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def count_request(registry):
+    request = DummyRequest()
+    request.registry = registry
+    return request
+
+
+def test_is_unfiltered():
+    """Only plain listings of one table read the table estimate."""
+    estimated = counter.EstimatedCount()
+    assert estimated.is_unfiltered(Query(Item))
+    assert not estimated.is_unfiltered(Query(Item).filter(Item.id > 1))
+    assert not estimated.is_unfiltered(Query(Item).join(Parent, Parent.id == Item.parent_id))
+    assert not estimated.is_unfiltered(Query(Item).select_from(Parent))
+
+    # Eager loading does not filter rows
+    assert estimated.is_unfiltered(Query(Item).options(joinedload(Item.parent)))
+    assert not estimated.is_unfiltered(Query(Item).options(joinedload(Item.parent)).filter(Item.id > 1))
+
+
+def test_exact_count(session, count_request):
+    assert counter.ExactCount().count(count_request, session.query(Item).filter(Item.id > 5)) == 5
+
+
+def test_estimate_exact_fallback(session, count_request):
+    """Estimates below the threshold are replaced by exact counts."""
+    query = session.query(Item).filter(Item.parent_id == 1)
+    assert counter.EstimatedCount(exact_threshold=1000).count(count_request, query) == 4
+
+    estimated = counter.EstimatedCount(exact_threshold=0)
+    assert estimated.count(count_request, query) == estimated.get_plan_estimate(query)
+
+    session.execute("ANALYZE counter_test_item")
+    assert estimated.count(count_request, session.query(Item)) == 10
+
+
+def test_cached_count_expiry(session, count_request):
+    """Cached count is served until it expires."""
+    cached = counter.CachedCount(ttl=1)
+    query = session.query(Item)
+
+    from websauna.system.core.redis import get_redis
+    get_redis(count_request.registry).delete(cached.get_cache_key(query))
+
+    assert cached.count(count_request, query) == 10
+
+    session.add(Item(id=11, parent_id=0))
+    session.commit()
+    assert cached.count(count_request, query) == 10
+
+    time.sleep(1.5)
+    assert cached.count(count_request, query) == 11
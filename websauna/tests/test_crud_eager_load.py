@@ -0,0 +1,87 @@
+"""Listing columns load their relationships with a constant number of queries."""
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import engine_from_config
+from sqlalchemy import event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+from sqlalchemy.orm import sessionmaker
+
+from websauna.system.crud import listing
+
+
+Base = declarative_base()
+
+
+class Owner(Base):
+    __tablename__ = "eager_test_owner"
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(32))
+
+
+class Item(Base):
+    __tablename__ = "eager_test_item"
+    id = sa.Column(sa.Integer, primary_key=True)
+    owner_id = sa.Column(sa.ForeignKey("eager_test_owner.id"))
+    owner = relationship(Owner)
+    tags = relationship("Tag")
+
+
+class Tag(Base):
+    __tablename__ = "eager_test_tag"
+    id = sa.Column(sa.Integer, primary_key=True)
+    item_id = sa.Column(sa.ForeignKey("eager_test_item.id"))
+    name = sa.Column(sa.String(32))
+
+
+@pytest.fixture
+def session(ini_settings):
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+def count_listing_statements(session, table, rows) -> int:
+    """Insert rows, then count statements of a listing reading every column of every row."""
+    for i in range(rows):
+        owner = Owner(name="owner {}".format(i))
+        session.add(Item(owner=owner, tags=[Tag(name="a"), Tag(name="b")]))
+    session.commit()
+    session.expunge_all()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        query = session.query(Item).options(*table.get_load_options(Item, required=["id"]))
+        for item in query:
+            for column in table.get_columns():
+                column.get_value(None, item)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        session.rollback()
+
+    return len(statements)
+
+
+def test_relationship_columns_constant_queries(session):
+    """Statement count does not grow with the number of rows."""
+    table = listing.Table(columns=[
+        listing.Column("id", "Id"),
+        listing.Column("owner", "Owner", getter=lambda view, column, item: item.owner.name, load=["owner"]),
+        listing.Column("tags", "Tags", getter=lambda view, column, item: ", ".join(tag.name for tag in item.tags), load=["tags"]),
+    ])
+
+    few = count_listing_statements(session, table, 2)
+    many = count_listing_statements(session, table, 20)
+
+    assert few == many
+    assert many <= 2
@@ -0,0 +1,72 @@
+"""Listing column filters and sort index checks."""
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Query
+
+from websauna.system.crud import filters
+from websauna.system.crud import listing
+
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "filter_test_item"
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(256), index=True)
+    score = sa.Column(sa.Integer)
+
+
+class DummyRequest:
+
+    def __init__(self, **params):
+        self.params = params
+
+
+def compile_query(query: Query) -> str:
+    return str(query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_escape_like():
+    assert filters.escape_like("50%_off\\") == "50\\%\\_off\\\\"
+
+
+def test_prefix_filter():
+    """Prefix filter is a case insensitive LIKE with the user input escaped."""
+    column = listing.Column("name", "Name", filter=filters.PrefixFilter())
+    query = column.filter.apply(Query(Item), Item, column, DummyRequest(filter_name="a%"))
+    sql = compile_query(query)
+    assert "ILIKE" in sql
+    assert "ESCAPE" in sql
+
+
+def test_range_filter():
+    """Range filter converts values to the column type and leaves open ends out."""
+    column = listing.Column("score", "Score", filter=filters.RangeFilter())
+
+    query = column.filter.apply(Query(Item), Item, column, DummyRequest(filter_score_min="5"))
+    sql = compile_query(query)
+    assert "filter_test_item.score >= 5" in sql
+    assert "<=" not in sql
+
+    with pytest.raises(filters.InvalidFilterValue):
+        column.filter.apply(Query(Item), Item, column, DummyRequest(filter_score_max="many"))
+
+
+def test_inactive_filter():
+    column = listing.Column("name", "Name", filter=filters.EqualFilter())
+    request = DummyRequest(filter_name="  ")
+    assert not column.filter.is_active(request, column)
+    assert compile_query(column.filter.apply(Query(Item), Item, column, request)) == compile_query(Query(Item))
+
+
+def test_unindexed_sort_columns():
+    """Sortable columns without an index are reported."""
+    table = listing.Table(columns=[
+        listing.Column("id", "Id", sortable=True),
+        listing.Column("name", "Name", sortable=True),
+        listing.Column("score", "Score", sortable=True),
+    ])
+    assert [c.id for c in table.get_unindexed_sort_columns(Item)] == ["score"]
@@ -0,0 +1,118 @@
+"""Listing search SQL generation."""
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import engine_from_config
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import sessionmaker
+
+from websauna.system.crud import search
+from websauna.utils.jsonb import JSONBProperty
+
+
+Base = declarative_base()
+
+
+class Person(Base):
+    __tablename__ = "search_test_person"
+    id = sa.Column(sa.Integer, primary_key=True)
+    email = sa.Column(sa.String(256))
+    data = sa.Column(postgresql.JSONB, default=dict)
+    nickname = JSONBProperty("data", "/profile/nickname")
+
+
+def compile_expression(expression) -> str:
+    return str(expression.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_prefix_tsquery():
+    """User input is turned to prefix matches of all words without tsquery operators."""
+    assert search.to_prefix_tsquery("mikko  ohto") == "mikko:* & ohto:*"
+    assert search.to_prefix_tsquery("a & !b | (c") == "a:* & b:* & c:*"
+    assert search.to_prefix_tsquery(" !& ") == ""
+
+
+def test_jsonb_search_expression():
+    """JSONB paths and JSONBProperty names resolve to text extraction."""
+    sql = compile_expression(search.get_search_expression(Person, "data/full_name"))
+    assert "->>" in sql
+    assert "full_name" in sql
+
+    sql = compile_expression(search.get_search_expression(Person, "nickname"))
+    assert "#>>" in sql
+    assert "nickname" in sql
+
+
+def test_full_text_search():
+    """Full text search matches against a tsvector built of all search columns."""
+    query = search.FullTextSearch().search(Query(Person), Person, ["email", "data/full_name"], "mikko")
+    sql = compile_expression(query.statement)
+    assert "to_tsvector('simple'::regconfig" in sql
+    assert "to_tsquery('simple'::regconfig, 'mikko:*')" in sql
+
+
+def test_empty_full_text_search():
+    query = Query(Person)
+    assert search.FullTextSearch().search(query, Person, ["email"], "&!") is query
+
+
+def test_email_full_text_search():
+    """Emails are matched as substrings, as the text search parser keeps them as one token."""
+    query = search.FullTextSearch().search(Query(Person), Person, ["email", "data/full_name"], "mikko@example.com")
+    sql = compile_expression(query.statement)
+    assert "to_tsquery" not in sql
+    assert "ILIKE '%mikko@example.com%'" in sql
+
+
+@pytest.fixture
+def search_session(ini_settings):
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    Base.metadata.drop_all(engine, tables=[Person.__table__])
+    Base.metadata.create_all(engine, tables=[Person.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Person(email="mikko@example.com", data={"full_name": "Mikko Ohtamaa"}),
+        Person(email="mikko.other@example.com", data={"full_name": "Mikko Other"}),
+        Person(email="someone@example.org", data={"full_name": "Someone Else"}),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine, tables=[Person.__table__])
+
+
+def test_full_text_search_database(search_session):
+    """Words and full emails find the matching rows."""
+    strategy = search.FullTextSearch()
+
+    def find(term):
+        query = strategy.search(search_session.query(Person), Person, ["email", "data/full_name"], term)
+        return sorted(person.email for person in query)
+
+    assert find("mikko") == ["mikko.other@example.com", "mikko@example.com"]
+    assert find("mikko ohta") == ["mikko@example.com"]
+    assert find("mikko@example.com") == ["mikko@example.com"]
+    assert find("MIKKO.OTHER@EXAMPLE.COM") == ["mikko.other@example.com"]
+    assert find("example.org") == ["someone@example.org"]
+
+
+def test_admin_search_without_columns():
+    """Admin search of a model without text columns finds nothing instead of failing."""
+    from websauna.system.admin.views import Search
+
+    class Counter(Base):
+        __tablename__ = "search_test_counter"
+        id = sa.Column(sa.Integer, primary_key=True)
+        value = sa.Column(sa.Integer)
+
+    class DummyModelAdmin:
+        search_columns = []
+
+        def get_model(self):
+            return Counter
+
+        def get_query(self):
+            raise AssertionError("Query must not be run")
+
+    assert Search(DummyModelAdmin(), None).search("foo") == []
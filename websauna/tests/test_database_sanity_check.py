@@ -178,4 +178,48 @@ def test_sanity_pass_declarative(ini_settings, dbsession):
     try:
         assert is_sane_database(Base, session) is True
     finally:
-        Base.metadata.drop_all(engine)
\ No newline at end of file
+        Base.metadata.drop_all(engine)
+
+def test_sanity_marker(ini_settings, dbsession):
+    """Passed check is remembered until the declared models change."""
+
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    Session = sessionmaker(bind=engine)
+    session = Session()
+
+    class DummyRedis:
+
+        def __init__(self):
+            self.data = {}
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def setex(self, key, seconds, value):
+            self.data[key] = value
+
+    redis = DummyRedis()
+
+    Base, SaneTestModel = gen_test_model()
+    try:
+        Base.metadata.drop_all(engine, tables=[SaneTestModel.__table__])
+    except sqlalchemy.exc.NoSuchTableError:
+        pass
+
+    Base.metadata.create_all(engine, tables=[SaneTestModel.__table__])
+
+    try:
+        assert is_sane_database(Base, session, redis, 60) is True
+        assert len(redis.data) == 1
+
+        # Marker is found, no new marker is written
+        assert is_sane_database(Base, session, redis, 60) is True
+        assert len(redis.data) == 1
+
+        # Different models do not match the marker
+        Base2, RelationTestModel, RelationTestModel2 = gen_relation_models()
+        assert is_sane_database(Base2, session, redis, 60) is False
+        assert len(redis.data) == 1
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
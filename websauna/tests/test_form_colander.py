@@ -0,0 +1,138 @@
+"""Compiled dictify() and objectify() plans of PropertyAwareSQLAlchemySchemaNode."""
+import colander
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm import relationship
+
+from websauna.system.form.colander import PropertyAwareSQLAlchemySchemaNode
+from websauna.system.form.colander import TypeOverridesHandling
+from websauna.tests.benchmark_schema import _dictify_dynamic
+from websauna.tests.benchmark_schema import _objectify_dynamic
+from websauna.utils.jsonb import JSONBProperty
+
+
+Base = declarative_base()
+
+
+class Child(Base):
+    __tablename__ = "colander_test_child"
+    id = sa.Column(sa.Integer, primary_key=True)
+    parent_id = sa.Column(sa.Integer, sa.ForeignKey("colander_test_parent.id"))
+    name = sa.Column(sa.String(32))
+
+
+class Parent(Base):
+    __tablename__ = "colander_test_parent"
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String(32))
+    count = sa.Column(sa.Integer)
+    data = sa.Column(postgresql.JSONB, default=dict)
+    nickname = JSONBProperty("data", "/nickname", graceful=None)
+    favourite_id = sa.Column(sa.Integer, sa.ForeignKey("colander_test_child.id"))
+    children = relationship(Child, foreign_keys=[Child.parent_id])
+    favourite = relationship(Child, foreign_keys=[favourite_id], post_update=True)
+
+
+def map_column(node, name, column, column_type):
+    if isinstance(column_type, postgresql.JSONB):
+        return TypeOverridesHandling.drop, {}
+    return TypeOverridesHandling.unknown, {}
+
+
+def create_schema() -> PropertyAwareSQLAlchemySchemaNode:
+    configure_mappers()
+    includes = [
+        "id",
+        "name",
+        "count",
+        colander.SchemaNode(colander.String(), name="nickname", missing=colander.null),
+        "children",
+        "favourite",
+        colander.SchemaNode(colander.String(), name="not_on_model", missing=colander.null),
+    ]
+    return PropertyAwareSQLAlchemySchemaNode(Parent, includes=includes, type_overrides=map_column, nested=True)
+
+
+def create_parent() -> Parent:
+    parent = Parent(id=1, name="parent", count=None, data={"nickname": "nick"})
+    parent.children = [Child(id=2, name="first"), Child(id=3, name=None)]
+    parent.favourite = parent.children[0]
+    return parent
+
+
+def get_values(parent: Parent) -> dict:
+    return {
+        "id": parent.id,
+        "name": parent.name,
+        "count": parent.count,
+        "nickname": parent.nickname,
+        "children": [(child.id, child.name) for child in parent.children],
+        "favourite": (parent.favourite.id, parent.favourite.name) if parent.favourite else None,
+    }
+
+
+def test_dictify_matches_dynamic():
+    """Compiled dictify() gives the same appstruct for columns, JSONB properties and relationships."""
+    schema = create_schema()
+    parent = create_parent()
+
+    expected = _dictify_dynamic(schema, parent)
+    assert schema.dictify(parent) == expected
+    assert expected["nickname"] == "nick"
+    assert expected["name"] == "parent"
+    assert expected["count"] is colander.null
+    assert expected["favourite"]["name"] == "first"
+    assert expected["children"][1]["name"] is colander.null
+    assert "not_on_model" not in expected
+
+    # Plan is reused, and values are still read from the object
+    parent.name = "changed"
+    parent.favourite = None
+    expected = _dictify_dynamic(schema, parent)
+    assert schema.dictify(parent) == expected
+    assert expected["name"] == "changed"
+
+
+def test_objectify_matches_dynamic():
+    """Compiled objectify() sets the same values as the dynamic implementation."""
+    schema = create_schema()
+    appstruct = {
+        "id": 1,
+        "name": "parent",
+        "count": colander.null,
+        "nickname": "nick",
+        "children": [{"id": 2, "name": "first"}, {"id": 3, "name": colander.null}],
+        "favourite": {"id": 4, "name": "favourite"},
+        "not_on_model": "ignored",
+    }
+
+    expected = _objectify_dynamic(schema, appstruct, Parent(data={}))
+    actual = schema.objectify(appstruct, Parent(data={}))
+    assert get_values(actual) == get_values(expected)
+    assert get_values(actual) == {
+        "id": 1,
+        "name": "parent",
+        "count": None,
+        "nickname": "nick",
+        "children": [(2, "first"), (3, None)],
+        "favourite": (4, "favourite"),
+    }
+    assert not hasattr(actual, "not_on_model")
+
+
+def test_plans_follow_schema_changes():
+    """Adding or removing nodes after the first call recompiles the plans."""
+    schema = create_schema()
+    parent = create_parent()
+    schema.dictify(parent)
+
+    del schema["children"]
+    assert "children" not in schema.dictify(parent)
+    assert schema.dictify(parent) == _dictify_dynamic(schema, parent)
+
+    clone = schema.clone()
+    clone.add(colander.SchemaNode(colander.Integer(), name="favourite_id", missing=colander.null))
+    assert clone.dictify(parent) == _dictify_dynamic(clone, parent)
+    assert "favourite_id" not in schema.dictify(parent)
@@ -0,0 +1,62 @@
+"""Reusing generated form schemas across requests."""
+import colander
+
+from websauna.system.crud.formgenerator import SQLAlchemyFormGenerator
+from websauna.system.form.editmode import EditMode
+from websauna.system.form.fieldmapper import DefaultSQLAlchemyFieldMapper
+
+
+class CountingFieldMapper(DefaultSQLAlchemyFieldMapper):
+    """Map a fixed schema and count how many times mapping is done."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def map(self, mode, request, context, model, includes, nested=None):
+        self.calls += 1
+        schema = colander.Schema()
+        schema.add(colander.SchemaNode(colander.String(), name="name", title="Name"))
+        return schema
+
+
+class CacheableFieldMapper(CountingFieldMapper):
+
+    cacheable = True
+
+
+class Model:
+    pass
+
+
+def test_cached_schemas_are_independent():
+    """Each generation gets its own clone of the cached schema."""
+    mapper = CacheableFieldMapper()
+    generator = SQLAlchemyFormGenerator(field_mapper=mapper)
+
+    first = generator.generate_schema(None, None, EditMode.edit, Model)
+    second = generator.generate_schema(None, None, EditMode.edit, Model)
+    assert mapper.calls == 1
+    assert first is not second
+
+    first["name"].title = "Changed"
+    first.add(colander.SchemaNode(colander.String(), name="extra"))
+    assert second["name"].title == "Name"
+    assert [node.name for node in second.children] == ["name"]
+
+    third = generator.generate_schema(None, None, EditMode.edit, Model)
+    assert third["name"].title == "Name"
+    assert [node.name for node in third.children] == ["name"]
+
+    # Modes are cached separately
+    generator.generate_schema(None, None, EditMode.add, Model)
+    assert mapper.calls == 2
+
+
+def test_subclass_not_cached_unless_opted_in():
+    """Subclasses of a cacheable field mapper map the schema for every form."""
+    mapper = CountingFieldMapper()
+    generator = SQLAlchemyFormGenerator(field_mapper=mapper)
+
+    generator.generate_schema(None, None, EditMode.edit, Model)
+    generator.generate_schema(None, None, EditMode.edit, Model)
+    assert mapper.calls == 2
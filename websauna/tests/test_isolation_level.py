@@ -0,0 +1,169 @@
+"""Transaction isolation level per request and per view."""
+import pytest
+from pyramid.exceptions import ConfigurationError
+from pyramid.interfaces import IRoutesMapper
+from pyramid.request import Request
+from pyramid.testing import DummyRequest
+from pyramid.registry import Registry
+from pyramid.urldispatch import RoutesMapper
+from sqlalchemy import engine_from_config
+from sqlalchemy.orm import sessionmaker
+
+from websauna.system.model import isolation
+
+
+class DummyRoute:
+
+    def __init__(self, name):
+        self.name = name
+
+
+def create_request(method, settings, route_name=None, route_levels=None):
+    registry = Registry()
+    registry.settings = settings
+    registry.route_isolation_levels = route_levels or {}
+    request = DummyRequest(method=method)
+    request.registry = registry
+    if route_name:
+        request.matched_route = DummyRoute(route_name)
+    return request
+
+
+def test_request_isolation_level():
+    """Read-only requests use the read isolation level, marked routes their own level."""
+    settings = {"websauna.db.read_isolation_level": "repeatable read"}
+
+    assert isolation.get_request_isolation_level(create_request("GET", settings)) == "REPEATABLE READ"
+    assert isolation.get_request_isolation_level(create_request("POST", settings)) == "SERIALIZABLE"
+    assert isolation.get_request_isolation_level(create_request("POST", {})) == "SERIALIZABLE"
+
+    request = create_request("GET", settings, "report", {"report": "READ COMMITTED"})
+    assert isolation.get_request_isolation_level(request) == "READ COMMITTED"
+
+
+def test_view_isolation_level_inherited():
+    """Isolation level marker of a view method is inherited by overriding subclasses."""
+
+    class BaseView:
+
+        @isolation.isolation_level("read committed")
+        def report(self):
+            pass
+
+    class View(BaseView):
+
+        def report(self):
+            pass
+
+    assert isolation.get_view_isolation_level(View, "report") == "READ COMMITTED"
+    assert isolation.get_view_isolation_level(View, "other") is None
+
+
+def test_retry_stats():
+    isolation.reset_retry_stats()
+    isolation.record_attempt("transfer", 1)
+    isolation.record_attempt("transfer", 2)
+    assert isolation.get_retry_stats() == {"transfer": {"attempts": 2, "retries": 1}}
+    isolation.reset_retry_stats()
+
+
+class DummyViewInfo:
+
+    def __init__(self, registry, view, route_name=None, attr=None):
+        self.registry = registry
+        self.original_view = view
+        self.options = {"route_name": route_name, "attr": attr}
+
+
+def create_registry() -> Registry:
+    registry = Registry()
+    registry.route_isolation_levels = {}
+    registry.route_isolation_views = {}
+    return registry
+
+
+@isolation.isolation_level("read committed")
+def report(context, request):
+    pass
+
+
+@isolation.isolation_level("read committed")
+def report_form(context, request):
+    pass
+
+
+def other(context, request):
+    pass
+
+
+def test_route_level():
+    """Views of a route share their isolation level."""
+    registry = create_registry()
+
+    isolation.isolation_view_deriver(report, DummyViewInfo(registry, report, "report"))
+    isolation.isolation_view_deriver(report_form, DummyViewInfo(registry, report_form, "report"))
+    isolation.isolation_view_deriver(other, DummyViewInfo(registry, other, "home"))
+    isolation.isolation_view_deriver(other, DummyViewInfo(registry, other, "admin"))
+    isolation.isolation_view_deriver(other, DummyViewInfo(registry, other, "admin", attr="listing"))
+    assert registry.route_isolation_levels == {"report": "READ COMMITTED"}
+
+
+def test_route_level_conflict():
+    """Views which cannot get their isolation level before the first query fail at configuration time."""
+    registry = create_registry()
+
+    # Traversal views sharing the route
+    isolation.isolation_view_deriver(other, DummyViewInfo(registry, other, "admin"))
+    with pytest.raises(ConfigurationError):
+        isolation.isolation_view_deriver(report, DummyViewInfo(registry, report, "admin"))
+
+    # Unmarked view registered after a marked one
+    isolation.isolation_view_deriver(report, DummyViewInfo(registry, report, "shared"))
+    with pytest.raises(ConfigurationError):
+        isolation.isolation_view_deriver(other, DummyViewInfo(registry, other, "shared"))
+
+    # No route at all
+    with pytest.raises(ConfigurationError):
+        isolation.isolation_view_deriver(report, DummyViewInfo(registry, report))
+
+
+def test_request_isolation_level_before_routing():
+    """Session created by a tween before routing gets the level of the route."""
+    settings = {"websauna.db.read_isolation_level": "repeatable read"}
+    registry = create_registry()
+    registry.settings = settings
+    registry.route_isolation_levels["report"] = "READ COMMITTED"
+
+    mapper = RoutesMapper()
+    mapper.connect("report", "/report")
+    registry.registerUtility(mapper, IRoutesMapper)
+
+    request = Request.blank("/report")
+    request.registry = registry
+    assert isolation.get_request_isolation_level(request) == "READ COMMITTED"
+
+    request = Request.blank("/other")
+    request.registry = registry
+    assert isolation.get_request_isolation_level(request) == "REPEATABLE READ"
+
+
+def test_set_transaction_isolation(ini_settings):
+    """Requested isolation level is applied with SET TRANSACTION when the transaction begins."""
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    dbmaker = sessionmaker(bind=engine)
+    isolation.listen_isolation_events(dbmaker)
+    session = dbmaker()
+    try:
+        session.info[isolation.INFO_LEVEL] = "REPEATABLE READ"
+        assert session.execute("SHOW transaction_isolation").scalar() == "repeatable read"
+
+        # Cannot be changed within the running transaction
+        isolation.set_isolation_level(session, "READ COMMITTED")
+        assert session.execute("SHOW transaction_isolation").scalar() == "repeatable read"
+        session.rollback()
+
+        isolation.set_isolation_level(session, "READ COMMITTED")
+        assert session.execute("SHOW transaction_isolation").scalar() == "read committed"
+        session.rollback()
+    finally:
+        session.close()
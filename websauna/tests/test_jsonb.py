@@ -229,4 +229,53 @@ class TestJSON(unittest.TestCase):
         with transaction.manager:
             model = self.session.query(DefautDataTestModel).get(1)
             assert model
-            assert model.default_value_2 == 2
\ No newline at end of file
+            assert model.default_value_2 == 2
+
+    def test_write_copies_path_only(self):
+        """Writes before flush share one copy of the document and do not touch the loaded value."""
+
+        with transaction.manager:
+            model = TestModel()
+            model.data = {"nested_dict": {}, "large": {"items": list(range(100))}}
+            self.session.add(model)
+
+        with transaction.manager:
+            model = self.session.query(TestModel).get(1)
+            loaded = model.data
+
+            model.flat_property = 1
+            data = model.data
+            model.nested_property = 2
+
+            assert model.data is data
+            assert data is not loaded
+            assert data["large"] is loaded["large"]
+            assert loaded == {"nested_dict": {}, "large": {"items": list(range(100))}}
+
+            self.session.flush()
+
+            # After flush the written document is the loaded value and is copied again
+            model.flat_property = 3
+            assert model.data is not data
+            assert data["flat_property"] == 1
+
+        with transaction.manager:
+            model = self.session.query(TestModel).get(1)
+            assert model.flat_property == 3
+            assert model.nested_property == 2
+
+
+def test_property_sql_expression():
+    """JSONBProperty on a model class renders text extraction for queries."""
+    from sqlalchemy.dialects import postgresql
+
+    def compile_sql(expression):
+        return str(expression.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    sql = compile_sql(TestModel.flat_property == "foo")
+    assert "test_model.data ->> 'flat_property'" in sql
+    assert sql.endswith("= 'foo'")
+
+    sql = compile_sql(TestModel.nested_property == "foo")
+    assert "#>>" in sql
+    assert "nested_property" in sql
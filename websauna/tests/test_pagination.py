@@ -23,3 +23,158 @@ def xxx_test_crud_zero_items(web_server, browser, dbsession, init):
 
     crud = prepare_crud()
 
+
+
+def test_batch_slice(http_request):
+    """Batch only takes items of the current page."""
+    from websauna.system.crud.paginator import Batch
+
+    http_request.params["batch_num"] = "1"
+    batch = Batch(list(range(25)), http_request, default_size=10, seqlen=25)
+    assert list(batch) == list(range(10, 20))
+    assert batch.prev_url
+    assert batch.next_url
+
+
+def test_batch_approximate_count(http_request):
+    """Approximate counts do not cut or pad the pages."""
+    from websauna.system.crud.paginator import Batch
+
+    # Estimate too low, real rows continue past it
+    http_request.params["batch_num"] = "1"
+    batch = Batch(list(range(25)), http_request, default_size=10, seqlen=12, seqlen_approximate=True)
+    assert list(batch) == list(range(10, 20))
+    assert batch.next_url
+    assert not batch.last_url
+    assert batch.seqlen == 12
+
+    # Estimate too high, no empty pages after the real last page
+    http_request.params["batch_num"] = "2"
+    batch = Batch(list(range(25)), http_request, default_size=10, seqlen=1000, seqlen_approximate=True)
+    assert list(batch) == list(range(20, 25))
+    assert batch.enditem == 24
+    assert not batch.next_url
+    assert batch.prev_url
+
+
+def test_batch_max_size(http_request):
+    """User cannot ask for pages larger than the cap."""
+    from websauna.system.crud.paginator import Batch
+
+    http_request.params["batch_size"] = "100000"
+    batch = Batch(list(range(500)), http_request, default_size=10, seqlen=500, max_size=50)
+    assert batch.size == 50
+    assert len(batch) == 50
+
+
+def test_keyset_cursor_roundtrip():
+    """Cursor tokens survive URL encoding and decode back to key values."""
+    import datetime
+    from websauna.system.crud.paginator import encode_cursor, decode_cursor
+
+    dt = datetime.datetime(2016, 1, 1, tzinfo=datetime.timezone.utc)
+    token = encode_cursor([dt, 5])
+    assert "=" not in token
+    assert decode_cursor(token) == [str(dt), 5]
+
+
+def test_keyset_cursor_tampered():
+    """Garbage cursors are rejected."""
+    import pytest
+    from websauna.system.crud.paginator import decode_cursor, InvalidCursor
+
+    with pytest.raises(InvalidCursor):
+        decode_cursor("!!!")
+
+
+def test_keyset_cursor_extra_values(http_request):
+    """Cursor with more values than keys is rejected before any values are dropped."""
+    import pytest
+    import sqlalchemy as sa
+    from sqlalchemy.orm import Query
+    from websauna.system.crud.paginator import KeysetBatch, InvalidCursor, encode_cursor
+
+    table = sa.Table("keyset_cursor_test", sa.MetaData(), sa.Column("id", sa.Integer, primary_key=True))
+    http_request.params["batch_after"] = encode_cursor([1, 2])
+
+    with pytest.raises(InvalidCursor):
+        KeysetBatch(Query(table), http_request, keys=[table.c.id])
+
+
+def test_keyset_walk_all_pages(ini_settings):
+    """Walking pages forwards and backwards visits every row once, also with NULLs in a sort key and with SQL expression keys."""
+    from pyramid.testing import DummyRequest
+    import sqlalchemy as sa
+    from sqlalchemy import engine_from_config
+    from sqlalchemy import func
+    from sqlalchemy.dialects.postgresql import JSONB
+    from sqlalchemy.ext.declarative import declarative_base
+    from sqlalchemy.orm import sessionmaker
+    from websauna.system.crud.paginator import KeysetBatch
+
+    Base = declarative_base()
+
+    class Item(Base):
+        __tablename__ = "keyset_walk_test"
+        id = sa.Column(sa.Integer, primary_key=True)
+        name = sa.Column(sa.String(32), nullable=True)
+        data = sa.Column(JSONB, default=dict)
+
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+
+    try:
+        names = ["b", None, "a", "c", None, "a", "b", None, "c", "a", None]
+        session.add_all([Item(id=i + 1, name=name, data={"name": name} if name else {}) for i, name in enumerate(names)])
+        session.commit()
+
+        def walk(keys, descending):
+            params = {"batch_size": "3"}
+            seen = []
+            pages = []
+            while True:
+                request = DummyRequest(params=params)
+                batch = KeysetBatch(session.query(Item), request, keys=keys, url="http://localhost/", descending=descending)
+                pages.append([item.id for item in batch])
+                seen += pages[-1]
+                if not batch.next_url:
+                    break
+                params = {"batch_size": "3", "batch_after": dict(_parse_qsl(batch.next_url))["batch_after"]}
+
+            # Walk back from the last page
+            params = {"batch_size": "3", "batch_last": "1"}
+            back = []
+            while True:
+                request = DummyRequest(params=params)
+                batch = KeysetBatch(session.query(Item), request, keys=keys, url="http://localhost/", descending=descending)
+                back = [item.id for item in batch] + back
+                if not batch.prev_url:
+                    break
+                params = {"batch_size": "3", "batch_before": dict(_parse_qsl(batch.prev_url))["batch_before"]}
+
+            return seen, back
+
+        for descending in (False, True):
+            seen, back = walk([Item.name, Item.id], descending)
+            assert sorted(seen) == list(range(1, len(names) + 1))
+            assert back == seen
+
+            # Keys which are not mapped columns
+            for expression in (Item.data["name"].astext, func.upper(Item.name)):
+                seen, back = walk([expression, Item.id], descending)
+                assert sorted(seen) == list(range(1, len(names) + 1))
+                assert back == seen
+
+            seen, back = walk([Item.id], descending)
+            assert seen == sorted(seen, reverse=descending)
+            assert back == seen
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+def _parse_qsl(url):
+    from urllib.parse import urlsplit, parse_qsl
+    return parse_qsl(urlsplit(url).query)
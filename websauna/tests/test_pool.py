@@ -0,0 +1,57 @@
+"""Database connection pool configuration and metrics."""
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
+
+from websauna.system.model import pool
+
+
+def test_pool_options():
+    options = pool.get_pool_options({"websauna.db.pool_size": "20", "websauna.db.pool_pre_ping": "true", "websauna.db.pool_recycle": "3600"})
+    assert options == {"poolclass": QueuePool, "pool_size": 20, "pool_pre_ping": True, "pool_recycle": 3600}
+
+    # Null pool does not take queue sizing options
+    options = pool.get_pool_options({"websauna.db.pool_class": "null", "websauna.db.pool_size": "20"})
+    assert options == {"poolclass": NullPool}
+
+    with pytest.raises(RuntimeError):
+        pool.get_pool_options({"websauna.db.pool_class": "foo"})
+
+
+def test_pool_stats():
+    """Checked out connections are counted."""
+    engine = sa.create_engine("sqlite://", poolclass=NullPool)
+    pool.configure_pool_stats(engine, {})
+
+    conn = engine.connect()
+    assert pool.get_pool_stats(engine)["checked_out"] == 1
+    conn.close()
+
+    stats = pool.get_pool_stats(engine)
+    assert stats["checked_out"] == 0
+    assert stats["max_checked_out"] == 1
+    assert stats["checkouts"] == 1
+    assert stats["connects"] == 1
+    assert stats["exhausted"] == 0
+
+
+def test_pool_exhausted(tmpdir):
+    """Checking out the last free connection is counted as exhaustion, also after the engine is disposed."""
+    settings = {"websauna.db.pool_size": "1", "websauna.db.pool_max_overflow": "0"}
+    engine = sa.create_engine("sqlite:///{}".format(tmpdir.join("pool.sqlite")), **pool.get_pool_options(settings))
+    pool.configure_pool_stats(engine, settings)
+
+    conn = engine.connect()
+    assert pool.get_pool_stats(engine)["exhausted"] == 1
+    conn.close()
+
+    engine.dispose()
+    conn = engine.connect()
+    conn.close()
+
+    stats = pool.get_pool_stats(engine)
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 2
+    assert stats["exhausted"] == 2
+    assert stats["size"] == 1
@@ -0,0 +1,74 @@
+"""Cross-request principal cache."""
+from websauna.system.auth import principalcache
+from websauna.system.auth.interfaces import IPrincipalCache
+from websauna.system.user.events import UserGroupsChanged
+
+
+STATE = {"principals": ["group:admin"], "enabled": True, "activated": True, "last_auth_sensitive_operation_at": None}
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def test_memory_ttl_expiry(monkeypatch):
+    """Expired entries are not returned and are dropped from memory."""
+    clock = Clock()
+    monkeypatch.setattr(principalcache, "time", clock)
+
+    cache = principalcache.MemoryPrincipalCache(ttl=60)
+    cache.set(1, STATE)
+
+    clock.now += 59
+    assert cache.get(1) == STATE
+
+    clock.now += 2
+    assert cache.get(1) is None
+    assert len(cache.data) == 0
+
+
+def test_memory_max_size(monkeypatch):
+    """Full cache drops expired entries first, then the oldest ones."""
+    clock = Clock()
+    monkeypatch.setattr(principalcache, "time", clock)
+
+    cache = principalcache.MemoryPrincipalCache(ttl=60, max_size=3)
+    cache.set(1, STATE)
+    clock.now += 30
+    cache.set(2, STATE)
+    cache.set(3, STATE)
+
+    # Entry 1 has expired and makes room
+    clock.now += 31
+    cache.set(4, STATE)
+    assert set(cache.data.keys()) == {"2", "3", "4"}
+
+    # Nothing expired, oldest goes
+    cache.set(5, STATE)
+    assert set(cache.data.keys()) == {"3", "4", "5"}
+
+
+def test_invalidate_on_groups_changed(pyramid_request):
+    """Changing user groups drops the cached principals of the user."""
+
+    class DummyUser:
+        id = 123
+
+    registry = pyramid_request.registry
+    cache = principalcache.MemoryPrincipalCache()
+    registry.registerUtility(cache, IPrincipalCache)
+    try:
+        cache.set(123, STATE)
+        cache.set(124, STATE)
+
+        registry.notify(UserGroupsChanged(pyramid_request, DummyUser()))
+
+        assert cache.get(123) is None
+        assert cache.get(124) == STATE
+    finally:
+        registry.unregisterUtility(cache, IPrincipalCache)
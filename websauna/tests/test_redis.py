@@ -0,0 +1,47 @@
+"""Redis client and connection pool caching."""
+from pyramid.registry import Registry
+
+from websauna.system.core.redis import get_redis
+from websauna.system.core.redis import get_redis_pool_stats
+
+
+def create_registry(**settings) -> Registry:
+    registry = Registry()
+    registry.settings = settings
+    return registry
+
+
+def test_client_reused_per_registry():
+    """The same registry gets the same client and pool, other registries their own."""
+    registry = create_registry(**{"redis.url": "redis://localhost:6379/14"})
+
+    redis = get_redis(registry)
+    assert get_redis(registry) is redis
+    assert get_redis(registry).connection_pool is redis.connection_pool
+
+    other = get_redis(create_registry(**{"redis.url": "redis://localhost:6379/14"}))
+    assert other is not redis
+
+    # Different URL gets a different pool
+    assert get_redis(registry, url="redis://localhost:6379/13").connection_pool is not redis.connection_pool
+
+
+def test_pool_settings():
+    """redis.* pool settings are passed to the connection pool."""
+    registry = create_registry(**{
+        "redis.url": "redis://localhost:6379/14",
+        "redis.max_connections": "7",
+        "redis.socket_timeout": "2.5",
+    })
+
+    redis = get_redis(registry)
+    pool = redis.connection_pool
+    assert pool.max_connections == 7
+    assert pool.connection_kwargs["socket_timeout"] == 2.5
+    assert pool.connection_kwargs["db"] == 14
+
+    redis.ping()
+
+    stats = get_redis_pool_stats(registry)
+    assert stats["redis://localhost:6379/14"]["max_connections"] == 7
+    assert stats["redis://localhost:6379/14"]["created"] == 1
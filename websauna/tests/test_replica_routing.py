@@ -0,0 +1,62 @@
+"""Read replica routing of database sessions."""
+import sqlalchemy as sa
+
+from websauna.system.model import routing
+
+
+metadata = sa.MetaData()
+
+item = sa.Table("routing_test_item", metadata, sa.Column("id", sa.Integer, primary_key=True))
+
+
+def create_session():
+    primary = sa.create_engine("sqlite://")
+    replica = sa.create_engine("sqlite://")
+    session = routing.RoutingSession(bind=primary, replica_engines=[replica])
+    return session, primary, replica
+
+
+def test_reads_go_to_replica():
+    """Plain selects go to the replica only when the session is in replica mode."""
+    session, primary, replica = create_session()
+    select = sa.select([item.c.id])
+
+    assert session.get_bind(clause=select) is primary
+
+    session.use_replica = True
+    assert session.get_bind(clause=select) is replica
+    assert session.get_bind(clause=select.with_for_update()) is primary
+    assert session.get_bind(clause=sa.text("SELECT 1")) is primary
+    assert not session.pinned
+
+
+def test_writes_pin_primary():
+    """After a write all statements go to the primary."""
+    session, primary, replica = create_session()
+    session.use_replica = True
+
+    assert session.get_bind(clause=item.update().values(id=1)) is primary
+    assert session.pinned
+    assert session.wrote
+    assert session.get_bind(clause=sa.select([item.c.id])) is primary
+
+
+def test_view_routing_inherited():
+    """Routing marker of a view method is inherited by overriding subclasses."""
+
+    class BaseView:
+
+        @routing.use_primary
+        def edit(self):
+            pass
+
+        def show(self):
+            pass
+
+    class View(BaseView):
+
+        def edit(self):
+            pass
+
+    assert routing.get_view_routing(View, "edit") == routing.PRIMARY
+    assert routing.get_view_routing(View, "show") is None
@@ -0,0 +1,38 @@
+"""Rolling time window limiter Lua scripts."""
+import time
+
+from websauna.system.core.redis import get_redis
+from websauna.system.form import rollingwindow
+
+
+KEY = "test_rollingwindow"
+
+
+def test_limit_enforced(registry):
+    """Hits over the limit within the window are limited."""
+    redis = get_redis(registry)
+    redis.delete(KEY)
+
+    assert rollingwindow.check(registry, KEY, window=60, limit=2) is False
+    assert rollingwindow.check(registry, KEY, window=60, limit=2) is False
+    assert rollingwindow.check(registry, KEY, window=60, limit=2) is True
+    assert rollingwindow.get(registry, KEY, window=60) == 3
+
+    # Key expires when idle
+    assert 0 < redis.ttl(KEY) <= 60
+    redis.delete(KEY)
+
+
+def test_window_expiry(registry):
+    """Hits older than the window are not counted."""
+    redis = get_redis(registry)
+    redis.delete(KEY)
+
+    assert rollingwindow.check(registry, KEY, window=1, limit=1) is False
+    assert rollingwindow.check(registry, KEY, window=1, limit=1) is True
+
+    time.sleep(1.2)
+
+    assert rollingwindow.get(registry, KEY, window=1) == 0
+    assert rollingwindow.check(registry, KEY, window=1, limit=1) is False
+    redis.delete(KEY)
@@ -0,0 +1,69 @@
+"""Sliding window counter limiter."""
+from websauna.system.core.redis import get_redis
+from websauna.system.form import slidingwindow
+
+
+KEY = "test_slidingwindow"
+
+
+def test_bucket_at_window_edge():
+    """A hit exactly at the window edge starts a new bucket with no time elapsed."""
+    current, previous, elapsed = slidingwindow._get_bucket_keys(KEY, 60, 120.0)
+    assert current == KEY + ":2"
+    assert previous == KEY + ":1"
+    assert elapsed == 0
+
+    current, previous, elapsed = slidingwindow._get_bucket_keys(KEY, 60, 119.999)
+    assert current == KEY + ":1"
+    assert round(elapsed, 3) == 59.999
+
+
+def test_previous_window_weight():
+    """Previous bucket is weighted by how much it still overlaps the sliding window."""
+    # At the edge the whole previous bucket counts
+    assert slidingwindow._estimate(b"0", b"10", 60, 0) == 10
+
+    # Half way through, half of it
+    assert slidingwindow._estimate(b"2", b"10", 60, 30) == 7
+
+    # Missing buckets count as zero
+    assert slidingwindow._estimate(None, None, 60, 10) == 0
+    assert slidingwindow._estimate(b"3", None, 60, 59) == 3
+
+
+def test_limit_across_window_edge(registry, monkeypatch):
+    """Hits of the previous window still limit requests right after the edge."""
+    redis = get_redis(registry)
+    for bucket in range(0, 4):
+        redis.delete("{}:{}".format(KEY, bucket))
+
+    now = [60.0]
+
+    class Clock:
+
+        @staticmethod
+        def time():
+            return now[0]
+
+    monkeypatch.setattr(slidingwindow, "time", Clock)
+
+    # Three hits in bucket 1
+    for i in range(3):
+        now[0] = 100.0 + i
+        assert slidingwindow.check(registry, KEY, window=60, limit=3) is False
+
+    # Exactly at the edge the previous bucket counts in full: 3 + 1 > 3
+    now[0] = 120.0
+    assert slidingwindow.check(registry, KEY, window=60, limit=3) is True
+
+    # Half a window later previous bucket weighs 1.5, plus two hits in the current bucket
+    now[0] = 150.0
+    assert slidingwindow.get(registry, KEY, window=60) == 2
+    assert slidingwindow.check(registry, KEY, window=60, limit=3) is True
+
+    # Two windows later everything has slid out
+    now[0] = 240.0
+    assert slidingwindow.get(registry, KEY, window=60) == 0
+
+    for bucket in range(0, 5):
+        redis.delete("{}:{}".format(KEY, bucket))
@@ -0,0 +1,54 @@
+"""Per-request SQL statistics."""
+import pytest
+import sqlalchemy as sa
+
+from websauna.system.model import sqlstats
+
+
+def test_fingerprint():
+    """Statements differing only by values have the same fingerprint."""
+    a = sqlstats.get_fingerprint("SELECT * FROM users WHERE id = 5 AND email = 'a@example.com'")
+    b = sqlstats.get_fingerprint("SELECT *  FROM users\nWHERE id = 12 AND email = 'it''s@example.com'")
+    assert a == b == "SELECT * FROM users WHERE id = ? AND email = ?"
+
+    a = sqlstats.get_fingerprint("SELECT * FROM users WHERE id IN (%(id_1)s, %(id_2)s)")
+    b = sqlstats.get_fingerprint("SELECT * FROM users WHERE id IN (%(id_1)s)")
+    assert a == b
+
+
+def test_engine_listeners():
+    """Statements are recorded while the request stats are active."""
+    engine = sa.create_engine("sqlite://")
+    sqlstats.attach_engine_listeners(engine)
+
+    stats = sqlstats._local.stats = sqlstats.SQLStats()
+    try:
+        for i in range(3):
+            engine.execute("SELECT {}".format(i))
+    finally:
+        sqlstats._local.stats = None
+
+    engine.execute("SELECT 1")
+
+    assert stats.statements == 3
+    assert stats.get_repeated(2) == {"SELECT ?": 3}
+    assert stats.get_repeated(3) == {}
+
+
+def test_failed_statement():
+    """Failed statements leave nothing behind on the pooled connection."""
+    engine = sa.create_engine("sqlite://")
+    sqlstats.attach_engine_listeners(engine)
+
+    stats = sqlstats._local.stats = sqlstats.SQLStats()
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(sa.exc.OperationalError):
+                conn.execute("SELECT * FROM missing_table")
+            conn.execute("SELECT 1")
+            assert not any(key.startswith("websauna.") for key in conn.info)
+    finally:
+        sqlstats._local.stats = None
+
+    assert stats.statements == 1
+    assert stats.fingerprints == {"SELECT ?": 1}
@@ -0,0 +1,63 @@
+"""Throttle keys, statistics and clearing."""
+from pyramid.testing import DummyRequest
+
+from websauna.system.core.redis import get_redis
+from websauna.system.form import throttle
+
+
+class DummyUser:
+    id = 5
+
+
+def create_request(registry, user=None, client_addr="1.2.3.4"):
+    request = DummyRequest()
+    request.registry = registry
+    request.user = user
+    request.client_addr = client_addr
+    return request
+
+
+def clear(registry):
+    redis = get_redis(registry)
+    keys = list(throttle.scan_throttle_keys(registry))
+    if keys:
+        redis.delete(*keys)
+
+
+def test_principal_keys(registry):
+    """Throttles can be keyed system wide, by client address or by user."""
+    prefix = throttle.get_key_prefix(registry)
+
+    request = create_request(registry)
+    assert throttle.get_throttle_key(request, "login") == prefix + "login"
+    assert throttle.get_throttle_key(request, "login", throttle.get_client_address) == prefix + "login:1.2.3.4"
+    assert throttle.get_throttle_key(request, "login", throttle.get_user_id) == prefix + "login:1.2.3.4"
+
+    request = create_request(registry, user=DummyUser())
+    assert throttle.get_throttle_key(request, "login", throttle.get_user_id) == prefix + "login:user-5"
+
+    # No principal value, fall back to system wide key
+    request = create_request(registry, client_addr=None)
+    assert throttle.get_throttle_key(request, "login", throttle.get_client_address) == prefix + "login"
+
+
+def test_stats_and_clear(registry):
+    """Statistics and clearing of one throttle do not touch throttles sharing its name as a prefix."""
+    redis = get_redis(registry)
+    prefix = throttle.get_key_prefix(registry)
+    clear(registry)
+
+    redis.zadd(prefix + "login", {"a": 1, "b": 2})
+    redis.zadd(prefix + "login:1.2.3.4", {"a": 1, "b": 2, "c": 3})
+    redis.zadd(prefix + "login_email:1.2.3.4", {"a": 1})
+
+    # Sliding window buckets are summed per principal
+    redis.set(prefix + "signup:5.6.7.8:100", 4)
+    redis.set(prefix + "signup:5.6.7.8:101", 1)
+
+    assert throttle.get_throttle_stats(registry, "login") == [(prefix + "login:1.2.3.4", 3), (prefix + "login", 2)]
+    assert throttle.get_throttle_stats(registry, top=1) == [(prefix + "signup:5.6.7.8", 5)]
+
+    assert throttle.clear_throttle_keys(registry, "login") == 2
+    assert redis.exists(prefix + "login_email:1.2.3.4")
+    assert throttle.clear_throttle_keys(registry) == 3
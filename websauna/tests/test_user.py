@@ -12,3 +12,48 @@ def test_user_subsystem(init, dbsession):
     with transaction.manager:
         u = dbsession.query(User).get(1)
         assert u.email == "example@example.com"
+
+
+def test_request_identity_cache(init, dbsession, pyramid_request):
+    """User and principals are resolved once per request."""
+
+    from websauna.system.auth.authentication import clear_identity_cache
+    from websauna.system.auth.authentication import get_session_user
+    from websauna.system.auth.principals import resolve_principals
+    from websauna.tests.utils import create_user
+
+    with transaction.manager:
+        u = create_user(dbsession, init.config.registry, admin=True)
+        user_id = u.id
+
+    pyramid_request.dbsession = dbsession
+
+    with transaction.manager:
+        user = get_session_user(user_id, pyramid_request)
+        assert get_session_user(user_id, pyramid_request) is user
+
+        principals = resolve_principals(user_id, pyramid_request)
+        assert "group:admin" in principals
+        assert resolve_principals(user_id, pyramid_request) is principals
+
+        clear_identity_cache(pyramid_request)
+        assert resolve_principals(user_id, pyramid_request) is not principals
+
+
+def test_memory_principal_cache():
+    """Cached principals expire and can be invalidated."""
+
+    from websauna.system.auth.principalcache import MemoryPrincipalCache
+
+    cache = MemoryPrincipalCache(ttl=60)
+    state = dict(principals=["group:admin"], enabled=True, activated=True, last_auth_sensitive_operation_at=None)
+
+    cache.set(1, state)
+    assert cache.get(1) == state
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+    cache.ttl = -1
+    cache.set(1, state)
+    assert cache.get(1) is None
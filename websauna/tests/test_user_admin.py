@@ -297,3 +297,83 @@ def test_delete_user_cancel(browser, web_server, init, dbsession):
 
 
 
+
+
+def test_search_users(browser, web_server, init, dbsession):
+    """Admin JSON search endpoint finds users by email prefix."""
+
+    b = browser
+
+    create_logged_in_user(dbsession, init.config.registry, web_server, browser, admin=True)
+
+    b.visit("{}/admin/models/user/search?q=EXAMPLE".format(web_server))
+    assert b.is_text_present("example@example.com")
+
+    b.visit("{}/admin/models/user/search?q=nobody".format(web_server))
+    assert not b.is_text_present("example@example.com")
+
+
+def test_bulk_disable_users(browser, web_server, init, dbsession):
+    """Disable selected users from the listing with a bulk action."""
+
+    b = browser
+
+    create_logged_in_user(dbsession, init.config.registry, web_server, browser, admin=True)
+
+    with transaction.manager:
+        u = create_user(dbsession, init.config.registry, email="foobar@example.com")
+        user_id = u.id
+
+    b.visit("{}/admin/models/user/listing".format(web_server))
+    b.find_by_css(".crud-row-{} input[name='ids']".format(user_id)).check()
+    b.select("action", "disable")
+    b.find_by_css("#btn-bulk-action").click()
+    assert b.is_element_present_by_css("#msg-bulk-done")
+
+    with transaction.manager:
+        assert not dbsession.query(User).get(user_id).enabled
+        assert dbsession.query(User).filter_by(email="example@example.com").one().enabled
+
+
+def test_bulk_disable_all_deferred(browser, web_server, init, dbsession, monkeypatch):
+    """Bulk action on all matching users is deferred with the listing filter, and the task disables only the matching users."""
+    from pyramid import scripting
+    from websauna.system.crud import tasks
+    from websauna.system.user.adminviews import UserListing
+
+    deferred = []
+    monkeypatch.setattr(UserListing, "bulk_defer_threshold", 2)
+    monkeypatch.setattr(tasks.run_bulk_action, "apply_async", lambda args, **kwargs: deferred.append(args))
+
+    b = browser
+    create_logged_in_user(dbsession, init.config.registry, web_server, browser, admin=True)
+
+    with transaction.manager:
+        for i in range(3):
+            create_user(dbsession, init.config.registry, email="deferred{}@example.com".format(i))
+        create_user(dbsession, init.config.registry, email="other@example.com")
+
+    b.visit("{}/admin/models/user/listing?filter_email=deferred".format(web_server))
+    b.find_by_css("input[name='all']").check()
+    b.select("action", "disable")
+    b.find_by_css("#btn-bulk-action").click()
+    assert b.is_element_present_by_css("#msg-bulk-deferred")
+
+    # The listing filter goes to the task instead of the ids
+    (args,) = deferred
+    request, listing, model, action_id, ids, target, params = args
+    assert ids is None
+    assert params == {"filter_email": "deferred"}
+
+    env = scripting.prepare(registry=init.config.registry)
+    try:
+        with transaction.manager:
+            tasks.run_bulk_action.run(env["request"], listing, model, action_id, ids, target, params)
+    finally:
+        env["closer"]()
+
+    with transaction.manager:
+        users = {u.email: u.enabled for u in dbsession.query(User)}
+        assert not any(enabled for email, enabled in users.items() if email.startswith("deferred"))
+        assert users["other@example.com"]
+        assert users["example@example.com"]
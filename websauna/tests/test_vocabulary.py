@@ -0,0 +1,130 @@
+"""Cached relationship choice vocabularies and the remote select widget."""
+from uuid import uuid4
+
+import pytest
+import sqlalchemy as sa
+from pyramid.registry import Registry
+from pyramid.testing import DummyRequest
+from sqlalchemy import engine_from_config
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from websauna.system.form import vocabulary
+from websauna.system.form.widgets import RemoteSelectWidget
+from websauna.utils.slug import uuid_to_slug
+
+
+Base = declarative_base()
+
+
+class Color(Base):
+    __tablename__ = "vocabulary_test_color"
+    id = sa.Column(sa.Integer, primary_key=True)
+    uuid = sa.Column(UUID(as_uuid=True), default=uuid4)
+    name = sa.Column(sa.String(32))
+
+
+@pytest.fixture
+def session(ini_settings):
+    engine = engine_from_config(ini_settings, 'sqlalchemy.')
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Color(name="red"), Color(name="blue")])
+    session.commit()
+    vocabulary.invalidate_vocabulary(Color)
+    yield session
+    vocabulary.invalidate_vocabulary(Color)
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+def create_request(session):
+    request = DummyRequest()
+    request.registry = Registry()
+    request.registry.settings = {}
+    request.dbsession = session
+    return request
+
+
+def labels(request):
+    return [label for slug, label in vocabulary.get_vocabulary(request, Color)]
+
+
+def test_vocabulary_cached(session):
+    """Vocabulary is loaded once and ordered by the label column."""
+    request = create_request(session)
+    assert labels(request) == ["blue", "red"]
+
+    # Changed behind the back of the cache
+    session.execute(Color.__table__.insert().values(uuid=uuid4(), name="green"))
+    assert labels(request) == ["blue", "red"]
+
+
+def test_cache_per_registry(session):
+    """Apps in the same process do not share cached vocabularies, but both are invalidated."""
+    first = create_request(session)
+    second = create_request(session)
+    assert labels(first) == ["blue", "red"]
+
+    session.execute(Color.__table__.insert().values(uuid=uuid4(), name="green"))
+    assert labels(first) == ["blue", "red"]
+    assert labels(second) == ["blue", "green", "red"]
+    assert vocabulary.get_vocabulary_cache(first.registry) is not vocabulary.get_vocabulary_cache(second.registry)
+
+    session.add(Color(name="white"))
+    session.commit()
+    assert labels(first) == ["blue", "green", "red", "white"]
+    assert labels(second) == ["blue", "green", "red", "white"]
+
+
+def test_invalidate_on_commit(session):
+    """Cache is dropped when the change commits, not when it is flushed."""
+    request = create_request(session)
+    assert labels(request) == ["blue", "red"]
+
+    session.add(Color(name="green"))
+    session.flush()
+    assert labels(request) == ["blue", "red"]
+
+    session.commit()
+    assert labels(request) == ["blue", "green", "red"]
+
+
+def test_rollback_keeps_cache(session):
+    """Rolled back changes do not drop valid cache entries."""
+    request = create_request(session)
+    assert labels(request) == ["blue", "red"]
+
+    session.add(Color(name="green"))
+    session.flush()
+    session.rollback()
+    assert session.info.get(vocabulary.INFO_CHANGED_MODELS) is None
+
+    session.execute(Color.__table__.insert().values(uuid=uuid4(), name="white"))
+    session.commit()
+
+    # Raw SQL insert is not seen by the flush listener, cache is still served
+    assert labels(request) == ["blue", "red"]
+
+
+def test_remote_select_choices(session):
+    """Remote select renders only the selected item."""
+    request = create_request(session)
+    red = session.query(Color).filter_by(name="red").one()
+
+    class DummySchema:
+        bindings = {"request": request}
+
+    class DummyField:
+        schema = DummySchema()
+        required = False
+
+    widget = RemoteSelectWidget(url="http://localhost/search", model=Color, label_column="name", default_choice="Pick one")
+    assert widget.get_choices(DummyField(), uuid_to_slug(red.uuid)) == [("", "Pick one"), (uuid_to_slug(red.uuid), "red")]
+    assert widget.get_choices(DummyField(), "") == [("", "Pick one")]
+
+    values = widget.get_template_values(DummyField(), "", {})
+    assert values["url"] == "http://localhost/search"
+    assert values["allow_clear"] is True
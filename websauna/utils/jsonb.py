@@ -7,7 +7,6 @@ import inspect as python_inspect
 import iso8601
 
 from sqlalchemy import inspect
-from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.orm.attributes import set_attribute
 
 
@@ -63,6 +62,9 @@ class ISO8601DatetimeConverter(object):
 
 _marker = object()
 
+#: ``InstanceState.info`` key of JSONB documents copied by :py:meth:`JSONBProperty.get_writable_data`
+_OWNED_KEY = "websauna.jsonb_owned"
+
 
 class JSONBProperty(object):
     """Define a Python class property which can set/get JSONB field data.
@@ -88,6 +90,12 @@ class JSONBProperty(object):
     :param converter: JSON serializer/deserializer. Can be a class or instance with serialize() / deserialize() methods.
 
     :param graceful: If set, return this value when the member is not found instead of raising exception
+
+    On the model class the property is a SQL expression extracting the value as text, so that it can be used in queries::
+
+        dbsession.query(User).filter(User.registration_source == "facebook")
+
+    renders ``user_data ->> 'registration_source' = 'facebook'``. Use :py:meth:`get_expression` for JSONB values and create matching indexes with :py:func:`websauna.system.devop.alembic.create_jsonb_property_index`.
     """
 
     #: Return this value if there is nothing at the end of RFC 6901 pointer
@@ -132,7 +140,30 @@ class JSONBProperty(object):
     def is_graceful(self):
         return self.graceful != _marker
 
+    def get_path(self) -> list:
+        """Get the keys of the pointer, with RFC 6901 escapes resolved."""
+        return jsonpointer.JsonPointer(self.pointer).parts
+
+    def get_expression(self, model: type, astext=True):
+        """Get SQL expression of the property.
+
+        :param astext: Extract the value as text with ``->>`` or ``#>>``. Otherwise extract JSONB value with ``->`` or ``#>``, e.g. for containment comparisons.
+        """
+        column = getattr(model, self.data_field)
+        path = self.get_path()
+        element = column[path[0]] if len(path) == 1 else column[tuple(path)]
+        return element.astext if astext else element
+
     def __get__(self, obj, objtype=None):
+
+        if obj is None and objtype is not None:
+            # Accessed on the model class, e.g. User.registration_source == "facebook" in a query
+            try:
+                return self.get_expression(objtype)
+            except (AttributeError, NotImplementedError):
+                # Data field not yet mapped, or not a JSON column
+                return self
+
         data = self.ensure_valid_data(obj)
         if data is None:
             # Gets hit by Sphinx build
@@ -147,13 +178,40 @@ class JSONBProperty(object):
                 raise CannotLookupData("Could not find {} on data {}".format(self.pointer, obj))
         return self.converter.deserialize(val)
 
+    def get_writable_data(self, obj) -> dict:
+        """Get JSONB data of the object where the containers on the pointer path can be modified in place.
+
+        SQLAlchemy detects changes by comparing the new value against the loaded value, so the loaded value must not be mutated. The first write after load or flush makes a shallow copy of the document and copies the containers along the pointer path only. Further writes before the next flush modify these copies in place. This way setting several properties costs one copy of the top level document instead of a deep copy per set.
+        """
+        data = self.ensure_valid_data(obj)
+        state = inspect(obj)
+        owned_by_field = state.info.setdefault(_OWNED_KEY, {})
+        owned = owned_by_field.get(self.data_field)
+
+        # committed_state holds the loaded value until the next flush
+        if not owned or owned["root"] is not data or self.data_field not in state.committed_state:
+            data = copy.copy(data)
+            owned = owned_by_field[self.data_field] = {"root": data, "containers": {id(data): data}}
+            set_attribute(obj, self.data_field, data)
+
+        containers = owned["containers"]
+        pointer = jsonpointer.JsonPointer(self.pointer)
+        container = data
+        for part in pointer.parts[:-1]:
+            key = pointer.get_part(container, part)
+            child = pointer.walk(container, part)
+            if isinstance(child, (dict, list)) and id(child) not in containers:
+                child = copy.copy(child)
+                containers[id(child)] = child
+                container[key] = child
+            container = child
+
+        return data
+
     def __set__(self, obj, val):
 
         # TODO: Abstract JsonPointerException when settings a member with missing nested parent dict
 
-        # We need to deepcopy data, so that SQLAlchemy can detect changes. Otherwise nested changes would mutate the dict in-place and SQLAlchemy cannot perform comparison.
-        data = copy.deepcopy(self.ensure_valid_data(obj))
-
         val = self.converter.serialize(val)
 
         if val is not None:
@@ -162,11 +220,9 @@ class JSONBProperty(object):
             if type(val) not in (str, float, bool, int, dict):
                 raise BadJSONData("Cannot update field at {} as it has unsupported type {} for JSONB data".format(self.pointer, type(val)))
 
+        data = self.get_writable_data(obj)
         jsonpointer.set_pointer(data, self.pointer, val)
 
-        set_attribute(obj, self.data_field, data)
-        # flag_modified(obj, self.data_field)
-
     @classmethod
     def is_json_property(cls, obj, name):
         """Check if given attribute on an object is JSONBProperty.